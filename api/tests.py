@@ -0,0 +1,156 @@
+import csv
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from infracciones.models import Infraccion, Vehiculo
+from infracciones.servicios import crear_infracciones_lote
+from infracciones.tests import FlagsMssqlMixin, crear_catalogo, registro
+
+
+def contenido(respuesta):
+    return b''.join(respuesta.streaming_content).decode('utf-8')
+
+
+class ExportacionInfraccionesTests(FlagsMssqlMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.camara, _ = crear_catalogo()
+        base = datetime(2025, 1, 15, 8, 0)
+        # Tres con la misma fecha_hora: el cursor desempata por id
+        fechas = [base, base, base, base + timedelta(minutes=5), base + timedelta(hours=1),
+                  base + timedelta(days=1), base + timedelta(days=2)]
+        crear_infracciones_lote([
+            registro(f'EXP-{i:03d}', camara=self.camara, fecha_hora=fecha) for i, fecha in enumerate(fechas)
+        ])
+        self.orden = list(Infraccion.objects.order_by('fecha_hora', 'id').values_list('id', flat=True))
+        self.url = reverse('obtener_datos_infracciones')
+
+    @mock.patch('api.views.CHUNK_EXPORTACION', 2)
+    def test_paginacion_por_cursor(self):
+        ids, cursor, paginas = [], None, 0
+        while True:
+            parametros = {'dias': 0, 'limite': 3}
+            if cursor:
+                parametros['cursor'] = cursor
+            datos = json.loads(contenido(self.client.get(self.url, parametros)))
+            ids += [fila['id'] for fila in datos['datos']]
+            cursor, paginas = datos['siguiente'], paginas + 1
+            if cursor is None:
+                break
+
+        self.assertEqual(ids, self.orden)
+        self.assertEqual(paginas, 3)
+
+    @mock.patch('api.views.LIMITE_INFRACCIONES', 4)
+    def test_limite_por_defecto(self):
+        datos = json.loads(contenido(self.client.get(self.url, {'dias': 0})))
+        self.assertEqual([fila['id'] for fila in datos['datos']], self.orden[:4])
+        self.assertIsNotNone(datos['siguiente'])
+
+    @mock.patch('api.views.CHUNK_EXPORTACION', 2)
+    @mock.patch('api.views.LIMITE_INFRACCIONES', 4)
+    def test_ndjson_con_limite_cero_exporta_todo_en_lotes(self):
+        respuesta = self.client.get(self.url, {'dias': 0, 'limite': 0, 'formato': 'ndjson'})
+        filas = [json.loads(linea) for linea in contenido(respuesta).splitlines()]
+        self.assertEqual([fila['id'] for fila in filas], self.orden)
+
+    def test_csv_y_actualizado_desde(self):
+        Infraccion.objects.filter(id=self.orden[0]).update(actualizado_en=datetime(2030, 1, 1))
+        respuesta = self.client.get(self.url, {'formato': 'csv', 'actualizado_desde': '2029-12-31'})
+        filas = list(csv.reader(contenido(respuesta).splitlines()))
+        self.assertEqual(filas[0][0], 'id')
+        self.assertEqual([int(fila[0]) for fila in filas[1:]], [self.orden[0]])
+
+
+class ExportacionVehiculosTests(FlagsMssqlMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.camara, _ = crear_catalogo()
+        crear_infracciones_lote([registro('VEH-001', camara=self.camara)])
+        Vehiculo.objects.create(placa='VEH-002')
+        self.url = reverse('obtener_datos_vehiculos')
+
+    def test_perfil_anidado(self):
+        datos = json.loads(contenido(self.client.get(self.url)))
+        por_placa = {fila['placa']: fila for fila in datos['datos']}
+
+        self.assertEqual(por_placa['VEH-001']['total_infracciones'], 1)
+        self.assertEqual(por_placa['VEH-001']['perfil']['total_infracciones'], 1)
+        self.assertEqual(por_placa['VEH-001']['perfil']['nivel_riesgo'], 'BAJO')
+        self.assertIsNone(por_placa['VEH-002']['perfil'])
+        self.assertNotIn('perfil_nivel_riesgo', por_placa['VEH-001'])
+
+    @mock.patch('api.views.CHUNK_EXPORTACION', 1)
+    def test_cursor_por_id(self):
+        primera = json.loads(contenido(self.client.get(self.url, {'limite': 1})))
+        segunda = json.loads(contenido(self.client.get(self.url, {'limite': 1, 'cursor': primera['siguiente']})))
+        self.assertEqual(
+            [primera['datos'][0]['placa'], segunda['datos'][0]['placa']], ['VEH-001', 'VEH-002']
+        )
+
+    @mock.patch('api.views.LIMITE_VEHICULOS', 1)
+    def test_limite_por_defecto(self):
+        datos = json.loads(contenido(self.client.get(self.url)))
+        self.assertEqual(len(datos['datos']), 1)
+        self.assertIsNotNone(datos['siguiente'])
+
+
+class RegistrarLoteTests(FlagsMssqlMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.camara, _ = crear_catalogo()
+        self.url = reverse('registrar_infracciones_lote')
+
+    def _enviar(self, items):
+        return self.client.post(self.url, json.dumps(items), content_type='application/json').json()
+
+    def test_valida_cada_item_y_reenvio(self):
+        base = {'tipo_infraccion_codigo': 'EXCESO_VEL', 'camara_id': self.camara.id,
+                'fecha_hora': '2025-01-15T08:30:00'}
+        items = [
+            dict(base, id_evento='lote-1', placa='LOT-001', velocidad_detectada='92', velocidad_maxima=60,
+                 confianza_deteccion=95.5, latitud=-12.046374, longitud=-77.042793),
+            dict(base, id_evento='lote-2', placa='LOT-002', velocidad_detectada='rápido'),
+            dict(base, id_evento='lote-3', placa='LOT-003', latitud=120),
+            dict(base, id_evento='lote-4', placa='LOT-004', fecha_hora='ayer'),
+            dict(base, id_evento='lote-5', placa='LOT-005', confianza_deteccion=150),
+        ]
+
+        respuesta = self._enviar(items)
+        self.assertEqual(respuesta['status'], 'partial')
+        self.assertEqual((respuesta['creadas'], respuesta['errores']), (1, 4))
+        self.assertEqual([r['status'] for r in respuesta['resultados']],
+                         ['creada', 'error', 'error', 'error', 'error'])
+
+        infraccion = Infraccion.objects.get()
+        self.assertEqual(infraccion.velocidad_detectada, 92)
+        self.assertEqual(infraccion.confianza_deteccion, Decimal('95.50'))
+        self.assertEqual(infraccion.latitud, Decimal('-12.046374'))
+
+        reenvio = self._enviar(items[:1])
+        self.assertEqual((reenvio['creadas'], reenvio['duplicadas']), (0, 1))
+        self.assertEqual(reenvio['resultados'][0]['infraccion_id'], infraccion.id)
+        self.assertEqual(Infraccion.objects.count(), 1)
+
+    def test_tipos_no_validos_por_item(self):
+        base = {'placa': 'LOT-010', 'tipo_infraccion_codigo': 'LUZ_ROJA'}
+        respuesta = self._enviar([
+            dict(base, id_evento='tipo-1', tipo_infraccion_codigo=['LUZ_ROJA']),
+            dict(base, id_evento='tipo-2', tipo_infraccion_codigo={'codigo': 'LUZ_ROJA'}),
+            dict(base, id_evento='tipo-3', camara_id={'id': self.camara.id}),
+            dict(base, id_evento='tipo-4', camara_id=True),
+            dict(base, id_evento='tipo-5', modelo_version='v' * 51),
+            dict(base, id_evento='tipo-6', modelo_version=2),
+            dict(base, id_evento='tipo-7', modelo_version='v' * 50),
+        ])
+        self.assertEqual([r['status'] for r in respuesta['resultados']], ['error'] * 6 + ['creada'])
+        self.assertIn('tipo_infraccion_codigo', respuesta['resultados'][0]['message'])
+        self.assertEqual(Infraccion.objects.get().modelo_ia_version, 'v' * 50)
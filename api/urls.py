@@ -13,6 +13,7 @@ urlpatterns = [
     
     # Endpoint para registrar infracción detectada
     path('infraccion/registrar/', views.registrar_infraccion, name='registrar_infraccion'),
+    path('infraccion/registrar-lote/', views.registrar_infracciones_lote, name='registrar_infracciones_lote'),
     
     # Endpoint de prueba
     path('test/', views.api_test, name='api_test'),
@@ -1,12 +1,92 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+import csv
 import json
+import os
 from datetime import datetime, timedelta
+from decimal import Decimal
+from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.db import models
+from django.utils.dateparse import parse_date, parse_datetime
 from infracciones.models import Vehiculo, Infraccion, PerfilConductor, PrediccionAccidente, TipoInfraccion
+from infracciones import cache
+from infracciones.consultas import despues_de, recorrer_keyset
+from infracciones.servicios import registrar_infracciones_idempotente
 from camaras.models import Camara
 
+MAX_LOTE = int(os.getenv('API_LOTE_MAX', 5000))  # infracciones por petición de registrar-lote
+CHUNK_EXPORTACION = int(os.getenv('API_EXPORTACION_CHUNK', 2000))  # filas por consulta de la exportación
+# Filas por página cuando no se indica limite (limite=0 exporta todo)
+LIMITE_INFRACCIONES = 1000
+LIMITE_VEHICULOS = 500
+FORMATOS_EXPORTACION = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve cada línea en vez de acumularla"""
+
+    def write(self, valor):
+        return valor
+
+
+def _exportable(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return valor
+
+
+def _respuesta_exportacion(filas, columnas, formato, cursor_de, limite=None, objeto=dict):
+    """
+    StreamingHttpResponse con las tuplas de values_list en JSON, NDJSON o CSV
+    El JSON cierra con 'siguiente' (cursor de la página siguiente o null); en
+    NDJSON y CSV el cursor se arma con las columnas de la última fila.
+    objeto(columna -> valor) da la forma de cada registro en JSON y NDJSON
+    """
+    def registros():
+        for fila in filas:
+            yield fila, [_exportable(valor) for valor in fila]
+
+    def ndjson():
+        for _, valores in registros():
+            yield json.dumps(objeto(zip(columnas, valores))) + '\n'
+
+    def en_csv():
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow(columnas)
+        for _, valores in registros():
+            yield escritor.writerow(valores)
+
+    def en_json():
+        yield '{"status": "success", "datos": ['
+        total, ultima = 0, None
+        for fila, valores in registros():
+            yield (', ' if total else '') + json.dumps(objeto(zip(columnas, valores)))
+            total, ultima = total + 1, fila
+        siguiente = cursor_de(ultima) if limite and total == limite else None
+        yield f'], "total": {total}, "siguiente": {json.dumps(siguiente)}}}'
+
+    contenido = {'json': en_json, 'ndjson': ndjson, 'csv': en_csv}[formato]()
+    return StreamingHttpResponse(contenido, content_type=FORMATOS_EXPORTACION[formato])
+
+
+def _parametros_exportacion(request, limite_defecto):
+    """(formato, limite o None) validados de la query; sin limite se usa limite_defecto y limite=0 es sin límite"""
+    formato = request.GET.get('formato', 'json').lower()
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"formato debe ser uno de: {', '.join(FORMATOS_EXPORTACION)}")
+    limite = int(request.GET.get('limite') or limite_defecto)
+    if limite < 0:
+        raise ValueError('limite no puede ser negativo')
+    return formato, limite or None
+
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -163,43 +243,76 @@ def predecir_riesgo_conductor(request):
         }, status=400)
 
 
+# Columna exportada -> campo de values_list
+COLUMNAS_EXPORTACION_INFRACCIONES = {
+    'id': 'id',
+    'placa': 'vehiculo__placa',
+    'tipo_infraccion': 'tipo_infraccion__codigo',
+    'gravedad': 'tipo_infraccion__gravedad',
+    'fecha_hora': 'fecha_hora',
+    'ubicacion': 'ubicacion',
+    'camara_id': 'camara_id',
+    'velocidad_detectada': 'velocidad_detectada',
+    'velocidad_maxima': 'velocidad_maxima',
+    'tiempo_luz_roja': 'tiempo_luz_roja',
+    'confianza_deteccion': 'confianza_deteccion',
+    'estado': 'estado',
+    'actualizado_en': 'actualizado_en',
+}
+
+
+def _fecha_parametro(valor, nombre):
+    """datetime de un parámetro ISO (fecha o fecha y hora); con zona se pasa a hora local (USE_TZ=False)"""
+    fecha = parse_datetime(valor)
+    if fecha is None and parse_date(valor) is not None:
+        fecha = datetime.combine(parse_date(valor), datetime.min.time())
+    if fecha is None:
+        raise ValueError(f'{nombre} no es una fecha válida: {valor}')
+    return timezone.make_naive(fecha) if timezone.is_aware(fecha) else fecha
+
+
 @require_http_methods(["GET"])
 def obtener_datos_infracciones(request):
     """
     Endpoint para que Google Colab obtenga datos de infracciones para entrenamiento
-    Query params: ?dias=30&limite=1000
+    Query params: ?dias=30&limite=1000&formato=json|ndjson|csv
+                  &cursor=<fecha_hora>,<id>&actualizado_desde=<fecha>
+    Se transmite en streaming ordenado por (fecha_hora, id), en consultas de
+    CHUNK_EXPORTACION filas; limite=0 exporta todo de una vez. Para la página
+    siguiente se pasa como cursor la fecha_hora e id de la última fila
+    recibida (el JSON lo trae en 'siguiente'). actualizado_desde
+    (o updated_since) devuelve solo lo creado o modificado desde esa fecha
+    (vía save() o un UPDATE que fije actualizado_en).
     """
     try:
-        dias = int(request.GET.get('dias', 30))
-        limite = int(request.GET.get('limite', 1000))
+        formato, limite = _parametros_exportacion(request, LIMITE_INFRACCIONES)
+        consulta = Infraccion.objects.all()
         
-        fecha_limite = timezone.now() - timedelta(days=dias)
+        actualizado_desde = request.GET.get('actualizado_desde') or request.GET.get('updated_since')
+        if actualizado_desde:
+            consulta = consulta.filter(actualizado_en__gte=_fecha_parametro(actualizado_desde, 'actualizado_desde'))
         
-        infracciones = Infraccion.objects.filter(
-            fecha_hora__gte=fecha_limite
-        ).select_related('vehiculo', 'tipo_infraccion', 'camara')[:limite]
+        # dias=0 exporta todo el historial; con actualizado_desde no se aplica por defecto
+        dias = int(request.GET.get('dias', 0 if actualizado_desde else 30))
+        if dias:
+            consulta = consulta.filter(fecha_hora__gte=timezone.now() - timedelta(days=dias))
         
-        datos = []
-        for inf in infracciones:
-            datos.append({
-                'id': inf.id,
-                'placa': inf.vehiculo.placa,
-                'tipo_infraccion': inf.tipo_infraccion.codigo,
-                'gravedad': inf.tipo_infraccion.gravedad,
-                'fecha_hora': inf.fecha_hora.isoformat(),
-                'ubicacion': inf.ubicacion,
-                'velocidad_detectada': inf.velocidad_detectada,
-                'velocidad_maxima': inf.velocidad_maxima,
-                'tiempo_luz_roja': float(inf.tiempo_luz_roja) if inf.tiempo_luz_roja else None,
-                'confianza_deteccion': float(inf.confianza_deteccion),
-                'estado': inf.estado,
-            })
+        cursor = request.GET.get('cursor')
+        if cursor:
+            fecha_cursor, _, id_cursor = cursor.rpartition(',')
+            fecha_cursor = _fecha_parametro(fecha_cursor, 'cursor')
+            consulta = consulta.filter(despues_de(('fecha_hora', 'id'), (fecha_cursor, int(id_cursor))))
         
-        return JsonResponse({
-            'status': 'success',
-            'total': len(datos),
-            'datos': datos
-        })
+        columnas = COLUMNAS_EXPORTACION_INFRACCIONES
+        indice_fecha, indice_id = list(columnas).index('fecha_hora'), list(columnas).index('id')
+        filas = recorrer_keyset(
+            consulta, list(columnas.values()), ('fecha_hora', 'id'), CHUNK_EXPORTACION, limite
+        )
+        return _respuesta_exportacion(
+            filas, list(columnas), formato,
+            lambda fila: f'{fila[indice_fecha].isoformat()},{fila[indice_id]}',
+            limite
+        )
         
     except Exception as e:
         return JsonResponse({
@@ -208,43 +321,55 @@ def obtener_datos_infracciones(request):
         }, status=400)
 
 
+COLUMNAS_EXPORTACION_VEHICULOS = {
+    'id': 'id',
+    'placa': 'placa',
+    'tipo_vehiculo': 'tipo_vehiculo',
+    'total_infracciones': 'conteo_infracciones',
+    'infracciones_30_dias': 'conteo_recientes',
+    'perfil_total_infracciones': 'perfil__total_infracciones',
+    'perfil_infracciones_luz_roja': 'perfil__infracciones_luz_roja',
+    'perfil_infracciones_velocidad': 'perfil__infracciones_velocidad',
+    'perfil_nivel_riesgo': 'perfil__nivel_riesgo',
+    'perfil_puntuacion_riesgo': 'perfil__puntuacion_riesgo',
+}
+
+
+def _vehiculo_con_perfil(pares):
+    """Registro de vehículo con las columnas perfil_* anidadas en 'perfil' (None si no tiene)"""
+    registro, perfil = {}, {}
+    for columna, valor in pares:
+        if columna.startswith('perfil_'):
+            perfil[columna[len('perfil_'):]] = valor
+        else:
+            registro[columna] = valor
+    # nivel_riesgo es NOT NULL: solo viene null por el LEFT JOIN sin perfil
+    registro['perfil'] = perfil if perfil['nivel_riesgo'] is not None else None
+    return registro
+
+
 @require_http_methods(["GET"])
 def obtener_datos_vehiculos(request):
     """
     Endpoint para obtener datos de vehículos con sus perfiles
+    Query params: ?limite=500&formato=json|ndjson|csv&cursor=<id>
+    LEFT JOIN al perfil + conteos anotados, en streaming por lotes de keyset
+    sobre el id; limite=0 exporta todo. En JSON y NDJSON el perfil va anidado
+    en 'perfil' (null si el vehículo no tiene); en CSV son columnas perfil_*.
     """
     try:
-        limite = int(request.GET.get('limite', 500))
+        formato, limite = _parametros_exportacion(request, LIMITE_VEHICULOS)
+        consulta = Vehiculo.objects.con_conteos()
         
-        vehiculos = Vehiculo.objects.all()[:limite]
+        cursor = request.GET.get('cursor')
+        if cursor:
+            consulta = consulta.filter(id__gt=int(cursor))
         
-        datos = []
-        for veh in vehiculos:
-            try:
-                perfil = veh.perfil
-                perfil_data = {
-                    'total_infracciones': perfil.total_infracciones,
-                    'infracciones_luz_roja': perfil.infracciones_luz_roja,
-                    'infracciones_velocidad': perfil.infracciones_velocidad,
-                    'nivel_riesgo': perfil.nivel_riesgo,
-                    'puntuacion_riesgo': float(perfil.puntuacion_riesgo),
-                }
-            except PerfilConductor.DoesNotExist:
-                perfil_data = None
-            
-            datos.append({
-                'placa': veh.placa,
-                'tipo_vehiculo': veh.tipo_vehiculo,
-                'total_infracciones': veh.total_infracciones(),
-                'infracciones_30_dias': veh.infracciones_ultimos_30_dias(),
-                'perfil': perfil_data
-            })
-        
-        return JsonResponse({
-            'status': 'success',
-            'total': len(datos),
-            'datos': datos
-        })
+        columnas = COLUMNAS_EXPORTACION_VEHICULOS
+        filas = recorrer_keyset(consulta, list(columnas.values()), ('id',), CHUNK_EXPORTACION, limite)
+        return _respuesta_exportacion(
+            filas, list(columnas), formato, lambda fila: str(fila[0]), limite, objeto=_vehiculo_con_perfil
+        )
         
     except Exception as e:
         return JsonResponse({
@@ -271,23 +396,25 @@ def registrar_infraccion(request):
     try:
         data = json.loads(request.body)
         
-        # Obtener o crear vehículo
-        vehiculo, created = Vehiculo.objects.get_or_create(
-            placa=data.get('placa'),
-            defaults={'tipo_vehiculo': 'AUTO'}
-        )
+        # Obtener tipo de infracción (catálogo en memoria)
+        tipo_infraccion = cache.obtener_tipo_infraccion(data.get('tipo_infraccion_codigo'))
+        if tipo_infraccion is None:
+            raise TipoInfraccion.DoesNotExist
         
-        # Obtener tipo de infracción
-        tipo_infraccion = TipoInfraccion.objects.get(codigo=data.get('tipo_infraccion_codigo'))
+        # Obtener o crear vehículo (LRU placa -> id)
+        placa = data.get('placa')
+        vehiculo_id = cache.obtener_id_vehiculo(placa)
         
         # Obtener cámara
         camara = None
         if data.get('camara_id'):
-            camara = Camara.objects.get(id=data.get('camara_id'))
+            camara = cache.obtener_camara(data.get('camara_id'))
+            if camara is None:
+                raise Camara.DoesNotExist('Camara matching query does not exist.')
         
         # Crear infracción
         infraccion = Infraccion.objects.create(
-            vehiculo=vehiculo,
+            vehiculo_id=vehiculo_id,
             tipo_infraccion=tipo_infraccion,
             camara=camara,
             ubicacion=data.get('ubicacion', 'Ubicación desconocida'),
@@ -302,7 +429,7 @@ def registrar_infraccion(request):
             'status': 'success',
             'message': 'Infracción registrada correctamente',
             'infraccion_id': infraccion.id,
-            'placa': vehiculo.placa,
+            'placa': placa,
             'tipo': tipo_infraccion.nombre
         })
         
@@ -318,6 +445,171 @@ def registrar_infraccion(request):
         }, status=400)
 
 
+def _leer_lote(request):
+    """Items del cuerpo: lista JSON, {"infracciones": [...]} o NDJSON (un objeto por línea)"""
+    cuerpo = request.body.decode('utf-8')
+    if 'ndjson' in request.content_type or 'jsonlines' in request.content_type:
+        return [json.loads(linea) for linea in cuerpo.splitlines() if linea.strip()]
+    data = json.loads(cuerpo)
+    if isinstance(data, dict):
+        data = data.get('infracciones')
+    if not isinstance(data, list):
+        raise ValueError('Se esperaba una lista de infracciones')
+    return data
+
+
+def _fecha_evento(valor):
+    if not valor:
+        return timezone.now()
+    if not isinstance(valor, str):
+        raise ValueError(f'fecha_hora no es una fecha válida: {valor!r}')
+    return _fecha_parametro(valor, 'fecha_hora')
+
+
+# Campo numérico del lote -> (mínimo, máximo) aceptados
+RANGOS_LOTE = {
+    'velocidad_detectada': (0, None),
+    'velocidad_maxima': (0, None),
+    'tiempo_luz_roja': (0, None),
+    'confianza_deteccion': (0, 100),
+    'latitud': (-90, 90),
+    'longitud': (-180, 180),
+}
+
+
+def _numero_lote(item, nombre, por_defecto=None):
+    """item[nombre] convertido con el campo de Infraccion y dentro de RANGOS_LOTE (ValueError si no)"""
+    valor = item.get(nombre)
+    if valor is None or valor == '':
+        return por_defecto
+    campo = Infraccion._meta.get_field(nombre)
+    try:
+        if isinstance(valor, bool):
+            raise ValidationError('booleano')
+        if isinstance(campo, models.DecimalField):
+            valor = Decimal(str(valor)).quantize(Decimal(1).scaleb(-campo.decimal_places))
+        numero = campo.clean(valor, None)
+    except (ValidationError, ArithmeticError):
+        raise ValueError(f'{nombre} no es un número válido: {valor!r}')
+    minimo, maximo = RANGOS_LOTE[nombre]
+    if numero < minimo or (maximo is not None and numero > maximo):
+        raise ValueError(f'{nombre} fuera de rango: {numero}')
+    return numero
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def registrar_infracciones_lote(request):
+    """
+    Registra en lote las infracciones que un detector de borde acumuló sin red
+    Body (JSON o NDJSON): [{
+        "id_evento": "cam3-000123",
+        "placa": "ABC123",
+        "tipo_infraccion_codigo": "LUZ_ROJA",
+        "camara_id": 1,
+        "fecha_hora": "2025-01-15T08:30:00",
+        "confianza_deteccion": 95.5,
+        ...los campos de /api/infraccion/registrar/
+    }, ...]
+    Reenviar un id_evento ya registrado no crea otra infracción. Los items con
+    campos inválidos (números, fecha_hora, latitud/longitud) se reportan como
+    error en 'resultados' sin afectar al resto del lote.
+    """
+    try:
+        items = _leer_lote(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'status': 'error', 'message': f'Cuerpo inválido: {e}'}, status=400)
+    if len(items) > MAX_LOTE:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'El lote supera el máximo de {MAX_LOTE} infracciones'
+        }, status=413)
+
+    # Cámaras del lote en una sola consulta
+    ids_camara = {
+        item['camara_id'] for item in items
+        if isinstance(item, dict) and isinstance(item.get('camara_id'), int)
+    }
+    camaras = Camara.objects.in_bulk(ids_camara) if ids_camara else {}
+
+    resultados = [None] * len(items)
+    registros, posiciones = [], []
+    for i, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('Cada infracción debe ser un objeto')
+            if not item.get('placa') or not item.get('tipo_infraccion_codigo'):
+                raise ValueError('placa y tipo_infraccion_codigo son obligatorios')
+            if not isinstance(item['placa'], str) or len(item['placa']) > 20:
+                raise ValueError('placa debe ser texto de hasta 20 caracteres')
+            if not isinstance(item['tipo_infraccion_codigo'], str):
+                raise ValueError('tipo_infraccion_codigo debe ser texto')
+            if len(str(item.get('ubicacion') or '')) > 300:
+                raise ValueError('ubicacion supera los 300 caracteres')
+            camara = None
+            if item.get('camara_id'):
+                es_id = isinstance(item['camara_id'], int) and not isinstance(item['camara_id'], bool)
+                camara = camaras.get(item['camara_id']) if es_id else None
+                if camara is None:
+                    raise ValueError(f"Cámara {item['camara_id']} no existe")
+            id_evento = item.get('id_evento')
+            if id_evento is not None and (not isinstance(id_evento, str) or len(id_evento) > 64):
+                raise ValueError('id_evento debe ser texto de hasta 64 caracteres')
+            modelo_version = item.get('modelo_version', 'v1.0')
+            if not isinstance(modelo_version, str) or len(modelo_version) > 50:
+                raise ValueError('modelo_version debe ser texto de hasta 50 caracteres')
+            registros.append({
+                'placa': item['placa'],
+                'tipo_codigo': item['tipo_infraccion_codigo'],
+                'id_evento': id_evento or None,
+                'camara': camara,
+                'fecha_hora': _fecha_evento(item.get('fecha_hora')),
+                'ubicacion': item.get('ubicacion') or (camara.ubicacion if camara else 'Ubicación desconocida'),
+                'latitud': _numero_lote(item, 'latitud'),
+                'longitud': _numero_lote(item, 'longitud'),
+                'confianza_deteccion': _numero_lote(item, 'confianza_deteccion', por_defecto=0),
+                'velocidad_detectada': _numero_lote(item, 'velocidad_detectada'),
+                'velocidad_maxima': _numero_lote(item, 'velocidad_maxima'),
+                'tiempo_luz_roja': _numero_lote(item, 'tiempo_luz_roja'),
+                'modelo_ia_version': modelo_version,
+                'evento': {
+                    'tipo': item['tipo_infraccion_codigo'],
+                    'placa': item['placa'],
+                    'id_evento': id_evento,
+                    'origen': 'api_lote',
+                },
+            })
+            posiciones.append(i)
+        except (ValueError, TypeError) as e:
+            resultados[i] = {'indice': i, 'status': 'error', 'message': str(e)}
+
+    try:
+        registradas = registrar_infracciones_idempotente(registros)
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    for i, registro, (estado, infraccion) in zip(posiciones, registros, registradas):
+        if estado == 'tipo_invalido':
+            resultados[i] = {'indice': i, 'status': 'error', 'message': 'Tipo de infracción no encontrado'}
+            continue
+        resultados[i] = {
+            'indice': i,
+            'status': estado,
+            'id_evento': registro['id_evento'],
+            'infraccion_id': infraccion.id,
+        }
+
+    conteo = {estado: sum(1 for r in resultados if r['status'] == estado)
+              for estado in ('creada', 'duplicada', 'error')}
+    return JsonResponse({
+        'status': 'success' if not conteo['error'] else 'partial',
+        'creadas': conteo['creada'],
+        'duplicadas': conteo['duplicada'],
+        'errores': conteo['error'],
+        'resultados': resultados,
+    })
+
+
 @require_http_methods(["GET"])
 def api_test(request):
     """Endpoint de prueba para verificar que la API funciona"""
@@ -332,5 +624,6 @@ def api_test(request):
             '/api/datos/infracciones/',
             '/api/datos/vehiculos/',
             '/api/infraccion/registrar/',
+            '/api/infraccion/registrar-lote/',
         ]
     })
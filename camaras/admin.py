@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Camara
+from .models import Camara, CalibracionCamara, ReglaCamara
+
+class ReglaCamaraInline(admin.TabularInline):
+    model = ReglaCamara
+    extra = 0
+    fields = ['tipo', 'nombre', 'activa', 'geometria', 'velocidad_maxima', 'hora_inicio', 'hora_fin', 'cooldown_seg']
+
 
 @admin.register(Camara)
 class CamaraAdmin(admin.ModelAdmin):
@@ -15,4 +21,18 @@ class CamaraAdmin(admin.ModelAdmin):
         ('Estado', {
             'fields': ('activa', 'fecha_instalacion', 'ultima_conexion')
         }),
-    )
\ No newline at end of file
+    )
+    inlines = [ReglaCamaraInline]
+
+
+@admin.register(CalibracionCamara)
+class CalibracionCamaraAdmin(admin.ModelAdmin):
+    list_display = ['camara', 'error_reproyeccion', 'fecha_calibracion']
+    readonly_fields = ['homografia', 'error_reproyeccion', 'fecha_calibracion']
+
+
+@admin.register(ReglaCamara)
+class ReglaCamaraAdmin(admin.ModelAdmin):
+    list_display = ['camara', 'tipo', 'nombre', 'activa', 'velocidad_maxima', 'hora_inicio', 'hora_fin', 'cooldown_seg']
+    list_filter = ['tipo', 'activa', 'camara']
+    readonly_fields = ['fecha_actualizacion']
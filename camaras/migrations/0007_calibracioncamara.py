@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('camaras', '0006_camara_indice_webcam_camara_ruta_video_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalibracionCamara',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puntos_imagen', models.JSONField(help_text='Puntos de referencia en píxeles [[x, y], ...] (mínimo 4)')),
+                ('puntos_suelo', models.JSONField(help_text='Los mismos puntos sobre la vía en metros [[x, y], ...]')),
+                ('homografia', models.JSONField(blank=True, help_text='Matriz 3x3 imagen -> suelo, calculada al guardar', null=True)),
+                ('error_reproyeccion', models.FloatField(blank=True, help_text='metros', null=True)),
+                ('fecha_calibracion', models.DateTimeField(auto_now=True)),
+                ('camara', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='calibracion', to='camaras.camara')),
+            ],
+            options={
+                'verbose_name': 'Calibración de cámara',
+                'verbose_name_plural': 'Calibraciones de cámaras',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('camaras', '0007_calibracioncamara'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReglaCamara',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('LUZ_ROJA', 'Luz roja'), ('EXCESO_VEL', 'Exceso de velocidad'), ('INVASION_CARRIL', 'Invasión de carril')], max_length=20)),
+                ('nombre', models.CharField(blank=True, max_length=100)),
+                ('activa', models.BooleanField(default=True)),
+                ('geometria', models.JSONField(blank=True, help_text='LUZ_ROJA: línea de detención [[x1, y1], [x2, y2]]; EXCESO_VEL / INVASION_CARRIL: polígono [[x, y], ...]. Coordenadas 0-1 del frame; vacío = todo el frame', null=True)),
+                ('velocidad_maxima', models.PositiveIntegerField(blank=True, help_text='km/h (solo EXCESO_VEL)', null=True)),
+                ('hora_inicio', models.TimeField(blank=True, help_text='Vacío = todo el día', null=True)),
+                ('hora_fin', models.TimeField(blank=True, null=True)),
+                ('cooldown_seg', models.FloatField(default=5, help_text='Segundos entre infracciones del mismo tipo y vehículo')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('camara', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reglas', to='camaras.camara')),
+            ],
+            options={
+                'verbose_name': 'Regla de cámara',
+                'verbose_name_plural': 'Reglas de cámaras',
+                'ordering': ['camara', 'tipo', 'id'],
+            },
+        ),
+    ]
@@ -53,3 +53,99 @@ class Camara(models.Model):
         elif self.tipo_fuente == 'VIDEO':
             return self.ruta_video
         return 0
+
+
+class CalibracionCamara(models.Model):
+    """Homografía imagen -> plano de la vía de una cámara, para medir velocidades en metros"""
+    camara = models.OneToOneField(Camara, on_delete=models.CASCADE, related_name='calibracion')
+    puntos_imagen = models.JSONField(help_text="Puntos de referencia en píxeles [[x, y], ...] (mínimo 4)")
+    puntos_suelo = models.JSONField(help_text="Los mismos puntos sobre la vía en metros [[x, y], ...]")
+    homografia = models.JSONField(null=True, blank=True, help_text="Matriz 3x3 imagen -> suelo, calculada al guardar")
+    error_reproyeccion = models.FloatField(null=True, blank=True, help_text="metros")
+    fecha_calibracion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Calibración de cámara"
+        verbose_name_plural = "Calibraciones de cámaras"
+
+    def __str__(self):
+        return f"Calibración {self.camara.ubicacion}"
+
+    def calcular_homografia(self):
+        """Ajusta la homografía por mínimos cuadrados con los puntos de referencia"""
+        import cv2
+        import numpy as np
+
+        imagen = np.array(self.puntos_imagen, dtype=np.float32).reshape(-1, 2)
+        suelo = np.array(self.puntos_suelo, dtype=np.float32).reshape(-1, 2)
+        if len(imagen) < 4 or len(imagen) != len(suelo):
+            raise ValueError("Se necesitan al menos 4 pares de puntos imagen/suelo")
+
+        matriz, _ = cv2.findHomography(imagen, suelo, 0)
+        if matriz is None:
+            raise ValueError("Los puntos no permiten calcular una homografía (¿colineales?)")
+
+        proyectados = cv2.perspectiveTransform(imagen.reshape(-1, 1, 2), matriz).reshape(-1, 2)
+        self.homografia = matriz.tolist()
+        self.error_reproyeccion = float(np.linalg.norm(proyectados - suelo, axis=1).mean())
+        return matriz
+
+    def save(self, *args, **kwargs):
+        self.calcular_homografia()
+        super().save(*args, **kwargs)
+
+
+class ReglaCamara(models.Model):
+    """
+    Regla de infracción configurada por cámara. La geometría usa coordenadas
+    normalizadas (0-1) del frame para no depender de la resolución de la fuente
+    """
+    TIPOS = [
+        ('LUZ_ROJA', 'Luz roja'),
+        ('EXCESO_VEL', 'Exceso de velocidad'),
+        ('INVASION_CARRIL', 'Invasión de carril'),
+    ]
+
+    camara = models.ForeignKey(Camara, on_delete=models.CASCADE, related_name='reglas')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    nombre = models.CharField(max_length=100, blank=True)
+    activa = models.BooleanField(default=True)
+    geometria = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="LUZ_ROJA: línea de detención [[x1, y1], [x2, y2]]; EXCESO_VEL / INVASION_CARRIL: "
+                  "polígono [[x, y], ...]. Coordenadas 0-1 del frame; vacío = todo el frame"
+    )
+    velocidad_maxima = models.PositiveIntegerField(null=True, blank=True, help_text="km/h (solo EXCESO_VEL)")
+    hora_inicio = models.TimeField(null=True, blank=True, help_text="Vacío = todo el día")
+    hora_fin = models.TimeField(null=True, blank=True)
+    cooldown_seg = models.FloatField(default=5, help_text="Segundos entre infracciones del mismo tipo y vehículo")
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Regla de cámara"
+        verbose_name_plural = "Reglas de cámaras"
+        ordering = ['camara', 'tipo', 'id']
+
+    def __str__(self):
+        return f"{self.camara.ubicacion} - {self.get_tipo_display()} {self.nombre}".strip()
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+
+        if self.tipo == 'EXCESO_VEL' and not self.velocidad_maxima:
+            raise ValidationError({'velocidad_maxima': "Requerida para reglas de exceso de velocidad"})
+        if (self.hora_inicio is None) != (self.hora_fin is None):
+            raise ValidationError("Indica hora de inicio y de fin, o ninguna")
+        if not self.geometria:
+            return
+
+        puntos = self.geometria
+        minimo = 2 if self.tipo == 'LUZ_ROJA' else 3
+        if (not isinstance(puntos, list) or len(puntos) < minimo
+                or (self.tipo == 'LUZ_ROJA' and len(puntos) != 2)):
+            raise ValidationError({'geometria': f"Se esperan {'2' if minimo == 2 else 'al menos 3'} puntos [x, y]"})
+        for punto in puntos:
+            if (not isinstance(punto, (list, tuple)) or len(punto) != 2
+                    or not all(isinstance(c, (int, float)) and 0 <= c <= 1 for c in punto)):
+                raise ValidationError({'geometria': "Cada punto debe ser [x, y] con valores entre 0 y 1"})
@@ -0,0 +1,129 @@
+"""
+Pool de detectores por cámara
+Un DetectorWebcamMejorado por Camara.id con su propio tracker, cooldowns y lock.
+YOLO y EasyOCR se comparten entre todos (motor_inferencia / ocr), así cambiar de
+cámara no recarga modelos. Los detectores inactivos se desalojan en orden LRU
+en cada obtener() y se detienen en un hilo aparte (detener() espera al escritor).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_DETECTORES = int(os.getenv('POOL_MAX_DETECTORES', 4))
+INACTIVIDAD_SEG = float(os.getenv('POOL_INACTIVIDAD_SEG', 600))
+
+# Clave del detector de la webcam local de pruebas (sin Camara elegida)
+CAMARA_LOCAL = None
+
+
+class PoolDetectores:
+    """Detectores por cámara con desalojo LRU e inactividad"""
+
+    def __init__(self, clase_detector, max_detectores=MAX_DETECTORES,
+                 inactividad_seg=INACTIVIDAD_SEG, **opciones_detector):
+        self.clase_detector = clase_detector
+        self.max_detectores = max(1, max_detectores)
+        self.inactividad_seg = inactividad_seg
+        self.opciones_detector = opciones_detector
+        self._detectores = OrderedDict()  # camara_id -> [detector, ultimo_uso]
+        self._creando = {}  # camara_id -> Event, evita crear dos veces la misma cámara
+        self._lock = threading.Lock()
+
+    def obtener(self, camara=CAMARA_LOCAL):
+        """Detector de la cámara (Camara o None para la webcam local), creándolo si falta"""
+        clave = camara.id if camara is not None else CAMARA_LOCAL
+
+        while True:
+            with self._lock:
+                entrada = self._detectores.get(clave)
+                if entrada is not None:
+                    entrada[1] = time.monotonic()
+                    self._detectores.move_to_end(clave)
+                    desalojados = self._seleccionar_desalojo(conservar=clave)
+                    break
+
+                creando = self._creando.get(clave)
+                if creando is None:
+                    self._creando[clave] = threading.Event()
+                    break
+            # Otra petición ya está creando este detector
+            creando.wait(timeout=30)
+
+        if entrada is not None:
+            self._detener_en_segundo_plano(desalojados)
+            return entrada[0]
+
+        try:
+            detector = self._crear(camara)
+        except Exception as e:
+            print(f"❌ Error al cargar detector para cámara {clave}: {e}")
+            detector = None
+
+        with self._lock:
+            if detector is not None:
+                self._detectores[clave] = [detector, time.monotonic()]
+            self._creando.pop(clave).set()
+            desalojados = self._seleccionar_desalojo(conservar=clave)
+
+        self._detener_en_segundo_plano(desalojados)
+        return detector
+
+    def _crear(self, camara):
+        if camara is None:
+            return self.clase_detector(fuente_video=0, **self.opciones_detector)
+        return self.clase_detector(
+            fuente_video=camara.obtener_fuente_video(),
+            camara=camara,
+            **self.opciones_detector
+        )
+
+    def _seleccionar_desalojo(self, conservar):
+        """Quita del pool los inactivos y los LRU que sobran (no los que están en uso)"""
+        ahora = time.monotonic()
+        desalojados = []
+        for clave, (detector, ultimo_uso) in list(self._detectores.items()):
+            sobran = len(self._detectores) > self.max_detectores
+            inactivo = ahora - ultimo_uso > self.inactividad_seg
+            if not (sobran or inactivo):
+                break
+            if clave == conservar or detector.pipeline is not None or detector.lock.locked():
+                continue
+            del self._detectores[clave]
+            desalojados.append(detector)
+        return desalojados
+
+    def _detener_en_segundo_plano(self, detectores):
+        """Detiene los detectores fuera del hilo de la petición"""
+        for detector in detectores:
+            threading.Thread(target=self._detener, args=(detector,), daemon=True, name='pool-desalojo').start()
+
+    def _detener(self, detector):
+        try:
+            detector.detener()
+            print(f"♻️  Detector desalojado: {detector.camara_db.ubicacion}")
+        except Exception as e:
+            print(f"⚠️  Error al detener detector: {e}")
+
+    def descartar(self, camara_id):
+        """Saca y detiene el detector de una cámara (p. ej. si su fuente cambió)"""
+        with self._lock:
+            entrada = self._detectores.pop(camara_id, None)
+        if entrada is not None:
+            self._detener_en_segundo_plano([entrada[0]])
+
+    def detener_todos(self):
+        with self._lock:
+            detectores = [detector for detector, _ in self._detectores.values()]
+            self._detectores.clear()
+        for detector in detectores:
+            self._detener(detector)
+
+    def estado(self):
+        """Cámaras con detector cargado, de menos a más recientemente usada"""
+        ahora = time.monotonic()
+        with self._lock:
+            return [
+                {'camara_id': clave, 'inactivo_seg': round(ahora - ultimo_uso, 1)}
+                for clave, (_, ultimo_uso) in self._detectores.items()
+            ]
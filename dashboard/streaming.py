@@ -0,0 +1,172 @@
+"""
+Streaming de video del dashboard
+Difusión MJPEG (multipart/x-mixed-replace) con captura en el servidor: el frame
+anotado se codifica a JPEG una sola vez y se comparte entre todos los clientes
+"""
+import os
+import threading
+import time
+import weakref
+
+import cv2
+import numpy as np
+
+from vision_ai.pipeline import PipelineDeteccion
+
+JPEG_CALIDAD = int(os.getenv('STREAM_JPEG_CALIDAD', 80))
+LIMITE_BOUNDARY = 'frame'
+# Corte de cada conexión MJPEG: bajo WSGI ocupa un worker mientras dura; el cliente reconecta
+DURACION_MAX_MJPEG = float(os.getenv('STREAM_MJPEG_MAX_SEG', 300))
+
+
+def metadatos_detector(detector):
+    """Estado de detección que se envía al cliente junto a cada frame"""
+    fps_promedio = sum(detector.fps_real) / len(detector.fps_real) if detector.fps_real else 0
+    return {
+        'vehiculos': detector.tracks.activos(),
+        'placas_peruanas': detector.tracks.con_placa(),
+        'fps': round(fps_promedio, 1),
+        'frame_count': detector.frame_count,
+        'infracciones': len(detector.ultimas_infracciones),
+        'ultimas_infracciones': [
+            {
+                'tipo': infraccion['tipo'],
+                'placa': infraccion['placa'],
+                'timestamp': infraccion['timestamp'].isoformat(),
+            }
+            for infraccion in list(detector.ultimas_infracciones)[-5:]
+        ],
+    }
+
+
+def codificar_jpeg(frame, calidad=JPEG_CALIDAD):
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+    if not ok:
+        raise ValueError("No se pudo codificar el frame")
+    return buffer.tobytes()
+
+
+def procesar_jpeg(detector, datos):
+    """Decodifica un JPEG binario, lo pasa por el detector y retorna el JPEG anotado"""
+    frame = cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Frame JPEG inválido")
+    return codificar_jpeg(detector.procesar_frame(frame))
+
+
+class DifusorMJPEG:
+    """
+    Corre el pipeline del detector mientras haya clientes conectados y publica
+    el último frame anotado ya codificado en JPEG
+    """
+
+    def __init__(self, detector, calidad=JPEG_CALIDAD):
+        self.detector = detector
+        self.calidad = calidad
+        self.suscriptores = 0
+        self._jpeg = None
+        self._numero = 0
+        self._pipeline = None
+        self._hilo = None
+        self._cond = threading.Condition()
+
+    def _suscribir(self):
+        pipeline = None
+        with self._cond:
+            self.suscriptores += 1
+            if self._pipeline is None:
+                pipeline = self._pipeline = PipelineDeteccion(self.detector)
+                hilo_anterior = self._hilo
+
+        if pipeline is None:
+            return
+
+        if hilo_anterior is not None and hilo_anterior.is_alive():
+            # El pipeline anterior todavía suelta la captura
+            hilo_anterior.join(timeout=3)
+
+        with self._cond:
+            if self._pipeline is pipeline:
+                self._hilo = threading.Thread(
+                    target=self._difundir, args=(pipeline,), daemon=True, name='difusor-mjpeg'
+                )
+                self._hilo.start()
+
+    def _desuscribir(self):
+        with self._cond:
+            self.suscriptores -= 1
+            if self.suscriptores <= 0:
+                self.suscriptores = 0
+                self._pipeline = None
+                self._cond.notify_all()
+
+    def _difundir(self, pipeline):
+        # Bajo el lock: un procesar_frame en curso termina antes y los siguientes se rechazan
+        with self.detector.lock:
+            self.detector.pipeline = pipeline
+        pipeline.iniciar()
+        try:
+            while pipeline.activo and self._pipeline is pipeline:
+                frame = pipeline.obtener_salida(timeout=1.0)
+                if frame is None:
+                    continue
+                jpeg = codificar_jpeg(frame, self.calidad)
+                with self._cond:
+                    self._jpeg = jpeg
+                    self._numero += 1
+                    self._cond.notify_all()
+        except Exception as e:
+            print(f"❌ Error en difusión MJPEG: {e}")
+        finally:
+            pipeline.detener()
+            if self.detector.pipeline is pipeline:
+                self.detector.pipeline = None
+            with self._cond:
+                if self._pipeline is pipeline:
+                    self._pipeline = None
+                self._cond.notify_all()
+
+    def frames(self, timeout=5.0):
+        """Generador de JPEGs nuevos para un cliente; termina si la fuente se agota"""
+        self._suscribir()
+        try:
+            ultimo = self._numero
+            while True:
+                with self._cond:
+                    self._cond.wait_for(
+                        lambda: self._numero != ultimo or self._pipeline is None, timeout
+                    )
+                    if self._pipeline is None:
+                        return
+                    if self._numero == ultimo:
+                        continue
+                    ultimo, jpeg = self._numero, self._jpeg
+                yield jpeg
+        finally:
+            self._desuscribir()
+
+    def mjpeg(self, duracion_max=DURACION_MAX_MJPEG):
+        """Cuerpo multipart/x-mixed-replace para StreamingHttpResponse; termina a los duracion_max segundos"""
+        limite = time.monotonic() + duracion_max
+        for jpeg in self.frames():
+            if time.monotonic() >= limite:
+                return
+            yield (
+                f'--{LIMITE_BOUNDARY}\r\n'
+                f'Content-Type: image/jpeg\r\n'
+                f'Content-Length: {len(jpeg)}\r\n\r\n'
+            ).encode() + jpeg + b'\r\n'
+
+
+_difusores = weakref.WeakKeyDictionary()
+_difusores_lock = threading.Lock()
+
+
+def obtener_difusor(detector):
+    """Un difusor por detector, compartido por todos sus espectadores"""
+    with _difusores_lock:
+        difusor = _difusores.get(detector)
+        if difusor is None:
+            difusor = DifusorMJPEG(detector)
+            _difusores[detector] = difusor
+        return difusor
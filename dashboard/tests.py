@@ -1,3 +1,137 @@
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from vision_ai.detector_webcam_mejorado import DetectorWebcamMejorado
+from vision_ai.pipeline import Paquete, PipelineActivo, PipelineDeteccion
+from . import views
+from .detectores import PoolDetectores
+from .websocket import RUTA, deteccion_websocket
+
+
+def detector_falso():
+    return SimpleNamespace(
+        cap=None, lock=threading.Lock(), frame_count=0, pipeline=None,
+        evaluar_reglas=lambda frame, resultados: {'infracciones': []},
+    )
+
+
+class RelojDetectorTests(TestCase):
+
+    def _evaluar(self, pipeline, *numeros):
+        for numero in numeros:
+            pipeline._evaluar(Paquete(numero, None, 0.0))
+
+    def test_frame_count_no_retrocede_con_un_pipeline_nuevo(self):
+        detector = detector_falso()
+        # Frames 2 y 4 descartados en captura: el reloj cuenta los capturados
+        self._evaluar(PipelineDeteccion(detector), 1, 3, 5)
+        self.assertEqual(detector.frame_count, 5)
+
+        # El difusor crea otro pipeline (su captura vuelve a numerar desde 1)
+        self._evaluar(PipelineDeteccion(detector), 1, 2)
+        self.assertEqual(detector.frame_count, 7)
+
+    def test_procesar_frame_rechazado_mientras_corre_el_pipeline(self):
+        detector = detector_falso()
+        detector.pipeline = PipelineDeteccion(detector)
+        with self.assertRaises(PipelineActivo):
+            DetectorWebcamMejorado.procesar_frame(detector, np.zeros((4, 4, 3), np.uint8))
+        self.assertEqual(detector.frame_count, 0)
+
+    def test_inferencia_no_espera_el_lock_del_detector(self):
+        detector = detector_falso()
+        detector.inferir = lambda frame: ['resultado']
+        paquete = Paquete(1, None, 0.0)
+        with detector.lock:
+            hilo = threading.Thread(target=PipelineDeteccion(detector)._inferir, args=(paquete,))
+            hilo.start()
+            hilo.join(2)
+        self.assertEqual(paquete.resultados, ['resultado'])
+
+
+class DetectorDelPool:
+
+    def __init__(self, fuente_video, camara=None):
+        self.camara_db = camara
+        self.pipeline = None
+        self.lock = threading.Lock()
+        self.detenido = threading.Event()
+        self.hilo_detencion = None
+
+    def detener(self):
+        self.hilo_detencion = threading.current_thread().name
+        self.detenido.set()
+
+
+class PoolDetectoresTests(TestCase):
+
+    def _camara(self, camara_id):
+        return SimpleNamespace(id=camara_id, ubicacion=f'Cámara {camara_id}', obtener_fuente_video=lambda: 0)
+
+    def test_desaloja_inactivos_al_reusar_un_detector(self):
+        pool = PoolDetectores(DetectorDelPool, max_detectores=4, inactividad_seg=60)
+        viejo = pool.obtener(self._camara(1))
+        en_uso = pool.obtener(self._camara(2))
+        pool._detectores[1][1] -= 120
+
+        self.assertIs(pool.obtener(self._camara(2)), en_uso)
+        self.assertTrue(viejo.detenido.wait(2))
+        self.assertEqual(viejo.hilo_detencion, 'pool-desalojo')
+        self.assertEqual([e['camara_id'] for e in pool.estado()], [2])
+        self.assertFalse(en_uso.detenido.is_set())
+
+    def test_no_desaloja_un_detector_con_pipeline(self):
+        pool = PoolDetectores(DetectorDelPool, max_detectores=1)
+        transmitiendo = pool.obtener(self._camara(1))
+        transmitiendo.pipeline = object()
+        pool.obtener(self._camara(2))
+        self.assertEqual({e['camara_id'] for e in pool.estado()}, {1, 2})
+        self.assertFalse(transmitiendo.detenido.is_set())
+
+
+class AutenticacionStreamTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('operador', password='clave-segura')
+
+    def _websocket(self, cookie=None):
+        """Mensajes enviados por el handler ante un connect seguido de disconnect"""
+        eventos = iter([{'type': 'websocket.connect'}, {'type': 'websocket.disconnect'}])
+        enviados = []
+
+        async def receive():
+            return next(eventos)
+
+        async def send(mensaje):
+            enviados.append(mensaje)
+
+        headers = [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={cookie}'.encode())] if cookie else []
+        scope = {'type': 'websocket', 'path': RUTA, 'query_string': b'', 'headers': headers}
+        async_to_sync(deteccion_websocket)(scope, receive, send)
+        return enviados
+
+    def test_websocket_sin_sesion_se_rechaza(self):
+        self.assertEqual(self._websocket(), [{'type': 'websocket.close', 'code': 4401}])
+        self.assertEqual(self._websocket('clave-inexistente'), [{'type': 'websocket.close', 'code': 4401}])
+
+    def test_websocket_con_sesion_se_acepta(self):
+        self.client.force_login(self.usuario)
+        cookie = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertEqual(self._websocket(cookie)[0], {'type': 'websocket.accept'})
+
+    def test_video_feed_requiere_sesion(self):
+        with mock.patch.object(views, 'obtener_detector', return_value=None) as obtener:
+            respuesta = self.client.get('/dashboard/video-feed/')
+            self.assertEqual(respuesta.status_code, 401)
+            obtener.assert_not_called()
+
+            self.client.force_login(self.usuario)
+            respuesta = self.client.get('/dashboard/video-feed/')
+            self.assertNotEqual(respuesta.status_code, 401)
@@ -1,15 +1,16 @@
 from django.shortcuts import render
 from django.http import StreamingHttpResponse, JsonResponse
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Sum
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from datetime import datetime, timedelta
+from collections import defaultdict
 from camaras.models import Camara
-from infracciones.models import Infraccion, TipoInfraccion
+from infracciones.models import Infraccion, InfraccionResumenHora
+from infracciones.cache import obtener_camara, contexto_cacheado, CLAVE_DASHBOARD_HOME
 import json
 import cv2
 import numpy as np
-import threading
 from pathlib import Path
 
 import sys
@@ -19,95 +20,90 @@ sys.path.append(str(BASE_DIR))
 
 try:
     from vision_ai.detector_webcam_mejorado import DetectorWebcamMejorado
+    from vision_ai.pipeline import PipelineActivo
+    from .streaming import metadatos_detector, obtener_difusor
+    from .detectores import PoolDetectores
     YOLO_AVAILABLE = True
 except ImportError as e:
     print(f"YOLO not available: {e}")
     YOLO_AVAILABLE = False
     # Define una clase dummy o maneja el caso
     DetectorWebcamMejorado = None
+    PipelineActivo = RuntimeError
     
-detector_global = None
-detector_lock = threading.Lock()
-camara_actual = None
-
 USE_LOCAL_VIDEO = os.getenv("USE_LOCAL_VIDEO", "False") == "True"
 
-def inicializar_detector(fuente_video=0):
-    """Inicializa el detector optimizado"""
-    global detector_global, camara_actual
-    
-    with detector_lock:
-        # Si ya hay un detector y es la misma fuente, no reiniciar
-        if detector_global is not None and camara_actual == fuente_video:
-            return detector_global
-        
-        # Detener detector anterior si existe
-        if detector_global is not None:
-            try:
-                detector_global.detener()
-            except:
-                pass
-        
-        try:
-            detector_global = DetectorWebcamMejorado(
-                fuente_video=fuente_video,
-                skip_frames=2,
-                usar_gpu=True
-            )
-            camara_actual = fuente_video
-            print(f"✅ Detector cargado con fuente: {fuente_video}")
-            return detector_global
-        except Exception as e:
-            print(f"❌ Error al cargar detector: {e}")
-            detector_global = None
-            camara_actual = None
-            return None
+# Un detector por cámara; YOLO y EasyOCR se comparten entre todos
+pool_detectores = PoolDetectores(DetectorWebcamMejorado, skip_frames=2, usar_gpu=True) if YOLO_AVAILABLE else None
 
-def home(request):
-    hoy = datetime.now().date()
+
+def obtener_detector(camara_id=None):
+    """
+    Detector del pool para la cámara indicada (None = webcam local de pruebas)
+    Lanza Camara.DoesNotExist si la cámara no existe o está inactiva
+    """
+    if pool_detectores is None:
+        return None
     
-    camaras_disponibles = Camara.objects.filter(activa=True)
-    total_camaras = camaras_disponibles.count()
+    camara = None
+    if camara_id:
+        camara = obtener_camara(int(camara_id))
+        if camara is None or not camara.activa:
+            raise Camara.DoesNotExist
+    return pool_detectores.obtener(camara)
+
+def construir_contexto_home():
+    """Contexto del dashboard leído del resumen horario (en vez de un count por hora)"""
+    ahora = datetime.now()
+    inicio_hoy = datetime.combine(ahora.date(), datetime.min.time())
+    hora_actual = ahora.replace(minute=0, second=0, microsecond=0)
+    primera_hora = hora_actual - timedelta(hours=23)
     
-    # Infracciones de hoy
-    infracciones_hoy = Infraccion.objects.filter(
-        fecha_hora__date=hoy
-    ).count()
+    camaras_disponibles = list(Camara.objects.filter(activa=True))
     
     # Alertas activas
-    alertas_activas = Infraccion.objects.filter(
-        estado='DETECTADA'
-    ).count()
+    alertas_activas = Infraccion.objects.aggregate(
+        total=Count('id', filter=Q(estado='DETECTADA'))
+    )['total']
     
-    # Infracciones por tipo (últimas 24 horas)
-    hace_24h = datetime.now() - timedelta(hours=24)
-    infracciones_recientes = Infraccion.objects.filter(
-        fecha_hora__gte=hace_24h
-    ).values('tipo_infraccion__nombre').annotate(
-        total=Count('id')
+    # Últimas 24 horas por hora y tipo en una sola consulta sobre el resumen
+    filas = InfraccionResumenHora.objects.filter(
+        hora__gte=primera_hora
+    ).values('hora', 'tipo_infraccion__nombre').annotate(
+        total=Sum('total')
     )
     
-    # Últimas infracciones
-    ultimas_infracciones = Infraccion.objects.select_related(
-        'vehiculo', 'tipo_infraccion', 'camara'
-    ).order_by('-fecha_hora')[:10]
+    por_hora = defaultdict(int)
+    por_tipo = defaultdict(int)
+    infracciones_hoy = 0
+    for fila in filas:
+        por_hora[fila['hora']] += fila['total']
+        por_tipo[fila['tipo_infraccion__nombre']] += fila['total']
+        if fila['hora'] >= inicio_hoy:
+            infracciones_hoy += fila['total']
     
-    # Estadísticas por hora
+    # Estadísticas por hora (las 24 últimas, incluyendo la actual)
     infracciones_por_hora = []
     for i in range(24):
-        hora_inicio = datetime.now() - timedelta(hours=24-i)
-        hora_fin = hora_inicio + timedelta(hours=1)
-        count = Infraccion.objects.filter(
-            fecha_hora__gte=hora_inicio,
-            fecha_hora__lt=hora_fin
-        ).count()
+        hora = primera_hora + timedelta(hours=i)
         infracciones_por_hora.append({
-            'hora': hora_inicio.strftime('%H:00'),
-            'count': count
+            'hora': hora.strftime('%H:00'),
+            'count': por_hora.get(hora, 0)
         })
     
-    context = {
-        'total_camaras': total_camaras,
+    # Infracciones por tipo (últimas 24 horas)
+    infracciones_recientes = [
+        {'tipo_infraccion__nombre': nombre, 'total': total}
+        for nombre, total in por_tipo.items()
+    ]
+    
+    # Últimas infracciones
+    ultimas_infracciones = list(Infraccion.objects.select_related(
+        'vehiculo', 'tipo_infraccion', 'camara'
+    ).order_by('-fecha_hora')[:10])
+    
+    return {
+        'total_camaras': len(camaras_disponibles),
         'camaras_disponibles': camaras_disponibles,
         'infracciones_hoy': infracciones_hoy,
         'alertas_activas': alertas_activas,
@@ -115,7 +111,10 @@ def home(request):
         'ultimas_infracciones': ultimas_infracciones,
         'infracciones_por_hora': infracciones_por_hora,
     }
-    
+
+
+def home(request):
+    context = contexto_cacheado(CLAVE_DASHBOARD_HOME, construir_contexto_home)
     return render(request, "dashboard/home.html", context)
 
 @csrf_exempt
@@ -130,14 +129,15 @@ def seleccionar_camara(request):
             return JsonResponse({'error': 'ID de cámara requerido'}, status=400)
         
         camara = Camara.objects.get(id=camara_id, activa=True)
-        fuente_video = camara.obtener_fuente_video()
         
-        # Inicializar detector con la nueva fuente
-        detector = inicializar_detector(fuente_video)
+        # Detector de esa cámara desde el pool (solo se crea la primera vez)
+        detector = pool_detectores.obtener(camara) if pool_detectores is not None else None
         
         if detector is None:
             return JsonResponse({'error': 'No se pudo inicializar el detector'}, status=500)
         
+        request.session['camara_id'] = camara.id
+        
         return JsonResponse({
             'status': 'success',
             'message': f'Cámara cambiada a: {camara.ubicacion}',
@@ -174,36 +174,28 @@ def procesar_frame_webcam(request):
         frame = np.array(image)
         frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
         
-        detector = detector_global
-        if detector is None:
-            detector = inicializar_detector(0)
+        detector = obtener_detector(request.session.get('camara_id'))
         
         if detector is None:
             return JsonResponse({'error': 'Detector no disponible'}, status=500)
         
-        # Procesar frame
+        # Procesar frame (serializado por el lock del detector de esta cámara)
         frame_procesado = detector.procesar_frame(frame)
         
         # Convertir frame procesado a base64
         _, buffer = cv2.imencode('.jpg', frame_procesado, [cv2.IMWRITE_JPEG_QUALITY, 85])
         frame_base64 = base64.b64encode(buffer).decode('utf-8')
         
-        fps_promedio = sum(detector.fps_real) / len(detector.fps_real) if detector.fps_real else 0
-        
-        detecciones = {
-            'vehiculos': len(detector.vehiculos_trackeados),
-            'placas_peruanas': len(detector.placas_detectadas),
-            'fps': round(fps_promedio, 1),
-            'frame_count': detector.frame_count,
-            'infracciones': len(detector.ultimas_infracciones)
-        }
-        
         return JsonResponse({
             'status': 'success',
             'frame': f'data:image/jpeg;base64,{frame_base64}',
-            'detecciones': detecciones
+            'detecciones': metadatos_detector(detector)
         })
         
+    except Camara.DoesNotExist:
+        return JsonResponse({'error': 'Cámara no encontrada'}, status=404)
+    except PipelineActivo as e:
+        return JsonResponse({'error': str(e)}, status=409)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -231,7 +223,31 @@ def api_detecciones(request):
     return JsonResponse({'detecciones': list(detecciones)})
 
 def video_feed(request):
-    """Endpoint para streaming de video (opcional, para integración futura)"""
-    # Este endpoint se puede usar para streaming desde el servidor
-    # Por ahora, el video se maneja en el cliente
-    return JsonResponse({'message': 'Video feed endpoint'})
+    """
+    Stream MJPEG (multipart/x-mixed-replace) con captura en el servidor
+    ?camara_id=N cambia antes a esa cámara; cada frame anotado se codifica una
+    sola vez y se comparte entre todos los espectadores. La conexión se corta a
+    los STREAM_MJPEG_MAX_SEG segundos (el dashboard la renueva antes)
+    Requiere sesión autenticada, igual que el WebSocket de detección
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+    
+    if not YOLO_AVAILABLE:
+        return JsonResponse({'error': 'Detector no disponible'}, status=503)
+    
+    camara_id = request.GET.get('camara_id') or request.session.get('camara_id')
+    try:
+        detector = obtener_detector(camara_id)
+    except (Camara.DoesNotExist, ValueError):
+        return JsonResponse({'error': 'Cámara no encontrada'}, status=404)
+    
+    if detector is None:
+        return JsonResponse({'error': 'Detector no disponible'}, status=500)
+    
+    response = StreamingHttpResponse(
+        obtener_difusor(detector).mjpeg(),
+        content_type='multipart/x-mixed-replace; boundary=frame'
+    )
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
@@ -0,0 +1,112 @@
+"""
+WebSocket de detección (ASGI puro, montado en seguridad/asgi.py)
+Usa el detector del pool de la cámara indicada en ?camara_id=.
+El cliente envía frames JPEG como mensajes binarios; el servidor responde con
+el JPEG anotado (binario) seguido de los metadatos de detección (texto JSON).
+Sin frames entrantes, igual empuja metadatos cada INTERVALO_METADATOS segundos
+para los clientes que ven el stream MJPEG; mientras ese stream corre, los
+frames del cliente se rechazan con un error (el detector tiene un solo flujo).
+Solo acepta conexiones con una sesión de usuario autenticado (cookie de sesión
+de Django, la misma del admin).
+"""
+import asyncio
+import json
+import os
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+
+from vision_ai.pipeline import PipelineActivo
+
+from .streaming import metadatos_detector, procesar_jpeg
+
+RUTA = '/ws/deteccion/'
+INTERVALO_METADATOS = float(os.getenv('WS_INTERVALO_METADATOS', 1.0))
+
+
+def _obtener_detector(camara_id):
+    from camaras.models import Camara
+    from . import views
+
+    try:
+        return views.obtener_detector(camara_id)
+    except (Camara.DoesNotExist, ValueError):
+        return None
+
+
+def _usuario_de(scope):
+    """Usuario de la sesión indicada por la cookie del handshake (AnonymousUser si no hay)"""
+    from django.conf import settings
+    from django.contrib.auth import get_user
+
+    cookies = SimpleCookie()
+    for nombre, valor in scope.get('headers', []):
+        if nombre == b'cookie':
+            cookies.load(valor.decode('latin-1'))
+    clave = cookies.get(settings.SESSION_COOKIE_NAME)
+    sesion = import_module(settings.SESSION_ENGINE).SessionStore(clave.value if clave else None)
+    return get_user(SimpleNamespace(session=sesion))
+
+
+async def deteccion_websocket(scope, receive, send):
+    evento = await receive()
+    if evento['type'] != 'websocket.connect':
+        return
+    usuario = await sync_to_async(_usuario_de)(scope)
+    if not usuario.is_authenticated:
+        # Cerrar antes de aceptar rechaza el handshake (HTTP 403)
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+    await send({'type': 'websocket.accept'})
+
+    # ?camara_id=N elige el detector de esa cámara en el pool
+    camara_id = parse_qs(scope.get('query_string', b'').decode()).get('camara_id', [None])[0]
+
+    # Solo se conserva el frame más reciente: si el detector va lento se descartan los viejos
+    entrada = asyncio.Queue(maxsize=1)
+
+    def depositar(item):
+        if entrada.full():
+            entrada.get_nowait()
+        entrada.put_nowait(item)
+
+    async def leer():
+        while True:
+            evento = await receive()
+            if evento['type'] == 'websocket.disconnect':
+                depositar(None)
+                return
+            if evento.get('bytes'):
+                depositar(evento['bytes'])
+
+    lector = asyncio.create_task(leer())
+    obtener_detector = sync_to_async(_obtener_detector, thread_sensitive=False)
+    procesar = sync_to_async(procesar_jpeg, thread_sensitive=False)
+
+    try:
+        while True:
+            try:
+                datos = await asyncio.wait_for(entrada.get(), INTERVALO_METADATOS)
+            except asyncio.TimeoutError:
+                datos = b''
+            if datos is None:
+                break
+
+            detector = await obtener_detector(camara_id)
+            if detector is None:
+                await send({'type': 'websocket.send', 'text': json.dumps({'error': 'Detector no disponible'})})
+                continue
+
+            if datos:
+                try:
+                    await send({'type': 'websocket.send', 'bytes': await procesar(detector, datos)})
+                except (ValueError, PipelineActivo) as e:
+                    await send({'type': 'websocket.send', 'text': json.dumps({'error': str(e)})})
+                    continue
+
+            await send({'type': 'websocket.send', 'text': json.dumps(metadatos_detector(detector))})
+    finally:
+        lector.cancel()
@@ -5,3 +5,6 @@ class InfraccionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'infracciones'
     verbose_name = 'Gestión de Infracciones'
+
+    def ready(self):
+        from . import signals  # noqa: F401
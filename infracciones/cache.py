@@ -0,0 +1,249 @@
+"""
+Cachés en proceso para las búsquedas del camino caliente de detección
+Catálogo de TipoInfraccion por código, LRU placa -> vehiculo_id y cámaras por id.
+Cada entrada expira por TTL y las señales post_save/post_delete las invalidan
+(ver infracciones/signals.py), así el catálogo casi estático no viaja a la BD
+en cada infracción registrada.
+También guarda, con TTL corto, el contexto ya armado de las vistas de estadísticas,
+que se invalida al registrarse nuevas infracciones.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TTL_TIPOS = float(os.getenv('CACHE_TIPOS_TTL', 300))
+TTL_VEHICULOS = float(os.getenv('CACHE_VEHICULOS_TTL', 600))
+MAX_VEHICULOS = int(os.getenv('CACHE_VEHICULOS_MAX', 5000))
+TTL_CAMARAS = float(os.getenv('CACHE_CAMARAS_TTL', 300))
+TTL_ESTADISTICAS = int(os.getenv('CACHE_ESTADISTICAS_TTL', 30))
+
+# Contextos de vistas que dependen de las infracciones registradas
+CLAVE_DASHBOARD_HOME = 'estadisticas:dashboard_home'
+CLAVE_ESTADISTICAS = 'estadisticas:infracciones'
+CLAVES_ESTADISTICAS = (CLAVE_DASHBOARD_HOME, CLAVE_ESTADISTICAS)
+
+
+class CatalogoTipos:
+    """Catálogo completo de TipoInfraccion precargado y keyed por codigo"""
+
+    def __init__(self, ttl=TTL_TIPOS):
+        self.ttl = ttl
+        self._tipos = None
+        self._expira = 0.0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.recargas = 0
+
+    def _catalogo(self):
+        from .models import TipoInfraccion
+
+        with self._lock:
+            if self._tipos is None or time.monotonic() >= self._expira:
+                self._tipos = {tipo.codigo: tipo for tipo in TipoInfraccion.objects.all()}
+                self._expira = time.monotonic() + self.ttl
+                self.recargas += 1
+            else:
+                self.aciertos += 1
+            return self._tipos
+
+    def obtener(self, codigo):
+        """TipoInfraccion con ese código o None"""
+        return self._catalogo().get(codigo)
+
+    def obtener_varios(self, codigos):
+        """Retorna {codigo: TipoInfraccion} solo con los códigos existentes"""
+        catalogo = self._catalogo()
+        return {codigo: catalogo[codigo] for codigo in codigos if codigo in catalogo}
+
+    def invalidar(self):
+        with self._lock:
+            self._tipos = None
+
+
+class CacheVehiculos:
+    """LRU acotado placa -> vehiculo_id con TTL por entrada"""
+
+    def __init__(self, max_entradas=MAX_VEHICULOS, ttl=TTL_VEHICULOS):
+        self.max_entradas = max(1, max_entradas)
+        self.ttl = ttl
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def obtener_ids(self, placas):
+        """Retorna {placa: vehiculo_id} para las placas en caché (las demás faltan)"""
+        ahora = time.monotonic()
+        encontrados = {}
+        with self._lock:
+            for placa in placas:
+                entrada = self._ids.get(placa)
+                if entrada is None or entrada[1] <= ahora:
+                    if entrada is not None:
+                        del self._ids[placa]
+                    self.fallos += 1
+                    continue
+                self._ids.move_to_end(placa)
+                encontrados[placa] = entrada[0]
+                self.aciertos += 1
+        return encontrados
+
+    def guardar(self, ids_por_placa):
+        expira = time.monotonic() + self.ttl
+        with self._lock:
+            for placa, vehiculo_id in ids_por_placa.items():
+                self._ids[placa] = (vehiculo_id, expira)
+                self._ids.move_to_end(placa)
+            while len(self._ids) > self.max_entradas:
+                self._ids.popitem(last=False)
+                self.desalojos += 1
+
+    def invalidar(self, placa=None, vehiculo_id=None):
+        """Quita la placa y cualquier entrada que apunte al mismo vehículo"""
+        with self._lock:
+            self._ids.pop(placa, None)
+            if vehiculo_id is not None:
+                for clave in [p for p, (vid, _) in self._ids.items() if vid == vehiculo_id]:
+                    del self._ids[clave]
+
+    def limpiar(self):
+        with self._lock:
+            self._ids.clear()
+
+
+class CacheCamaras:
+    """Cámaras por id con TTL"""
+
+    def __init__(self, ttl=TTL_CAMARAS):
+        self.ttl = ttl
+        self._camaras = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, camara_id):
+        """Camara con ese id o None si no existe"""
+        from camaras.models import Camara
+
+        with self._lock:
+            entrada = self._camaras.get(camara_id)
+            if entrada is not None and entrada[1] > time.monotonic():
+                return entrada[0]
+
+        camara = Camara.objects.filter(id=camara_id).first()
+        if camara is not None:
+            with self._lock:
+                self._camaras[camara_id] = (camara, time.monotonic() + self.ttl)
+        return camara
+
+    def invalidar(self, camara_id=None):
+        with self._lock:
+            if camara_id is None:
+                self._camaras.clear()
+            else:
+                self._camaras.pop(camara_id, None)
+
+
+tipos_infraccion = CatalogoTipos()
+vehiculos = CacheVehiculos()
+camaras = CacheCamaras()
+
+
+def obtener_tipo_infraccion(codigo):
+    """TipoInfraccion por código desde el catálogo en memoria (None si no existe)"""
+    return tipos_infraccion.obtener(codigo)
+
+
+def obtener_camara(camara_id):
+    """Camara por id desde la caché (None si no existe)"""
+    return camaras.obtener(camara_id)
+
+
+def _ids_por_placa(placas):
+    from .consultas import filtrar_en_bloques
+    from .models import Vehiculo
+
+    ids = {}
+    for bloque in filtrar_en_bloques(Vehiculo.objects, 'placa', placas):
+        ids.update(bloque.values_list('placa', 'id'))
+    return ids
+
+
+def _crear_vehiculos(placas):
+    """
+    Inserta los vehículos de esas placas. mssql-django no admite
+    bulk_create(ignore_conflicts=True): si otro proceso insertó alguna placa
+    entre la consulta y el INSERT, se rehace placa por placa con get_or_create
+    """
+    from django.db import IntegrityError, transaction
+
+    from .models import Vehiculo
+
+    try:
+        with transaction.atomic():
+            Vehiculo.objects.bulk_create([Vehiculo(placa=placa, tipo_vehiculo='AUTO') for placa in placas])
+    except IntegrityError:
+        for placa in placas:
+            with transaction.atomic():
+                Vehiculo.objects.get_or_create(placa=placa, defaults={'tipo_vehiculo': 'AUTO'})
+
+
+def obtener_ids_vehiculos(placas):
+    """
+    Retorna {placa: vehiculo_id}, resolviendo los fallos de caché con una sola
+    consulta __in y creando en bloque los vehículos que no existan.
+    Los ids se guardan en la caché recién al confirmar la transacción: si el
+    lote que los creó hace rollback, la caché no queda con ids inexistentes
+    """
+    from django.db import transaction
+
+    placas = set(placas)
+    ids = vehiculos.obtener_ids(placas)
+
+    faltantes = placas - ids.keys()
+    if faltantes:
+        nuevos = _ids_por_placa(faltantes)
+        por_crear = faltantes - nuevos.keys()
+        if por_crear:
+            _crear_vehiculos(por_crear)
+            nuevos.update(_ids_por_placa(por_crear))
+        transaction.on_commit(lambda: vehiculos.guardar(nuevos))
+        ids.update(nuevos)
+
+    return ids
+
+
+def obtener_id_vehiculo(placa):
+    """vehiculo_id para una placa, creando el vehículo si no existe"""
+    return obtener_ids_vehiculos([placa])[placa]
+
+
+def contexto_cacheado(clave, construir, ttl=TTL_ESTADISTICAS):
+    """Contexto de una vista desde la caché de Django, armándolo con construir() si falta"""
+    from django.core.cache import cache as cache_django
+
+    contexto = cache_django.get(clave)
+    if contexto is None:
+        contexto = construir()
+        cache_django.set(clave, contexto, ttl)
+    return contexto
+
+
+def invalidar_estadisticas():
+    from django.core.cache import cache as cache_django
+
+    cache_django.delete_many(CLAVES_ESTADISTICAS)
+
+
+def metricas():
+    """Aciertos/fallos de cada caché"""
+    return {
+        'tipos': {'aciertos': tipos_infraccion.aciertos, 'recargas': tipos_infraccion.recargas},
+        'vehiculos': {
+            'aciertos': vehiculos.aciertos,
+            'fallos': vehiculos.fallos,
+            'desalojos': vehiculos.desalojos,
+            'entradas': len(vehiculos._ids),
+        },
+        'camaras': {'entradas': len(camaras._camaras)},
+    }
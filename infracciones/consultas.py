@@ -0,0 +1,54 @@
+"""
+Recorridos de consultas portables a SQL Server (mssql-django)
+- filtrar_en_bloques: divide un filtro __in grande; SQL Server admite ~2100
+  parámetros por consulta
+- lotes_keyset / recorrer_keyset: leen una consulta grande en lotes que siguen
+  a la última fila (sin OFFSET); mssql-django no tiene cursores de servidor y
+  .iterator() trae todo el resultado a memoria
+"""
+from django.db.models import Q
+
+MAX_PARAMETROS_IN = 1000
+
+
+def filtrar_en_bloques(consulta, campo, valores, tam=MAX_PARAMETROS_IN):
+    """Genera consulta.filter(<campo>__in=bloque) para cada bloque de hasta `tam` valores"""
+    valores = list(valores)
+    for inicio in range(0, len(valores), tam):
+        yield consulta.filter(**{f'{campo}__in': valores[inicio:inicio + tam]})
+
+
+def despues_de(orden, valores):
+    """Q de las filas que siguen a `valores` en el orden ascendente de las columnas `orden`"""
+    condicion = Q()
+    for i in range(len(orden)):
+        iguales = {columna: valor for columna, valor in zip(orden[:i], valores[:i])}
+        condicion |= Q(**iguales, **{f'{orden[i]}__gt': valores[i]})
+    return condicion
+
+
+def lotes_keyset(consulta, campos, orden=('id',), tam_lote=1000, limite=None):
+    """
+    Listas de tuplas values_list(*campos) ordenadas por `orden` (la última
+    columna debe ser única), de hasta tam_lote filas y limite filas en total
+    """
+    indices = [campos.index(columna) for columna in orden]
+    consulta = consulta.order_by(*orden)
+    siguiente, entregadas = consulta, 0
+    while True:
+        tamano = tam_lote if not limite else min(tam_lote, limite - entregadas)
+        if tamano <= 0:
+            return
+        lote = list(siguiente.values_list(*campos)[:tamano])
+        if lote:
+            yield lote
+        entregadas += len(lote)
+        if len(lote) < tamano:
+            return
+        siguiente = consulta.filter(despues_de(orden, [lote[-1][i] for i in indices]))
+
+
+def recorrer_keyset(consulta, campos, orden=('id',), tam_lote=1000, limite=None):
+    """Como lotes_keyset pero fila por fila"""
+    for lote in lotes_keyset(consulta, campos, orden, tam_lote, limite):
+        yield from lote
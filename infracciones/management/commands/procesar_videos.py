@@ -0,0 +1,186 @@
+"""
+Procesa videos grabados en paralelo y registra sus infracciones en lote
+Uso: python manage.py procesar_videos [videos/ archivo.mp4 ...] [--workers 4]
+     [--segmento 60] [--solape 2] [--skip 1] [--camara ID] [--reiniciar]
+Reanuda desde el checkpoint: los segmentos ya escritos no se reprocesan. Cada
+infracción lleva un id_evento determinista, así un segmento que se escribió
+pero no llegó al checkpoint no se duplica al reanudar.
+"""
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from camaras.models import Camara
+from infracciones.servicios import registrar_infracciones_idempotente
+from vision_ai import videos
+from vision_ai.reglas import MotorReglas
+
+CHECKPOINT = videos.BASE_DIR / 'media' / 'procesar_videos.json'
+
+
+def cargar_checkpoint(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_checkpoint(ruta, estados):
+    """Escritura atómica: un corte a mitad de escritura no corrompe el checkpoint"""
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump({ruta_video: estado.a_dict() for ruta_video, estado in estados.items()}, archivo)
+    os.replace(temporal, ruta)
+
+
+class Command(BaseCommand):
+    help = 'Procesa videos grabados por segmentos en un pool de procesos (un modelo por worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rutas', nargs='*', default=['videos'], help='Archivos o carpetas de video')
+        parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1))
+        parser.add_argument('--segmento', type=float, default=60, help='Duración de cada segmento (s)')
+        parser.add_argument('--solape', type=float, default=2, help='Warm-up del tracker y ventana de unión (s)')
+        parser.add_argument('--skip', type=int, default=0, help='Frames a saltar entre inferencias')
+        parser.add_argument('--conf', type=float, default=0.4, help='Confianza mínima de YOLO')
+        parser.add_argument('--camara', type=int, help='Cámara cuyas reglas y calibración se aplican')
+        parser.add_argument('--lote', type=int, default=500, help='Infracciones por transacción')
+        parser.add_argument('--checkpoint', default=str(CHECKPOINT))
+        parser.add_argument('--reiniciar', action='store_true', help='Ignorar el checkpoint')
+
+    def handle(self, *args, **options):
+        rutas = videos.listar_videos(options['rutas'])
+        if not rutas:
+            raise CommandError('No se encontraron videos en las rutas indicadas')
+        camara_fija = None
+        if options['camara'] is not None:
+            camara_fija = Camara.objects.filter(pk=options['camara']).first()
+            if camara_fija is None:
+                raise CommandError(f"Cámara {options['camara']} no existe")
+
+        previo = {} if options['reiniciar'] else cargar_checkpoint(options['checkpoint'])
+        estados, contexto, tareas = {}, {}, []
+
+        for ruta in rutas:
+            fps, total, solape, segmentos = videos.planificar(ruta, options['segmento'], options['solape'])
+            firma = videos.firma_video(ruta)
+            datos = previo.get(str(ruta))
+            if datos and (datos.get('firma') != firma or datos.get('segmentos') != len(segmentos)):
+                self.stdout.write(f'⚠️  {ruta.name} cambió desde el checkpoint, se procesa de nuevo')
+                datos = None
+            estado = estados[str(ruta)] = videos.EstadoVideo(ruta, firma, len(segmentos), datos)
+            if estado.terminado:
+                self.stdout.write(f'⏭️  {ruta.name} ya procesado')
+                continue
+
+            camara = camara_fija or self._camara_video(ruta)
+            cooldown = max(r['cooldown_seg'] for r in MotorReglas(camara, None).reglas)
+            fecha_base = videos.fecha_inicio_video(ruta, total, fps)
+            contexto[str(ruta)] = (camara, fps, cooldown, fecha_base)
+            for indice, inicio, fin in segmentos[estado.hechos:]:
+                tareas.append({
+                    'ruta': str(ruta), 'indice': indice, 'inicio': inicio, 'fin': fin,
+                    'solape': solape, 'fps': fps, 'skip': options['skip'], 'conf': options['conf'],
+                    'camara_id': camara.id, 'fecha_base': fecha_base,
+                })
+
+        if not tareas:
+            self.stdout.write(self.style.SUCCESS('✅ Nada pendiente'))
+            return
+
+        workers = max(1, min(options['workers'], len(tareas)))
+        self.stdout.write(f'🎬 {len(tareas)} segmentos de {len(contexto)} videos en {workers} workers')
+
+        por_worker = defaultdict(lambda: [0, 0.0])
+        total_infracciones = 0
+        inicio = time.perf_counter()
+        # spawn: CUDA y los hilos del motor no sobreviven a fork
+        with multiprocessing.get_context('spawn').Pool(workers, initializer=videos.iniciar_worker) as pool:
+            # imap respeta el orden: cada segmento se une con el anterior de su video
+            for resultado in pool.imap(videos.procesar_segmento, tareas):
+                estado = estados[resultado['ruta']]
+                camara, fps, cooldown, fecha_base = contexto[resultado['ruta']]
+                infracciones, huerfanas = estado.fusionar(resultado, fps, cooldown)
+
+                registros = [self._registro(i, estado, camara, fps, fecha_base) for i in infracciones]
+                creadas = 0
+                for desde in range(0, len(registros), options['lote']):
+                    lote = registros[desde:desde + options['lote']]
+                    for registro, (situacion, infraccion) in zip(lote, registrar_infracciones_idempotente(lote)):
+                        if situacion == 'creada':
+                            creadas += 1
+                        elif situacion == 'duplicada':
+                            # Ya escrita antes del corte: las imágenes nuevas sobran
+                            huerfanas.update(
+                                registro[campo] for campo in ('imagen_principal', 'imagen_miniatura')
+                                if registro[campo] and registro[campo] != getattr(infraccion, campo).name
+                            )
+                for imagen in huerfanas:
+                    (videos.BASE_DIR / 'media' / imagen).unlink(missing_ok=True)
+                guardar_checkpoint(options['checkpoint'], estados)
+
+                frames, segundos = resultado['frames'], resultado['segundos']
+                por_worker[resultado['pid']][0] += frames
+                por_worker[resultado['pid']][1] += segundos
+                total_infracciones += creadas
+                self.stdout.write(
+                    f"✅ {os.path.basename(resultado['ruta'])} [{estado.hechos}/{estado.segmentos}] "
+                    f"{frames} frames, {frames / segundos if segundos else 0:.1f} fps "
+                    f"(worker {resultado['pid']}), {creadas} infracciones"
+                    + (f" ({len(infracciones) - creadas} ya registradas)" if creadas < len(infracciones) else '')
+                )
+
+        duracion = time.perf_counter() - inicio
+        frames_total = sum(frames for frames, _ in por_worker.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {frames_total} frames en {duracion:.1f}s ({frames_total / duracion if duracion else 0:.1f} fps), '
+            f'{total_infracciones} infracciones registradas'
+        ))
+        for pid, (frames, segundos) in sorted(por_worker.items()):
+            self.stdout.write(f'   worker {pid}: {frames} frames, {frames / segundos if segundos else 0:.1f} fps')
+
+    def _camara_video(self, ruta):
+        """Cámara asociada al archivo (se crea inactiva para no abrirla en el dashboard)"""
+        camara, _ = Camara.objects.get_or_create(
+            tipo_fuente='VIDEO',
+            ruta_video=str(ruta),
+            defaults={
+                'ubicacion': f'Video {ruta.name}',
+                'descripcion': 'Registrada por procesar_videos',
+                'activa': False,
+            }
+        )
+        return camara
+
+    def _registro(self, infraccion, estado, camara, fps, fecha_base):
+        velocidad = infraccion.get('velocidad')
+        return {
+            'id_evento': estado.id_evento(infraccion),
+            'placa': infraccion['placa'],
+            'tipo_codigo': infraccion['tipo_codigo'],
+            'camara': camara,
+            'ubicacion': camara.ubicacion,
+            'fecha_hora': fecha_base + timedelta(seconds=infraccion['frame'] / fps),
+            'velocidad_detectada': int(velocidad) if velocidad else None,
+            'velocidad_maxima': infraccion.get('velocidad_maxima'),
+            'tiempo_luz_roja': infraccion.get('tiempo_luz_roja'),
+            'imagen_principal': infraccion['imagen'],
+            'imagen_miniatura': infraccion['miniatura'],
+            'confianza_deteccion': infraccion['confianza'] * 100,
+            'modelo_ia_version': 'YOLOv8n (offline)',
+            'estado': 'DETECTADA',
+            'evento': {
+                'tipo': infraccion['tipo_codigo'],
+                'placa': infraccion['placa'],
+                'velocidad': velocidad,
+                'confianza': infraccion['confianza'],
+                'video': os.path.basename(estado.ruta),
+                'frame': infraccion['frame'],
+            },
+        }
@@ -0,0 +1,24 @@
+"""
+Recalcula los agregados de PerfilConductor desde el historial de Infraccion
+La migración 0009 lo hace una vez al migrar; sirve de nuevo si se editan
+infracciones a mano.
+Uso: python manage.py reconstruir_perfiles [--lote 500]
+"""
+from django.core.management.base import BaseCommand
+
+from infracciones.servicios import reconstruir_perfiles
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los agregados de PerfilConductor desde el historial'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Perfiles por bulk_update')
+
+    def handle(self, *args, **options):
+        actualizados, creados, sin_historial = reconstruir_perfiles(lote=options['lote'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Perfiles recalculados: {actualizados} actualizados, {creados} creados, '
+            f'{sin_historial} sin historial'
+        ))
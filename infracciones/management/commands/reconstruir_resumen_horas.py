@@ -0,0 +1,63 @@
+"""
+Reconstruye InfraccionResumenHora a partir del historial de Infraccion
+Uso: python manage.py reconstruir_resumen_horas [--desde AAAA-MM-DD]
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum, F, Q, Case, When, Value, IntegerField
+from django.db.models.functions import TruncHour, Greatest
+
+from infracciones.cache import invalidar_estadisticas
+from infracciones.models import Infraccion, InfraccionResumenHora
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen horario de infracciones por cámara y tipo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Reconstruir solo desde esta fecha (AAAA-MM-DD)')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por bulk_create')
+
+    def handle(self, *args, **options):
+        infracciones = Infraccion.objects.all()
+        resumenes = InfraccionResumenHora.objects.all()
+
+        if options['desde']:
+            try:
+                desde = datetime.strptime(options['desde'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--desde debe tener el formato AAAA-MM-DD')
+            infracciones = infracciones.filter(fecha_hora__gte=desde)
+            resumenes = resumenes.filter(hora__gte=desde)
+
+        exceso = Case(
+            When(
+                velocidad_detectada__isnull=False, velocidad_maxima__isnull=False,
+                then=Greatest(F('velocidad_detectada') - F('velocidad_maxima'), Value(0))
+            ),
+            default=Value(0),
+            output_field=IntegerField()
+        )
+
+        filas = infracciones.annotate(
+            hora=TruncHour('fecha_hora')
+        ).values('camara_id', 'tipo_infraccion_id', 'hora').annotate(
+            total=Count('id'),
+            total_con_velocidad=Count('id', filter=Q(velocidad_detectada__isnull=False)),
+            suma_velocidad=Sum('velocidad_detectada', default=0),
+            suma_exceso=Sum(exceso, default=0)
+        ).order_by()
+
+        with transaction.atomic():
+            borradas, _ = resumenes.delete()
+            creadas = InfraccionResumenHora.objects.bulk_create(
+                (InfraccionResumenHora(**fila) for fila in filas.iterator()),
+                batch_size=options['lote']
+            )
+
+        invalidar_estadisticas()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Resumen reconstruido: {len(creadas)} filas ({borradas} anteriores eliminadas)'
+        ))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-17 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('camaras', '0006_camara_indice_webcam_camara_ruta_video_and_more'),
+        ('infracciones', '0003_alter_eventodeteccion_timestamp_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InfraccionResumenHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField(db_index=True, help_text='Inicio de la hora (minutos y segundos en cero)')),
+                ('total', models.IntegerField(default=0)),
+                ('total_con_velocidad', models.IntegerField(default=0, help_text='Infracciones con velocidad detectada')),
+                ('suma_velocidad', models.BigIntegerField(default=0, help_text='Suma de velocidades detectadas (km/h)')),
+                ('suma_exceso', models.BigIntegerField(default=0, help_text='Suma de km/h por encima del límite')),
+                ('camara', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_hora', to='camaras.camara')),
+                ('tipo_infraccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_hora', to='infracciones.tipoinfraccion')),
+            ],
+            options={
+                'verbose_name': 'Resumen Horario de Infracciones',
+                'verbose_name_plural': 'Resúmenes Horarios de Infracciones',
+                'ordering': ['-hora'],
+                'unique_together': {('camara', 'tipo_infraccion', 'hora')},
+            },
+        ),
+    ]
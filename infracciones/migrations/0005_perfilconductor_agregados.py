@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infracciones', '0004_infraccionresumenhora'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='perfilconductor',
+            name='infracciones_graves',
+            field=models.IntegerField(default=0, help_text='Gravedad GRAVE o MUY_GRAVE'),
+        ),
+        migrations.AddField(
+            model_name='perfilconductor',
+            name='infracciones_muy_graves',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='perfilconductor',
+            name='infracciones_moderadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='perfilconductor',
+            name='infracciones_leves',
+            field=models.IntegerField(default=0, help_text='Gravedad LEVE'),
+        ),
+        migrations.AddField(
+            model_name='perfilconductor',
+            name='total_con_velocidad',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='perfilconductor',
+            name='suma_velocidad',
+            field=models.BigIntegerField(default=0, help_text='Suma de velocidades detectadas (km/h)'),
+        ),
+        migrations.AddField(
+            model_name='perfilconductor',
+            name='suma_horas',
+            field=models.BigIntegerField(default=0, help_text='Suma de la hora del día de cada infracción'),
+        ),
+        migrations.AddField(
+            model_name='perfilconductor',
+            name='primera_infraccion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='perfilconductor',
+            name='ultima_infraccion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
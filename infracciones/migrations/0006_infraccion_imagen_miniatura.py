@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infracciones', '0005_perfilconductor_agregados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='infraccion',
+            name='imagen_miniatura',
+            field=models.ImageField(blank=True, null=True, upload_to='infracciones/miniaturas/'),
+        ),
+    ]
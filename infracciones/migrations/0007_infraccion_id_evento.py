@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infracciones', '0006_infraccion_imagen_miniatura'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='infraccion',
+            name='id_evento',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='infraccion',
+            constraint=models.UniqueConstraint(condition=models.Q(('id_evento__isnull', False)), fields=('id_evento',), name='infraccion_id_evento_unico'),
+        ),
+    ]
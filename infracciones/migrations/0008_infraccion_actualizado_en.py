@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def inicializar_actualizado_en(apps, schema_editor):
+    """Las filas existentes toman su fecha de detección como última modificación"""
+    Infraccion = apps.get_model('infracciones', 'Infraccion')
+    Infraccion.objects.update(actualizado_en=models.F('fecha_hora'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infracciones', '0007_infraccion_id_evento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='infraccion',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(inicializar_actualizado_en, migrations.RunPython.noop),
+    ]
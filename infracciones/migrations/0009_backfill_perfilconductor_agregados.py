@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:20
+
+from django.db import migrations
+
+
+def rellenar_agregados(apps, schema_editor):
+    """Los agregados de 0005 arrancan en cero: se recalculan desde el historial"""
+    from infracciones.servicios import reconstruir_perfiles
+
+    reconstruir_perfiles(
+        modelo_infraccion=apps.get_model('infracciones', 'Infraccion'),
+        modelo_perfil=apps.get_model('infracciones', 'PerfilConductor'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('infracciones', '0008_infraccion_actualizado_en'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_agregados, migrations.RunPython.noop),
+    ]
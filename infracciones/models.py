@@ -30,6 +30,20 @@ class TipoInfraccion(models.Model):
         return f"{self.codigo} - {self.nombre}"
 
 
+class VehiculoQuerySet(models.QuerySet):
+    def con_conteos(self, dias=30):
+        """
+        Anota conteo_infracciones y conteo_recientes (últimos `dias`) en la misma
+        consulta, en lugar de dos COUNT por vehículo
+        """
+        from datetime import timedelta
+        fecha_limite = timezone.now() - timedelta(days=dias)
+        return self.annotate(
+            conteo_infracciones=models.Count('infracciones'),
+            conteo_recientes=models.Count('infracciones', filter=models.Q(infracciones__fecha_hora__gte=fecha_limite)),
+        )
+
+
 class Vehiculo(models.Model):
     """Información de vehículos detectados"""
     placa = models.CharField(max_length=20, unique=True, db_index=True)
@@ -55,6 +69,8 @@ class Vehiculo(models.Model):
     reportado_robado = models.BooleanField(default=False)
     fecha_registro = models.DateTimeField(default=timezone.now)
     
+    objects = VehiculoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Vehículo"
         verbose_name_plural = "Vehículos"
@@ -63,9 +79,13 @@ class Vehiculo(models.Model):
         return f"{self.placa} - {self.marca} {self.modelo}"
     
     def total_infracciones(self):
+        if hasattr(self, 'conteo_infracciones'):  # Vehiculo.objects.con_conteos()
+            return self.conteo_infracciones
         return self.infracciones.count()
     
     def infracciones_ultimos_30_dias(self):
+        if hasattr(self, 'conteo_recientes'):
+            return self.conteo_recientes
         from datetime import timedelta
         fecha_limite = timezone.now() - timedelta(days=30)
         return self.infracciones.filter(fecha_hora__gte=fecha_limite).count()
@@ -90,6 +110,7 @@ class Infraccion(models.Model):
     # Evidencia
     imagen_principal = models.ImageField(upload_to='infracciones/imagenes/', null=True, blank=True)
     imagen_placa = models.ImageField(upload_to='infracciones/placas/', null=True, blank=True)
+    imagen_miniatura = models.ImageField(upload_to='infracciones/miniaturas/', null=True, blank=True)
     video_evidencia = models.FileField(upload_to='infracciones/videos/', null=True, blank=True)
     
     # Confianza del modelo de IA
@@ -118,6 +139,12 @@ class Infraccion(models.Model):
     fecha_notificacion = models.DateTimeField(null=True, blank=True)
     fecha_pago = models.DateTimeField(null=True, blank=True)
     
+    # Id del evento asignado por el detector de borde; hace idempotente el reenvío
+    id_evento = models.CharField(max_length=64, null=True, blank=True)
+    # Sincronización incremental de la exportación (api/datos/infracciones?actualizado_desde=)
+    # auto_now no actúa en QuerySet.update(): todo UPDATE en bloque debe fijar actualizado_en=Now()
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True)
+    
     class Meta:
         verbose_name = "Infracción"
         verbose_name_plural = "Infracciones"
@@ -126,6 +153,14 @@ class Infraccion(models.Model):
             models.Index(fields=['fecha_hora', 'estado']),
             models.Index(fields=['vehiculo', 'fecha_hora']),
         ]
+        constraints = [
+            # Filtrado: SQL Server no admite dos NULL en un índice único simple
+            models.UniqueConstraint(
+                fields=['id_evento'],
+                condition=models.Q(id_evento__isnull=False),
+                name='infraccion_id_evento_unico'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.vehiculo.placa} - {self.tipo_infraccion.nombre} - {self.fecha_hora.strftime('%Y-%m-%d %H:%M')}"
@@ -135,11 +170,21 @@ class PerfilConductor(models.Model):
     """Perfil de riesgo del conductor basado en historial"""
     vehiculo = models.OneToOneField(Vehiculo, on_delete=models.CASCADE, related_name='perfil')
     
-    # Estadísticas
+    # Estadísticas (acumuladas con F() al registrar cada infracción)
     total_infracciones = models.IntegerField(default=0)
     infracciones_luz_roja = models.IntegerField(default=0)
     infracciones_velocidad = models.IntegerField(default=0)
-    infracciones_graves = models.IntegerField(default=0)
+    infracciones_graves = models.IntegerField(default=0, help_text="Gravedad GRAVE o MUY_GRAVE")
+    infracciones_muy_graves = models.IntegerField(default=0)
+    infracciones_moderadas = models.IntegerField(default=0)
+    infracciones_leves = models.IntegerField(default=0, help_text="Gravedad LEVE")
+    
+    # Agregados para las features del modelo ML
+    total_con_velocidad = models.IntegerField(default=0)
+    suma_velocidad = models.BigIntegerField(default=0, help_text="Suma de velocidades detectadas (km/h)")
+    suma_horas = models.BigIntegerField(default=0, help_text="Suma de la hora del día de cada infracción")
+    primera_infraccion = models.DateTimeField(null=True, blank=True)
+    ultima_infraccion = models.DateTimeField(null=True, blank=True)
     
     # Puntuación de riesgo (calculada por ML)
     puntuacion_riesgo = models.DecimalField(max_digits=5, decimal_places=2, default=0.0, help_text="0-100")
@@ -228,3 +273,28 @@ class EventoDeteccion(models.Model):
     
     def __str__(self):
         return f"{self.camara.ubicacion} - {self.tipo_evento} - {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+class InfraccionResumenHora(models.Model):
+    """Resumen materializado de infracciones por cámara, tipo y hora"""
+    camara = models.ForeignKey(Camara, on_delete=models.CASCADE, null=True, related_name='resumenes_hora')
+    tipo_infraccion = models.ForeignKey(TipoInfraccion, on_delete=models.CASCADE, related_name='resumenes_hora')
+    hora = models.DateTimeField(db_index=True, help_text="Inicio de la hora (minutos y segundos en cero)")
+    
+    total = models.IntegerField(default=0)
+    total_con_velocidad = models.IntegerField(default=0, help_text="Infracciones con velocidad detectada")
+    suma_velocidad = models.BigIntegerField(default=0, help_text="Suma de velocidades detectadas (km/h)")
+    suma_exceso = models.BigIntegerField(default=0, help_text="Suma de km/h por encima del límite")
+    
+    class Meta:
+        verbose_name = "Resumen Horario de Infracciones"
+        verbose_name_plural = "Resúmenes Horarios de Infracciones"
+        ordering = ['-hora']
+        unique_together = [('camara', 'tipo_infraccion', 'hora')]
+    
+    def __str__(self):
+        return f"{self.hora.strftime('%Y-%m-%d %H:00')} - {self.tipo_infraccion_id} - {self.total}"
+    
+    @property
+    def velocidad_promedio(self):
+        return self.suma_velocidad / self.total_con_velocidad if self.total_con_velocidad else None
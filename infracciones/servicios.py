@@ -0,0 +1,290 @@
+"""
+Servicios de escritura en lote para infracciones
+Resuelven vehículos y tipos desde las cachés en proceso (con una consulta __in
+para los fallos) y crean todo con bulk_create
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractHour, Greatest, Least
+
+from . import cache
+from .consultas import filtrar_en_bloques
+from .models import Infraccion, EventoDeteccion, InfraccionResumenHora, PerfilConductor
+from .signals import infracciones_registradas
+
+
+def crear_infracciones_lote(registros):
+    """
+    Crea infracciones y sus eventos de detección en una sola transacción
+    Cada registro trae 'placa', 'tipo_codigo', los campos de Infraccion y
+    opcionalmente 'evento' con los datos del EventoDeteccion asociado.
+    Retorna una lista paralela con la Infraccion creada o None si el tipo no existe.
+    """
+    if not registros:
+        return []
+
+    with transaction.atomic():
+        tipos = cache.tipos_infraccion.obtener_varios({r['tipo_codigo'] for r in registros})
+        # Sin tipo válido no se registra nada, ni siquiera el vehículo
+        vehiculos = cache.obtener_ids_vehiculos(r['placa'] for r in registros if r['tipo_codigo'] in tipos)
+
+        creadas = []
+        eventos = []
+        resultado = []
+        for registro in registros:
+            campos = dict(registro)
+            placa = campos.pop('placa')
+            tipo_infraccion = tipos.get(campos.pop('tipo_codigo'))
+            datos_evento = campos.pop('evento', None)
+
+            if tipo_infraccion is None:
+                resultado.append(None)
+                continue
+
+            infraccion = Infraccion(
+                vehiculo_id=vehiculos[placa],
+                tipo_infraccion=tipo_infraccion,
+                **campos
+            )
+            creadas.append(infraccion)
+            resultado.append(infraccion)
+
+            if datos_evento is not None and infraccion.camara_id:
+                eventos.append(EventoDeteccion(
+                    camara_id=infraccion.camara_id,
+                    timestamp=infraccion.fecha_hora,
+                    tipo_evento='INFRACCION_DETECTADA',
+                    datos_evento=datos_evento
+                ))
+
+        Infraccion.objects.bulk_create(creadas)
+        if eventos:
+            EventoDeteccion.objects.bulk_create(eventos)
+        acumular_resumen_horas(creadas)
+        acumular_perfiles(creadas)
+
+        if creadas:
+            transaction.on_commit(
+                lambda: infracciones_registradas.send(sender=Infraccion, infracciones=creadas)
+            )
+
+    return resultado
+
+
+def registrar_infracciones_idempotente(registros, reintentos=1):
+    """
+    crear_infracciones_lote para reenvíos: los registros cuyo 'id_evento' ya
+    existe (en la BD o antes en el mismo lote) no se vuelven a crear.
+    Retorna una lista paralela de (estado, Infraccion o None) con estado
+    'creada', 'duplicada' o 'tipo_invalido'.
+    """
+    for intento in range(reintentos + 1):
+        try:
+            with transaction.atomic():
+                return _registrar_sin_duplicados(registros)
+        except IntegrityError:
+            # Otro reenvío con los mismos id_evento confirmó primero; al reintentar se ven como duplicados.
+            # El rollback pudo deshacer vehículos que la caché ya tenía guardados
+            cache.vehiculos.limpiar()
+            if intento == reintentos:
+                raise
+
+
+def _registrar_sin_duplicados(registros):
+    ids_evento = [r['id_evento'] for r in registros if r.get('id_evento')]
+    existentes = {}
+    for bloque in filtrar_en_bloques(Infraccion.objects, 'id_evento', ids_evento):
+        existentes.update((infraccion.id_evento, infraccion) for infraccion in bloque)
+
+    resultado = [None] * len(registros)
+    nuevos, posiciones = [], []
+    primeros, repetidos = {}, []  # id_evento -> índice en nuevos; (posición, índice en nuevos)
+    for i, registro in enumerate(registros):
+        id_evento = registro.get('id_evento')
+        if id_evento in existentes:
+            resultado[i] = ('duplicada', existentes[id_evento])
+        elif id_evento and id_evento in primeros:
+            repetidos.append((i, primeros[id_evento]))
+        else:
+            if id_evento:
+                primeros[id_evento] = len(nuevos)
+            nuevos.append(registro)
+            posiciones.append(i)
+
+    creadas = crear_infracciones_lote(nuevos)
+    for i, infraccion in zip(posiciones, creadas):
+        resultado[i] = ('creada', infraccion) if infraccion is not None else ('tipo_invalido', None)
+    for i, indice in repetidos:
+        resultado[i] = resultado[posiciones[indice]] if creadas[indice] is None else ('duplicada', creadas[indice])
+    return resultado
+
+
+def _clave_resumen(infraccion):
+    hora = infraccion.fecha_hora.replace(minute=0, second=0, microsecond=0)
+    return infraccion.camara_id, infraccion.tipo_infraccion_id, hora
+
+
+def acumular_resumen_horas(infracciones, signo=1):
+    """
+    Suma (signo=1) o resta (signo=-1) infracciones en InfraccionResumenHora
+    Agrupa por (camara, tipo, hora) y hace un UPDATE con F() por clave; si la
+    fila no existe la crea.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for infraccion in infracciones:
+        delta = deltas[_clave_resumen(infraccion)]
+        delta[0] += 1
+        if infraccion.velocidad_detectada is not None:
+            delta[1] += 1
+            delta[2] += infraccion.velocidad_detectada
+            if infraccion.velocidad_maxima is not None:
+                delta[3] += max(0, infraccion.velocidad_detectada - infraccion.velocidad_maxima)
+
+    for (camara_id, tipo_id, hora), (total, con_velocidad, suma_velocidad, suma_exceso) in deltas.items():
+        filtro = {'camara_id': camara_id, 'tipo_infraccion_id': tipo_id, 'hora': hora}
+        cambios = {
+            'total': F('total') + signo * total,
+            'total_con_velocidad': F('total_con_velocidad') + signo * con_velocidad,
+            'suma_velocidad': F('suma_velocidad') + signo * suma_velocidad,
+            'suma_exceso': F('suma_exceso') + signo * suma_exceso,
+        }
+        if InfraccionResumenHora.objects.filter(**filtro).update(**cambios) or signo < 0:
+            continue
+        try:
+            with transaction.atomic():
+                InfraccionResumenHora.objects.create(
+                    total=total,
+                    total_con_velocidad=con_velocidad,
+                    suma_velocidad=suma_velocidad,
+                    suma_exceso=suma_exceso,
+                    **filtro
+                )
+        except IntegrityError:
+            # Otro proceso creó la fila entre el UPDATE y el INSERT
+            InfraccionResumenHora.objects.filter(**filtro).update(**cambios)
+
+
+CONTADORES_GRAVEDAD = {
+    'LEVE': ('infracciones_leves',),
+    'MODERADA': ('infracciones_moderadas',),
+    'GRAVE': ('infracciones_graves',),
+    'MUY_GRAVE': ('infracciones_graves', 'infracciones_muy_graves'),
+}
+CONTADORES_TIPO = {
+    'LUZ_ROJA': 'infracciones_luz_roja',
+    'EXCESO_VEL': 'infracciones_velocidad',
+}
+
+
+def _crear_perfiles(vehiculo_ids):
+    """
+    Inserta los perfiles que faltan sin ignore_conflicts (mssql-django no lo
+    admite); si otro proceso creó alguno, cae a get_or_create por vehículo
+    """
+    try:
+        with transaction.atomic():
+            PerfilConductor.objects.bulk_create([PerfilConductor(vehiculo_id=vehiculo_id) for vehiculo_id in vehiculo_ids])
+    except IntegrityError:
+        for vehiculo_id in vehiculo_ids:
+            with transaction.atomic():
+                PerfilConductor.objects.get_or_create(vehiculo_id=vehiculo_id)
+
+
+def acumular_perfiles(infracciones, signo=1):
+    """
+    Actualiza los agregados de PerfilConductor con F() (un UPDATE por vehículo)
+    Crea en bloque los perfiles que falten. Al restar (signo=-1) las fechas de
+    primera/última infracción se conservan.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    fechas = {}
+    for infraccion in infracciones:
+        delta = deltas[infraccion.vehiculo_id]
+        delta['total_infracciones'] += 1
+        delta['suma_horas'] += infraccion.fecha_hora.hour
+        for campo in CONTADORES_GRAVEDAD.get(infraccion.tipo_infraccion.gravedad, ()):
+            delta[campo] += 1
+        if infraccion.tipo_infraccion.codigo in CONTADORES_TIPO:
+            delta[CONTADORES_TIPO[infraccion.tipo_infraccion.codigo]] += 1
+        if infraccion.velocidad_detectada is not None:
+            delta['total_con_velocidad'] += 1
+            delta['suma_velocidad'] += infraccion.velocidad_detectada
+
+        primera, ultima = fechas.get(infraccion.vehiculo_id, (infraccion.fecha_hora, infraccion.fecha_hora))
+        fechas[infraccion.vehiculo_id] = (min(primera, infraccion.fecha_hora), max(ultima, infraccion.fecha_hora))
+
+    if not deltas:
+        return
+
+    if signo > 0:
+        existentes = set()
+        for bloque in filtrar_en_bloques(PerfilConductor.objects, 'vehiculo_id', deltas):
+            existentes.update(bloque.values_list('vehiculo_id', flat=True))
+        faltantes = deltas.keys() - existentes
+        if faltantes:
+            _crear_perfiles(faltantes)
+
+    for vehiculo_id, delta in deltas.items():
+        cambios = {campo: F(campo) + signo * valor for campo, valor in delta.items()}
+        if signo > 0:
+            primera, ultima = fechas[vehiculo_id]
+            cambios['primera_infraccion'] = Coalesce(Least(F('primera_infraccion'), Value(primera)), Value(primera))
+            cambios['ultima_infraccion'] = Coalesce(Greatest(F('ultima_infraccion'), Value(ultima)), Value(ultima))
+        PerfilConductor.objects.filter(vehiculo_id=vehiculo_id).update(**cambios)
+
+
+CAMPOS_PERFIL = [
+    'total_infracciones', 'infracciones_luz_roja', 'infracciones_velocidad',
+    'infracciones_graves', 'infracciones_muy_graves', 'infracciones_moderadas',
+    'infracciones_leves', 'total_con_velocidad', 'suma_velocidad', 'suma_horas',
+    'primera_infraccion', 'ultima_infraccion',
+]
+
+
+def reconstruir_perfiles(lote=500, modelo_infraccion=Infraccion, modelo_perfil=PerfilConductor):
+    """
+    Recalcula los agregados de PerfilConductor desde el historial de Infraccion
+    Los modelos se pueden pasar para usarla desde una migración (apps.get_model).
+    Retorna (actualizados, creados, sin_historial)
+    """
+    filas = modelo_infraccion.objects.values('vehiculo_id').annotate(
+        total_infracciones=Count('id'),
+        infracciones_luz_roja=Count('id', filter=Q(tipo_infraccion__codigo='LUZ_ROJA')),
+        infracciones_velocidad=Count('id', filter=Q(tipo_infraccion__codigo='EXCESO_VEL')),
+        infracciones_graves=Count('id', filter=Q(tipo_infraccion__gravedad__in=['GRAVE', 'MUY_GRAVE'])),
+        infracciones_muy_graves=Count('id', filter=Q(tipo_infraccion__gravedad='MUY_GRAVE')),
+        infracciones_moderadas=Count('id', filter=Q(tipo_infraccion__gravedad='MODERADA')),
+        infracciones_leves=Count('id', filter=Q(tipo_infraccion__gravedad='LEVE')),
+        total_con_velocidad=Count('velocidad_detectada'),
+        suma_velocidad=Sum('velocidad_detectada', default=0),
+        suma_horas=Sum(ExtractHour('fecha_hora'), default=0),
+        primera_infraccion=Min('fecha_hora'),
+        ultima_infraccion=Max('fecha_hora'),
+    ).order_by()
+    agregados = {fila.pop('vehiculo_id'): fila for fila in filas}
+
+    # Perfiles sin infracciones vuelven a cero
+    vacio = {campo: 0 for campo in CAMPOS_PERFIL}
+    vacio.update(primera_infraccion=None, ultima_infraccion=None)
+
+    with transaction.atomic():
+        perfiles = {perfil.vehiculo_id: perfil for perfil in modelo_perfil.objects.all()}
+        nuevos = [
+            modelo_perfil(vehiculo_id=vehiculo_id, **valores)
+            for vehiculo_id, valores in agregados.items() if vehiculo_id not in perfiles
+        ]
+        sin_historial = 0
+        for vehiculo_id, perfil in perfiles.items():
+            valores = agregados.get(vehiculo_id)
+            if valores is None:
+                valores = vacio
+                sin_historial += 1
+            for campo, valor in valores.items():
+                setattr(perfil, campo, valor)
+
+        modelo_perfil.objects.bulk_create(nuevos, batch_size=lote)
+        modelo_perfil.objects.bulk_update(list(perfiles.values()), CAMPOS_PERFIL, batch_size=lote)
+
+    return len(perfiles), len(nuevos), sin_historial
@@ -0,0 +1,91 @@
+"""
+Señales de la app infracciones
+Invalidan las cachés en proceso cuando cambian los catálogos o se registran
+infracciones nuevas, y mantienen los agregados (resumen por hora y perfiles)
+al crear, editar o borrar una infracción
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from camaras.models import Camara
+from . import cache
+from .models import Infraccion, TipoInfraccion, Vehiculo
+
+# Enviada tras confirmar un bulk_create de infracciones (bulk_create no emite post_save)
+# kwargs: infracciones=[Infraccion, ...]
+infracciones_registradas = Signal()
+
+# Campos de Infraccion de los que depende cada agregado
+CAMPOS_RESUMEN = ('camara_id', 'tipo_infraccion_id', 'fecha_hora', 'velocidad_detectada', 'velocidad_maxima')
+CAMPOS_PERFIL = ('vehiculo_id', 'tipo_infraccion_id', 'fecha_hora', 'velocidad_detectada')
+
+
+@receiver([post_save, post_delete], sender=TipoInfraccion)
+def invalidar_tipos(sender, **kwargs):
+    cache.tipos_infraccion.invalidar()
+
+
+@receiver([post_save, post_delete], sender=Vehiculo)
+def invalidar_vehiculo(sender, instance, **kwargs):
+    cache.vehiculos.invalidar(placa=instance.placa, vehiculo_id=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Camara)
+def invalidar_camara(sender, instance, **kwargs):
+    cache.camaras.invalidar(instance.pk)
+    cache.invalidar_estadisticas()
+
+
+@receiver([post_save, post_delete], sender=Infraccion)
+@receiver(infracciones_registradas, sender=Infraccion)
+def invalidar_estadisticas(sender, **kwargs):
+    cache.invalidar_estadisticas()
+
+
+def _cambio(previa, actual, campos):
+    return any(getattr(previa, campo) != getattr(actual, campo) for campo in campos)
+
+
+@receiver(pre_save, sender=Infraccion)
+def recordar_previa(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Guarda la versión en BD antes de una edición para mover la infracción entre agregados"""
+    instance._previa = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    campos = set(CAMPOS_RESUMEN + CAMPOS_PERFIL)
+    campos |= {campo.removesuffix('_id') for campo in campos}
+    if update_fields is not None and not campos & set(update_fields):
+        return
+    instance._previa = Infraccion.objects.select_related('tipo_infraccion').filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Infraccion)
+def acumular_resumen(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    from .servicios import acumular_resumen_horas, acumular_perfiles
+
+    # Las altas en lote ya acumulan dentro de crear_infracciones_lote
+    if created:
+        acumular_resumen_horas([instance])
+        acumular_perfiles([instance])
+        return
+
+    # Edición: se descuenta la versión previa y se suma la nueva
+    previa = getattr(instance, '_previa', None)
+    instance._previa = None
+    if previa is None:
+        return
+    if _cambio(previa, instance, CAMPOS_RESUMEN):
+        acumular_resumen_horas([previa], signo=-1)
+        acumular_resumen_horas([instance])
+    if _cambio(previa, instance, CAMPOS_PERFIL):
+        acumular_perfiles([previa], signo=-1)
+        acumular_perfiles([instance])
+
+
+@receiver(post_delete, sender=Infraccion)
+def descontar_resumen(sender, instance, **kwargs):
+    from .servicios import acumular_resumen_horas, acumular_perfiles
+    acumular_resumen_horas([instance], signo=-1)
+    acumular_perfiles([instance], signo=-1)
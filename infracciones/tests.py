@@ -0,0 +1,312 @@
+import time
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import RequestFactory, TestCase
+
+from camaras.models import Camara
+from . import cache
+from vision_ai.persistencia import EscritorInfracciones
+from . import servicios
+from .consultas import filtrar_en_bloques, lotes_keyset
+from .models import Infraccion, InfraccionResumenHora, PerfilConductor, TipoInfraccion, Vehiculo
+from .servicios import CAMPOS_PERFIL, crear_infracciones_lote, registrar_infracciones_idempotente
+
+
+class FlagsMssqlMixin:
+    """
+    Corre cada test con las capacidades de mssql-django aunque la BD de
+    pruebas sea otra: sin ignore_conflicts ni cursores de servidor
+    """
+
+    def setUp(self):
+        super().setUp()
+        flags = mock.patch.multiple(
+            connection.features, supports_ignore_conflicts=False, can_use_chunked_reads=False
+        )
+        flags.start()
+        self.addCleanup(flags.stop)
+        # Las cachés en proceso sobreviven al rollback de cada test
+        cache.vehiculos.limpiar()
+        cache.tipos_infraccion.invalidar()
+        cache.camaras.invalidar()
+
+
+def crear_catalogo():
+    camara = Camara.objects.create(ubicacion='Av. Principal')
+    tipos = {
+        codigo: TipoInfraccion.objects.create(
+            codigo=codigo, nombre=codigo, descripcion=codigo, monto_multa=100, gravedad=gravedad
+        )
+        for codigo, gravedad in (('LUZ_ROJA', 'GRAVE'), ('EXCESO_VEL', 'MUY_GRAVE'), ('MAL_ESTACIONADO', 'LEVE'))
+    }
+    return camara, tipos
+
+
+def registro(placa, tipo_codigo='LUZ_ROJA', camara=None, fecha_hora=None, **campos):
+    return dict({
+        'placa': placa,
+        'tipo_codigo': tipo_codigo,
+        'camara': camara,
+        'ubicacion': 'Av. Principal',
+        'fecha_hora': fecha_hora or datetime(2025, 1, 15, 8, 30),
+        'confianza_deteccion': 90,
+    }, **campos)
+
+
+class CrearInfraccionesLoteTests(FlagsMssqlMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.camara, self.tipos = crear_catalogo()
+
+    def test_placas_nuevas_y_existentes(self):
+        existente = Vehiculo.objects.create(placa='ABC-123')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            creadas = crear_infracciones_lote([
+                registro('ABC-123', camara=self.camara),
+                registro('NUE-001', 'EXCESO_VEL', camara=self.camara, velocidad_detectada=90, velocidad_maxima=60),
+                registro('NUE-001', camara=self.camara),
+                registro('NUE-002', 'NO_EXISTE'),
+            ])
+
+        self.assertIsNone(creadas[3])
+        self.assertEqual(Infraccion.objects.count(), 3)
+        self.assertEqual(Vehiculo.objects.count(), 2)
+        self.assertEqual(creadas[0].vehiculo_id, existente.id)
+        self.assertEqual(creadas[1].vehiculo_id, creadas[2].vehiculo_id)
+        self.assertFalse(Vehiculo.objects.filter(placa='NUE-002').exists())
+
+        perfil = PerfilConductor.objects.get(vehiculo__placa='NUE-001')
+        self.assertEqual(perfil.total_infracciones, 2)
+        self.assertEqual(perfil.infracciones_velocidad, 1)
+        self.assertEqual(perfil.infracciones_muy_graves, 1)
+        self.assertEqual(perfil.suma_velocidad, 90)
+
+        # Los ids quedan en caché solo tras confirmar
+        ids = cache.vehiculos.obtener_ids({'ABC-123', 'NUE-001'})
+        self.assertEqual(ids['NUE-001'], creadas[1].vehiculo_id)
+
+    def test_rollback_no_deja_vehiculos_ni_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    crear_infracciones_lote([registro('ROL-001', camara=self.camara)])
+                    raise RuntimeError('falla del llamador')
+
+        self.assertFalse(Vehiculo.objects.filter(placa='ROL-001').exists())
+        self.assertFalse(Infraccion.objects.exists())
+        self.assertFalse(InfraccionResumenHora.objects.exists())
+        self.assertEqual(cache.vehiculos.obtener_ids({'ROL-001'}), {})
+
+    def test_placa_creada_por_otro_proceso(self):
+        # El INSERT en bloque choca con la placa existente y cae a get_or_create por placa
+        Vehiculo.objects.create(placa='ABC-123')
+        cache._crear_vehiculos({'ABC-123', 'NUE-003'})
+        self.assertEqual(
+            set(Vehiculo.objects.values_list('placa', flat=True)), {'ABC-123', 'NUE-003'}
+        )
+
+
+
+class RegistroIdempotenteTests(FlagsMssqlMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.camara, self.tipos = crear_catalogo()
+
+    def test_reenvio_por_id_evento(self):
+        lote = [
+            registro('IDE-001', camara=self.camara, id_evento='cam1-0001'),
+            registro('IDE-002', camara=self.camara, id_evento='cam1-0002'),
+            registro('IDE-002', camara=self.camara, id_evento='cam1-0002'),
+            registro('IDE-003', 'NO_EXISTE', id_evento='cam1-0003'),
+        ]
+        primero = registrar_infracciones_idempotente([dict(r) for r in lote])
+        self.assertEqual([estado for estado, _ in primero], ['creada', 'creada', 'duplicada', 'tipo_invalido'])
+        self.assertEqual(primero[1][1].id, primero[2][1].id)
+
+        segundo = registrar_infracciones_idempotente([dict(r) for r in lote])
+        self.assertEqual([estado for estado, _ in segundo], ['duplicada', 'duplicada', 'duplicada', 'tipo_invalido'])
+        self.assertEqual([i.id for _, i in segundo[:2]], [i.id for _, i in primero[:2]])
+
+        self.assertEqual(Infraccion.objects.count(), 2)
+        resumen = InfraccionResumenHora.objects.get()
+        self.assertEqual(resumen.total, 2)
+
+
+class ConsultasTests(TestCase):
+
+    def setUp(self):
+        self.camara, self.tipos = crear_catalogo()
+        vehiculo = Vehiculo.objects.create(placa='KEY-001')
+        # Varias infracciones por fecha_hora para que el keyset desempate por id
+        for hora in (8, 8, 8, 9, 9, 10, 11):
+            Infraccion.objects.create(
+                vehiculo=vehiculo, tipo_infraccion=self.tipos['LUZ_ROJA'], camara=self.camara,
+                fecha_hora=datetime(2025, 1, 15, hora), ubicacion='Av. Principal', confianza_deteccion=90,
+            )
+
+    def test_filtrar_en_bloques(self):
+        placas = [f'BLQ-{i:03d}' for i in range(5)]
+        Vehiculo.objects.bulk_create(Vehiculo(placa=placa) for placa in placas)
+        bloques = list(filtrar_en_bloques(Vehiculo.objects, 'placa', iter(placas + ['NO-EXISTE']), tam=2))
+        self.assertEqual(len(bloques), 3)
+        self.assertEqual(sorted(v.placa for bloque in bloques for v in bloque), placas)
+
+    def test_lotes_keyset_recorre_todo_en_orden(self):
+        esperado = list(Infraccion.objects.order_by('fecha_hora', 'id').values_list('fecha_hora', 'id'))
+        lotes = list(lotes_keyset(Infraccion.objects, ['fecha_hora', 'id'], ('fecha_hora', 'id'), tam_lote=2))
+        self.assertEqual([len(lote) for lote in lotes], [2, 2, 2, 1])
+        self.assertEqual([fila for lote in lotes for fila in lote], esperado)
+
+    def test_lotes_keyset_con_limite(self):
+        lotes = list(lotes_keyset(Infraccion.objects, ['id'], tam_lote=3, limite=5))
+        self.assertEqual([len(lote) for lote in lotes], [3, 2])
+
+
+class EscritorInfraccionesTests(FlagsMssqlMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.camara, self.tipos = crear_catalogo()
+        self.escritor = EscritorInfracciones(reintentos=2, espera_reintento=0)
+        self.addCleanup(self.escritor.detener, 1)
+        self.registrar = servicios.registrar_infracciones_idempotente
+
+    def _lote(self, *placas):
+        return [
+            (time.perf_counter(), registro(placa, camara=self.camara, id_evento=f'esc-{placa}'), False)
+            for placa in placas
+        ]
+
+    def _fallar(self, condicion):
+        """registrar_infracciones_idempotente que lanza OperationalError cuando condicion(registros, llamada)"""
+        llamadas = []
+
+        def registrar(registros):
+            llamadas.append(registros)
+            if condicion(registros, len(llamadas)):
+                raise OperationalError('conexión reiniciada')
+            return self.registrar(registros)
+        return mock.patch.object(servicios, 'registrar_infracciones_idempotente', registrar)
+
+    def test_reintenta_tras_error_transitorio(self):
+        with self._fallar(lambda registros, llamada: llamada == 1):
+            self.escritor._escribir(self._lote('ESC-001', 'ESC-002'))
+
+        self.assertEqual(Infraccion.objects.count(), 2)
+        metricas = self.escritor.metricas()
+        self.assertEqual((metricas['escritos'], metricas['reintentos'], metricas['errores']), (2, 1, 0))
+
+    def test_reintento_no_duplica_lo_confirmado(self):
+        # El primer intento confirma pero la respuesta se pierde
+        llamadas = []
+
+        def registrar(registros):
+            llamadas.append(registros)
+            resultado = self.registrar(registros)
+            if len(llamadas) == 1:
+                raise OperationalError('timeout al confirmar')
+            return resultado
+
+        with mock.patch.object(servicios, 'registrar_infracciones_idempotente', registrar):
+            self.escritor._escribir(self._lote('ESC-003'))
+
+        self.assertEqual(Infraccion.objects.count(), 1)
+        self.assertEqual(self.escritor.metricas()['errores'], 0)
+
+    def test_solo_descarta_los_registros_que_fallan_solos(self):
+        def condicion(registros, llamada):
+            return len(registros) > 1 or registros[0]['placa'] == 'MAL-001'
+
+        with self._fallar(condicion):
+            self.escritor._escribir(self._lote('ESC-004', 'MAL-001', 'ESC-005'))
+
+        self.assertEqual(
+            set(Infraccion.objects.values_list('vehiculo__placa', flat=True)), {'ESC-004', 'ESC-005'}
+        )
+        metricas = self.escritor.metricas()
+        self.assertEqual((metricas['escritos'], metricas['errores'], metricas['reintentos']), (2, 1, 2))
+
+    def test_encolar_asigna_id_evento(self):
+        self.escritor.activo = False
+        self.escritor.hilo.join(1)
+        datos = registro('ESC-006')
+        self.escritor.encolar(datos)
+        self.assertEqual(len(datos['id_evento']), 32)
+
+
+class ReconstruirTests(FlagsMssqlMixin, TestCase):
+    """Los agregados incrementales coinciden con los que recalculan los comandos"""
+
+    def setUp(self):
+        super().setUp()
+        self.camara, self.tipos = crear_catalogo()
+        otra = Camara.objects.create(ubicacion='Jr. Lima')
+        crear_infracciones_lote([
+            registro('REC-001', camara=self.camara, fecha_hora=datetime(2025, 1, 15, 8, 5)),
+            registro('REC-001', 'EXCESO_VEL', camara=self.camara, fecha_hora=datetime(2025, 1, 15, 8, 40),
+                     velocidad_detectada=85, velocidad_maxima=60),
+            registro('REC-002', 'EXCESO_VEL', camara=otra, fecha_hora=datetime(2025, 1, 15, 9, 10),
+                     velocidad_detectada=70, velocidad_maxima=60),
+            registro('REC-003', 'MAL_ESTACIONADO', fecha_hora=datetime(2025, 1, 16, 22, 0)),
+        ])
+        # Alta individual: acumula por la señal post_save
+        Infraccion.objects.create(
+            vehiculo=Vehiculo.objects.get(placa='REC-002'), tipo_infraccion=self.tipos['LUZ_ROJA'],
+            camara=otra, ubicacion='Jr. Lima', fecha_hora=datetime(2025, 1, 15, 9, 50), confianza_deteccion=80
+        )
+
+    def _resumenes(self):
+        # camara_id puede ser None: se ordena por la representación
+        return sorted(InfraccionResumenHora.objects.filter(total__gt=0).values_list(
+            'camara_id', 'tipo_infraccion_id', 'hora', 'total', 'total_con_velocidad', 'suma_velocidad', 'suma_exceso'
+        ), key=repr)
+
+    def _perfiles(self, campos=CAMPOS_PERFIL):
+        return sorted(PerfilConductor.objects.values_list('vehiculo_id', *campos))
+
+    def test_resumen_horas(self):
+        incremental = self._resumenes()
+        call_command('reconstruir_resumen_horas', stdout=StringIO())
+        self.assertEqual(self._resumenes(), incremental)
+
+    def test_perfiles(self):
+        incremental = self._perfiles()
+        call_command('reconstruir_perfiles', stdout=StringIO())
+        self.assertEqual(self._perfiles(), incremental)
+
+    def test_edicion_y_borrado_mueven_los_agregados(self):
+        # Al restar, primera/última infracción se conservan: se comparan los contadores
+        contadores = [campo for campo in CAMPOS_PERFIL if not campo.endswith('_infraccion')]
+
+        def comparar():
+            resumenes, perfiles = self._resumenes(), self._perfiles(contadores)
+            call_command('reconstruir_resumen_horas', stdout=StringIO())
+            call_command('reconstruir_perfiles', stdout=StringIO())
+            self.assertEqual(self._resumenes(), resumenes)
+            self.assertEqual(self._perfiles(contadores), perfiles)
+
+        infraccion = Infraccion.objects.get(vehiculo__placa='REC-003')
+        infraccion.tipo_infraccion = self.tipos['LUZ_ROJA']
+        infraccion.camara = self.camara
+        infraccion.fecha_hora = datetime(2025, 1, 15, 8, 55)
+        infraccion.save()
+        comparar()
+
+        infraccion.delete()
+        Infraccion.objects.filter(vehiculo__placa='REC-001').first().delete()
+        comparar()
+
+    def test_admin_del_resumen_es_de_solo_lectura(self):
+        request = RequestFactory().get('/')
+        request.user = mock.Mock(is_active=True, is_superuser=True)
+        modelo_admin = site._registry[InfraccionResumenHora]
+        self.assertFalse(modelo_admin.has_add_permission(request))
+        self.assertFalse(modelo_admin.has_change_permission(request, InfraccionResumenHora.objects.first()))
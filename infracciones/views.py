@@ -1,7 +1,9 @@
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Count, Q
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDate
 from datetime import datetime, timedelta
-from .models import Infraccion, TipoInfraccion
+from .cache import contexto_cacheado, CLAVE_ESTADISTICAS
+from .models import Infraccion, TipoInfraccion, InfraccionResumenHora
 
 def lista_infracciones(request):
     """Lista todas las infracciones"""
@@ -29,27 +31,40 @@ def detalle_infraccion(request, pk):
     
     return render(request, 'infracciones/detalle.html', context)
 
-def estadisticas(request):
-    """Estadísticas de infracciones"""
+def construir_contexto_estadisticas():
+    """Contexto de estadísticas con dos consultas agrupadas sobre el resumen horario"""
     hoy = datetime.now().date()
     hace_7_dias = hoy - timedelta(days=7)
     
     # Infracciones por tipo
-    por_tipo = Infraccion.objects.values('tipo_infraccion__nombre').annotate(
-        total=Count('id')
-    ).order_by('-total')
+    por_tipo = list(InfraccionResumenHora.objects.values('tipo_infraccion__nombre').annotate(
+        total=Sum('total')
+    ).order_by('-total'))
     
-    # Infracciones por día (última semana)
+    # Infracciones por día desde hace 7 días
+    conteos = dict(
+        InfraccionResumenHora.objects.filter(
+            hora__date__gte=hace_7_dias
+        ).annotate(
+            dia=TruncDate('hora')
+        ).values('dia').annotate(
+            total=Sum('total')
+        ).values_list('dia', 'total')
+    )
+    
+    # Última semana, del día más antiguo al más reciente
     por_dia = []
-    for i in range(7):
+    for i in range(6, -1, -1):
         dia = hoy - timedelta(days=i)
-        count = Infraccion.objects.filter(fecha_hora__date=dia).count()
-        por_dia.append({'dia': dia, 'count': count})
+        por_dia.append({'dia': dia, 'count': conteos.get(dia, 0)})
     
-    context = {
+    return {
         'por_tipo': por_tipo,
-        'por_dia': reversed(por_dia),
-        'total_semana': Infraccion.objects.filter(fecha_hora__date__gte=hace_7_dias).count()
+        'por_dia': por_dia,
+        'total_semana': sum(conteos.values())
     }
-    
+
+def estadisticas(request):
+    """Estadísticas de infracciones"""
+    context = contexto_cacheado(CLAVE_ESTADISTICAS, construir_contexto_estadisticas)
     return render(request, 'infracciones/estadisticas.html', context)
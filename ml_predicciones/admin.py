@@ -3,7 +3,7 @@ from .models import ModeloEntrenamiento, DatasetEntrenamiento
 
 @admin.register(ModeloEntrenamiento)
 class ModeloEntrenamientoAdmin(admin.ModelAdmin):
-    list_display = ['nombre', 'version', 'tipo_modelo', 'accuracy', 'activo', 'fecha_entrenamiento']
+    list_display = ['nombre', 'version', 'tipo_modelo', 'accuracy', 'f1_score', 'auc_roc', 'tiempo_entrenamiento_seg', 'activo', 'fecha_entrenamiento']
     list_filter = ['tipo_modelo', 'activo', 'fecha_entrenamiento']
     search_fields = ['nombre', 'objetivo']
     readonly_fields = ['fecha_entrenamiento']
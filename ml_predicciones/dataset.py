@@ -0,0 +1,282 @@
+"""
+Snapshots columnares de infracciones para entrenamiento
+Las infracciones (con tipo, vehículo y cámara) se exportan a Parquet o Arrow
+particionado por día: fecha=AAAA-MM-DD/infracciones.<ext>. Cada corrida
+escribe los días cerrados que aún no tienen partición y reescribe los ya
+exportados que recibieron filas nuevas o modificadas (actualizado_en) desde la
+corrida anterior, así el histórico se lee de la BD una sola vez. Las filas
+borradas no se detectan: para eso está reconstruir=True. Las features por vehículo salen de un groupby sobre el
+snapshot (un escaneo columnar) en lugar de varias consultas por vehículo.
+"""
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .registro import FEATURE_NAMES
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MEDIA_ROOT = BASE_DIR / 'media'
+DIRECTORIO_SNAPSHOT = MEDIA_ROOT / 'datasets' / 'infracciones'
+FORMATO = os.getenv('ML_SNAPSHOT_FORMATO', 'parquet')  # parquet | arrow
+CHUNK = int(os.getenv('ML_SNAPSHOT_CHUNK', 20000))
+ARCHIVO_MARCA = 'ultima_exportacion.txt'
+# Filas modificadas justo antes de la corrida pueden confirmarse después de leerlas
+MARGEN_MARCA = timedelta(minutes=5)
+
+EXTENSIONES = {'parquet': 'parquet', 'arrow': 'arrow'}
+GRAVEDADES_GRAVES = ('GRAVE', 'MUY_GRAVE')
+
+# Columna del snapshot -> campo de values_list
+COLUMNAS = {
+    'id': 'id',
+    'fecha_hora': 'fecha_hora',
+    'vehiculo_id': 'vehiculo_id',
+    'placa': 'vehiculo__placa',
+    'tipo_vehiculo': 'vehiculo__tipo_vehiculo',
+    'tipo_codigo': 'tipo_infraccion__codigo',
+    'gravedad': 'tipo_infraccion__gravedad',
+    'camara_id': 'camara_id',
+    'camara_ubicacion': 'camara__ubicacion',
+    'velocidad_detectada': 'velocidad_detectada',
+    'velocidad_maxima': 'velocidad_maxima',
+    'tiempo_luz_roja': 'tiempo_luz_roja',
+    'confianza_deteccion': 'confianza_deteccion',
+    'estado': 'estado',
+}
+TIPOS = {
+    'id': 'int64',
+    'vehiculo_id': 'int64',
+    'camara_id': 'Int64',
+    'velocidad_detectada': 'Int64',
+    'velocidad_maxima': 'Int64',
+    'tiempo_luz_roja': 'float64',
+    'confianza_deteccion': 'float64',
+}
+
+
+def _validar_formato(formato):
+    if formato not in EXTENSIONES:
+        raise ValueError(f"Formato de snapshot no soportado: {formato} (parquet | arrow)")
+
+
+def particiones(directorio=DIRECTORIO_SNAPSHOT, formato=FORMATO):
+    """{fecha: ruta} de las particiones ya escritas"""
+    _validar_formato(formato)
+    encontradas = {}
+    for ruta in Path(directorio).glob(f'fecha=*/infracciones.{EXTENSIONES[formato]}'):
+        try:
+            encontradas[datetime.strptime(ruta.parent.name[len('fecha='):], '%Y-%m-%d').date()] = ruta
+        except ValueError:
+            continue
+    return dict(sorted(encontradas.items()))
+
+
+def _escribir_particion(filas, fecha, directorio, formato):
+    df = pd.DataFrame.from_records(filas, columns=list(COLUMNAS))
+    df = df.astype(TIPOS)
+    ruta = Path(directorio) / f'fecha={fecha:%Y-%m-%d}' / f'infracciones.{EXTENSIONES[formato]}'
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    # Escritura atómica: una partición a medias no se toma como exportada
+    temporal = ruta.with_suffix('.tmp')
+    if formato == 'parquet':
+        df.to_parquet(temporal, index=False)
+    else:
+        df.to_feather(temporal)
+    os.replace(temporal, ruta)
+    return len(df)
+
+
+def _filas_por_lotes(consulta):
+    """Tuplas de COLUMNAS ordenadas por (fecha_hora, id), en consultas de CHUNK filas por keyset"""
+    from infracciones.consultas import recorrer_keyset
+
+    return recorrer_keyset(consulta, list(COLUMNAS.values()), ('fecha_hora', 'id'), CHUNK)
+
+
+def _escribir_por_dia(filas, directorio, formato):
+    escritas = {}
+    dia, pendientes = None, []
+    for fila in filas:
+        fecha = fila[1].date()
+        if fecha != dia and pendientes:
+            escritas[dia] = _escribir_particion(pendientes, dia, directorio, formato)
+            pendientes = []
+        dia = fecha
+        pendientes.append(fila)
+    if pendientes:
+        escritas[dia] = _escribir_particion(pendientes, dia, directorio, formato)
+    return escritas
+
+
+def _leer_marca(directorio):
+    try:
+        return datetime.fromisoformat((Path(directorio) / ARCHIVO_MARCA).read_text().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _guardar_marca(directorio, marca):
+    ruta = Path(directorio) / ARCHIVO_MARCA
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(marca.isoformat())
+
+
+def exportar_particiones(directorio=DIRECTORIO_SNAPSHOT, formato=FORMATO, hasta=None, desde=None, reconstruir=False):
+    """
+    Escribe las particiones diarias que faltan, desde el día siguiente a la
+    última exportada (o `desde`) hasta el día anterior a `hasta` (hoy por
+    defecto: el día en curso aún cambia), y reescribe los días anteriores con
+    filas creadas o modificadas desde la corrida previa (llegadas tarde o
+    reenviadas). reconstruir=True borra el snapshot y lo exporta completo.
+    Retorna {fecha: filas} de las particiones escritas.
+    """
+    from infracciones.models import Infraccion
+
+    _validar_formato(formato)
+    inicio = datetime.now()
+    hasta = hasta or inicio.date()
+    marca = None
+    if reconstruir:
+        for ruta in particiones(directorio, formato).values():
+            ruta.unlink()
+        desde = None
+    else:
+        marca = _leer_marca(directorio)
+        if desde is None:
+            existentes = particiones(directorio, formato)
+            desde = max(existentes) + timedelta(days=1) if existentes else None
+
+    fin = datetime.combine(hasta, datetime.min.time())
+    consulta = Infraccion.objects.filter(fecha_hora__lt=fin)
+    if desde is not None:
+        consulta = consulta.filter(fecha_hora__gte=datetime.combine(desde, datetime.min.time()))
+    escritas = _escribir_por_dia(_filas_por_lotes(consulta), directorio, formato)
+
+    if marca is not None and desde is not None:
+        tardios = Infraccion.objects.filter(
+            actualizado_en__gte=marca - MARGEN_MARCA,
+            fecha_hora__lt=min(fin, datetime.combine(desde, datetime.min.time())),
+        ).dates('fecha_hora', 'day')
+        for dia in tardios:
+            inicio_dia = datetime.combine(dia, datetime.min.time())
+            del_dia = Infraccion.objects.filter(fecha_hora__gte=inicio_dia, fecha_hora__lt=inicio_dia + timedelta(days=1))
+            escritas.update(_escribir_por_dia(_filas_por_lotes(del_dia), directorio, formato))
+
+    _guardar_marca(directorio, inicio)
+    return escritas
+
+
+def leer_snapshot(directorio=DIRECTORIO_SNAPSHOT, formato=FORMATO, columnas=None):
+    """DataFrame con todas las particiones (solo las columnas pedidas)"""
+    rutas = list(particiones(directorio, formato).values())
+    if not rutas:
+        return pd.DataFrame(columns=columnas or list(COLUMNAS))
+    leer = pd.read_parquet if formato == 'parquet' else pd.read_feather
+    return pd.concat([leer(ruta, columns=columnas) for ruta in rutas], ignore_index=True)
+
+
+def calcular_features(infracciones):
+    """
+    Features de reincidencia por vehículo con groupby vectorizado
+    Mismas definiciones que PredictorRiesgo.features_lote, para que el
+    entrenamiento y la predicción vean las mismas columnas
+    """
+    if infracciones.empty:
+        return pd.DataFrame(columns=['placa'] + FEATURE_NAMES + ['es_reincidente'])
+
+    df = pd.DataFrame({
+        'vehiculo_id': infracciones['vehiculo_id'],
+        'placa': infracciones['placa'],
+        'fecha_hora': pd.to_datetime(infracciones['fecha_hora']),
+        'grave': infracciones['gravedad'].isin(GRAVEDADES_GRAVES),
+        'velocidad': pd.to_numeric(infracciones['velocidad_detectada'], errors='coerce'),
+    })
+    df['hora'] = df['fecha_hora'].dt.hour
+
+    grupos = df.groupby('vehiculo_id', sort=False).agg(
+        placa=('placa', 'first'),
+        total_infracciones=('placa', 'size'),
+        infracciones_graves=('grave', 'sum'),
+        velocidad_promedio=('velocidad', 'mean'),
+        hora_promedio=('hora', 'mean'),
+        primera=('fecha_hora', 'min'),
+        ultima=('fecha_hora', 'max'),
+    )
+
+    total = grupos['total_infracciones'].to_numpy(dtype=float)
+    dias = (grupos['ultima'] - grupos['primera']).dt.days.to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tasa = np.where(dias == 0, total, total / dias * 30)
+
+    features = pd.DataFrame({
+        'placa': grupos['placa'].to_numpy(),
+        'total_infracciones': total.astype(int),
+        'infracciones_graves': grupos['infracciones_graves'].to_numpy(dtype=int),
+        'infracciones_leves': (total - grupos['infracciones_graves'].to_numpy()).astype(int),
+        'velocidad_promedio': grupos['velocidad_promedio'].fillna(50.0).to_numpy(dtype=float),
+        'tasa_infracciones_mes': tasa,
+        'hora_promedio': grupos['hora_promedio'].to_numpy(dtype=float),
+    })
+    # Etiqueta: es reincidente si tiene más de 3 infracciones
+    features['es_reincidente'] = (features['total_infracciones'] > 3).astype(int)
+    return features
+
+
+def generar_dataset(directorio=DIRECTORIO_SNAPSHOT, formato=FORMATO, nombre=None, registrar=True, reconstruir=False):
+    """
+    Actualiza el snapshot, calcula las features y las guarda en
+    media/datasets/ registradas como DatasetEntrenamiento
+    Retorna (features, DatasetEntrenamiento o None, particiones escritas)
+    """
+    escritas = exportar_particiones(directorio, formato, reconstruir=reconstruir)
+    columnas = ['vehiculo_id', 'placa', 'fecha_hora', 'gravedad', 'velocidad_detectada']
+    features = calcular_features(leer_snapshot(directorio, formato, columnas))
+
+    dataset = None
+    if registrar and not features.empty:
+        from .models import DatasetEntrenamiento
+
+        marca = datetime.now().strftime('%Y%m%d_%H%M%S')
+        relativa = f'datasets/features_reincidencia_{marca}.{EXTENSIONES[formato]}'
+        ruta = MEDIA_ROOT / relativa
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        if formato == 'parquet':
+            features.to_parquet(ruta, index=False)
+        else:
+            features.to_feather(ruta)
+
+        total_particiones = particiones(directorio, formato)
+        dataset = DatasetEntrenamiento.objects.create(
+            nombre=nombre or f'Features reincidencia {marca}',
+            descripcion=(
+                f'Features por vehículo desde el snapshot {Path(directorio).name} '
+                f'({len(total_particiones)} particiones diarias, '
+                f'{min(total_particiones):%Y-%m-%d} a {max(total_particiones):%Y-%m-%d})'
+            ),
+            tipo_datos='INFRACCIONES',
+            cantidad_registros=len(features),
+            archivo_dataset=relativa,
+            etiquetado_completo=True,
+        )
+    return features, dataset, escritas
+
+
+def generar_sintetico(n_registros=500, semilla=42):
+    """Features sintéticas (misma heurística de etiqueta) para cuando hay pocos datos reales"""
+    rng = np.random.default_rng(semilla)
+    total = rng.integers(1, 20, n_registros)
+    graves = (rng.random(n_registros) * total).astype(int)
+    tasa = rng.uniform(0.5, 10, n_registros)
+    return pd.DataFrame({
+        'placa': [f'SYN-{i:04d}' for i in range(n_registros)],
+        'total_infracciones': total,
+        'infracciones_graves': graves,
+        'infracciones_leves': total - graves,
+        'velocidad_promedio': rng.normal(60, 15, n_registros),
+        'tasa_infracciones_mes': tasa,
+        'hora_promedio': rng.uniform(0, 24, n_registros),
+        'es_reincidente': ((total > 5) | (graves > 3) | (tasa > 5)).astype(int),
+    })
@@ -0,0 +1,132 @@
+"""
+Entrenamiento del modelo de reincidencia con búsqueda de hiperparámetros
+La búsqueda (RandomizedSearchCV) reparte candidatos x folds entre todos los
+núcleos; cada RandomForest usa un solo hilo para no sobresuscribir la CPU.
+El modelo ganador se evalúa en un holdout, se guarda versionado en
+media/modelos/ y se registra como ModeloEntrenamiento activo.
+"""
+import os
+import time
+from datetime import datetime
+
+import joblib
+
+from .dataset import MEDIA_ROOT
+from .registro import FEATURE_NAMES
+
+ETIQUETA = 'es_reincidente'
+JOBS = int(os.getenv('ML_ENTRENAMIENTO_JOBS', -1))
+
+ESPACIO_BUSQUEDA = {
+    'modelo__n_estimators': [100, 200, 400],
+    'modelo__max_depth': [None, 6, 10, 16],
+    'modelo__min_samples_leaf': [1, 2, 5],
+    'modelo__max_features': ['sqrt', 0.5, None],
+    'modelo__class_weight': [None, 'balanced'],
+}
+
+
+def buscar_modelo(df, folds=5, iteraciones=20, jobs=JOBS, semilla=42, test_size=0.2):
+    """
+    Búsqueda con validación cruzada estratificada sobre el 80% de los datos
+    Retorna (pipeline ganador, métricas del holdout en %, resumen de la búsqueda)
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+    from sklearn.model_selection import RandomizedSearchCV, StratifiedKFold, train_test_split
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    X = df[FEATURE_NAMES].astype(float)
+    y = df[ETIQUETA].astype(int)
+    if y.nunique() < 2:
+        raise ValueError('El dataset tiene una sola clase; no se puede entrenar un clasificador')
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, stratify=y, random_state=semilla
+    )
+    # El scaler va dentro del pipeline para que cada fold lo ajuste solo con su parte de entrenamiento
+    pipeline = Pipeline([
+        ('scaler', StandardScaler()),
+        ('modelo', RandomForestClassifier(random_state=semilla, n_jobs=1)),
+    ])
+    busqueda = RandomizedSearchCV(
+        pipeline, ESPACIO_BUSQUEDA, n_iter=iteraciones, scoring='roc_auc',
+        cv=StratifiedKFold(n_splits=folds, shuffle=True, random_state=semilla),
+        n_jobs=jobs, random_state=semilla, refit=True
+    )
+    inicio = time.perf_counter()
+    busqueda.fit(X_train, y_train)
+    duracion = time.perf_counter() - inicio
+
+    ganador = busqueda.best_estimator_
+    y_pred = ganador.predict(X_test)
+    y_proba = ganador.predict_proba(X_test)[:, 1]
+    metricas = {
+        'accuracy': accuracy_score(y_test, y_pred) * 100,
+        'precision': precision_score(y_test, y_pred, zero_division=0) * 100,
+        'recall': recall_score(y_test, y_pred, zero_division=0) * 100,
+        'f1_score': f1_score(y_test, y_pred, zero_division=0) * 100,
+        'auc_roc': roc_auc_score(y_test, y_proba) * 100,
+    }
+    resumen = {
+        'mejores': {clave.removeprefix('modelo__'): valor for clave, valor in busqueda.best_params_.items()},
+        'cv_auc_roc': float(busqueda.best_score_),
+        'cv_auc_roc_std': float(busqueda.cv_results_['std_test_score'][busqueda.best_index_]),
+        'candidatos': len(busqueda.cv_results_['params']),
+        'folds': folds,
+        'jobs': jobs,
+        'n_train': len(X_train),
+        'n_test': len(X_test),
+        'tiempo_seg': duracion,
+    }
+    return ganador, metricas, resumen
+
+
+def registrar_modelo(pipeline, metricas, resumen, dataset_size, nombre='Reincidencia RandomForest',
+                     notas=None, activar=True):
+    """
+    Guarda modelo y scaler versionados (archivo_modelo / archivo_pesos) y crea el
+    ModeloEntrenamiento; si activar, desactiva el anterior en la misma
+    transacción y pide al registro del proceso que recargue
+    """
+    from django.db import transaction
+
+    from .models import ModeloEntrenamiento
+    from .registro import registro
+
+    version = datetime.now().strftime('%Y%m%d-%H%M%S')
+    relativas = {
+        'archivo_modelo': f'modelos/reincidencia_{version}.pkl',
+        'archivo_pesos': f'modelos/pesos/scaler_{version}.pkl',
+    }
+    for campo, objeto in (('archivo_modelo', pipeline.named_steps['modelo']),
+                          ('archivo_pesos', pipeline.named_steps['scaler'])):
+        ruta = MEDIA_ROOT / relativas[campo]
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        # El registro recarga por mtime: el archivo aparece completo o no aparece
+        temporal = ruta.with_suffix('.tmp')
+        joblib.dump(objeto, temporal)
+        os.replace(temporal, ruta)
+
+    with transaction.atomic():
+        if activar:
+            # select_for_update serializa dos entrenamientos que terminan a la vez
+            list(ModeloEntrenamiento.objects.select_for_update().filter(tipo_modelo='CLASIFICACION', activo=True))
+            ModeloEntrenamiento.objects.filter(tipo_modelo='CLASIFICACION', activo=True).update(activo=False)
+        modelo = ModeloEntrenamiento.objects.create(
+            nombre=nombre,
+            version=version,
+            tipo_modelo='CLASIFICACION',
+            objetivo='Probabilidad de reincidencia del vehículo a partir de su historial de infracciones',
+            dataset_size=dataset_size,
+            activo=activar,
+            parametros=resumen,
+            tiempo_entrenamiento_seg=round(resumen['tiempo_seg'], 2),
+            notas=notas,
+            **{campo: round(valor, 2) for campo, valor in metricas.items()},
+            **relativas,
+        )
+        if activar:
+            transaction.on_commit(registro.recargar)
+    return modelo
@@ -0,0 +1,90 @@
+"""
+Entrena el modelo de reincidencia con búsqueda de hiperparámetros en paralelo
+Uso: python manage.py entrenar_modelo [--folds 5] [--iteraciones 20] [--jobs -1]
+     [--dataset ID] [--minimo 10] [--sin-activar] [--activar-sinteticos]
+Sin --dataset actualiza el snapshot columnar y entrena con sus features.
+Un modelo completado con datos sintéticos se registra sin activar salvo
+que se pase --activar-sinteticos.
+"""
+import os
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_predicciones import dataset, entrenamiento
+from ml_predicciones.models import DatasetEntrenamiento
+
+
+class Command(BaseCommand):
+    help = 'Búsqueda de hiperparámetros con validación cruzada en todos los núcleos y registro del modelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--folds', type=int, default=5)
+        parser.add_argument('--iteraciones', type=int, default=20, help='Candidatos de la búsqueda aleatoria')
+        parser.add_argument('--jobs', type=int, default=entrenamiento.JOBS, help='Procesos (-1 = todos los núcleos)')
+        parser.add_argument('--dataset', type=int, help='DatasetEntrenamiento ya registrado a usar')
+        parser.add_argument('--minimo', type=int, default=10,
+                            help='Con menos vehículos reales se completa con datos sintéticos')
+        parser.add_argument('--nombre', default='Reincidencia RandomForest')
+        parser.add_argument('--sin-activar', action='store_true', help='Registrar el modelo sin activarlo')
+        parser.add_argument('--activar-sinteticos', action='store_true',
+                            help='Activar el modelo aunque se haya completado con datos sintéticos')
+
+    def handle(self, *args, **options):
+        df, origen = self._dataset(options)
+        notas = [f'Dataset: {origen}']
+        activar = not options['sin_activar']
+        if len(df) < options['minimo']:
+            sinteticos = dataset.generar_sintetico()
+            self.stdout.write(
+                f'⚠️  {len(df)} vehículos reales, se completa con {len(sinteticos)} registros sintéticos'
+            )
+            notas.append(f'{len(sinteticos)} registros sintéticos y {len(df)} reales')
+            df = pd.concat([df, sinteticos], ignore_index=True)
+            if activar and not options['activar_sinteticos']:
+                activar = False
+                notas.append('No activado por usar datos sintéticos (--activar-sinteticos para forzarlo)')
+                self.stdout.write('⚠️  El modelo no se activará: usa datos sintéticos (--activar-sinteticos)')
+            elif activar:
+                notas.append('Activado con datos sintéticos (--activar-sinteticos)')
+
+        self.stdout.write(
+            f"🤖 Buscando hiperparámetros: {options['iteraciones']} candidatos x {options['folds']} folds, "
+            f"jobs={options['jobs']} ({os.cpu_count()} núcleos), {len(df)} registros"
+        )
+        try:
+            pipeline, metricas, resumen = entrenamiento.buscar_modelo(
+                df, folds=options['folds'], iteraciones=options['iteraciones'], jobs=options['jobs']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        modelo = entrenamiento.registrar_modelo(
+            pipeline, metricas, resumen, dataset_size=len(df), nombre=options['nombre'],
+            notas='\n'.join(notas), activar=activar
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {modelo} en {resumen['tiempo_seg']:.1f}s "
+            f"(CV AUC {resumen['cv_auc_roc']:.3f} ± {resumen['cv_auc_roc_std']:.3f})"
+        ))
+        for nombre, valor in metricas.items():
+            self.stdout.write(f'   {nombre}: {valor:.2f}%')
+        self.stdout.write(f"   Parámetros: {resumen['mejores']}")
+        self.stdout.write(f'   {"Activo" if modelo.activo else "Registrado sin activar"}: {modelo.archivo_modelo.name}')
+
+    def _dataset(self, options):
+        """(features, descripción del origen)"""
+        if options['dataset'] is None:
+            features, registrado, _ = dataset.generar_dataset()
+            return features, registrado.nombre if registrado else 'snapshot vacío'
+
+        registrado = DatasetEntrenamiento.objects.filter(pk=options['dataset']).first()
+        if registrado is None or not registrado.archivo_dataset:
+            raise CommandError(f"Dataset {options['dataset']} no existe o no tiene archivo")
+        ruta = registrado.archivo_dataset.path
+        if ruta.endswith('.parquet'):
+            return pd.read_parquet(ruta), registrado.nombre
+        if ruta.endswith('.arrow'):
+            return pd.read_feather(ruta), registrado.nombre
+        return pd.read_csv(ruta), registrado.nombre
@@ -0,0 +1,40 @@
+"""
+Recalcula el riesgo de reincidencia de todos los vehículos con perfil
+Uso: python manage.py puntuar_flota [--chunk 5000] [--placas ABC-123 XYZ-789] [--simular]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from ml_predicciones.predictor import PredictorRiesgo
+
+
+class Command(BaseCommand):
+    help = 'Puntúa el riesgo de toda la flota en lotes vectorizados y actualiza PerfilConductor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk', type=int, default=5000, help='Perfiles por llamada al modelo')
+        parser.add_argument('--placas', nargs='+', help='Solo estas placas')
+        parser.add_argument('--simular', action='store_true', help='Calcular sin guardar')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        predictor = PredictorRiesgo()
+        resultados = predictor.predecir_lote(
+            placas=options['placas'],
+            tam_chunk=options['chunk'],
+            guardar=not options['simular']
+        )
+        duracion = time.perf_counter() - inicio
+
+        por_nivel = {}
+        for resultado in resultados.values():
+            por_nivel[resultado['nivel_riesgo']] = por_nivel.get(resultado['nivel_riesgo'], 0) + 1
+
+        modo = 'heurística' if not predictor.modelo_cargado else 'modelo ML'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {len(resultados)} vehículos puntuados con {modo} en {duracion:.1f}s '
+            f'({len(resultados) / duracion if duracion else 0:.0f}/s)'
+        ))
+        for nivel in PredictorRiesgo.NIVELES_RIESGO:
+            self.stdout.write(f'   {nivel}: {por_nivel.get(str(nivel), 0)}')
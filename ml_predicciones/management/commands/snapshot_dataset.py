@@ -0,0 +1,65 @@
+"""
+Actualiza el snapshot columnar de infracciones y registra el dataset de features
+Uso: python manage.py snapshot_dataset [--formato parquet|arrow] [--desde 2025-01-01] [--reconstruir] [--sin-registrar]
+Se exportan los días cerrados sin partición y se reescriben los que recibieron
+filas tardías o modificadas; --reconstruir rehace todo (p. ej. tras borrar infracciones).
+"""
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_predicciones import dataset
+
+
+class Command(BaseCommand):
+    help = 'Exporta infracciones a Parquet/Arrow particionado por día y registra las features como DatasetEntrenamiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=sorted(dataset.EXTENSIONES), default=dataset.FORMATO)
+        parser.add_argument('--directorio', default=str(dataset.DIRECTORIO_SNAPSHOT))
+        parser.add_argument('--desde', help='Reescribir las particiones desde esta fecha (AAAA-MM-DD)')
+        parser.add_argument('--reconstruir', action='store_true', help='Borrar el snapshot y exportarlo completo')
+        parser.add_argument('--nombre', help='Nombre del DatasetEntrenamiento')
+        parser.add_argument('--sin-registrar', action='store_true', help='Solo exportar particiones')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['reconstruir'] and options['desde']:
+            raise CommandError('--reconstruir y --desde no se combinan')
+        if options['reconstruir']:
+            escritas = dataset.exportar_particiones(options['directorio'], options['formato'], reconstruir=True)
+            self._resumen_particiones(escritas)
+        elif options['desde']:
+            try:
+                desde = datetime.strptime(options['desde'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--desde debe tener el formato AAAA-MM-DD')
+            escritas = dataset.exportar_particiones(options['directorio'], options['formato'], desde=desde)
+            self._resumen_particiones(escritas)
+
+        if options['sin_registrar']:
+            if not options['desde'] and not options['reconstruir']:
+                self._resumen_particiones(dataset.exportar_particiones(options['directorio'], options['formato']))
+            return
+
+        features, registrado, escritas = dataset.generar_dataset(
+            options['directorio'], options['formato'], nombre=options['nombre']
+        )
+        self._resumen_particiones(escritas)
+        duracion = time.perf_counter() - inicio
+        if registrado is None:
+            self.stdout.write('⚠️  Sin infracciones en el snapshot, no se registró dataset')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Dataset "{registrado.nombre}": {len(features)} vehículos, '
+            f'{int(features["es_reincidente"].sum())} reincidentes ({duracion:.1f}s)'
+        ))
+        self.stdout.write(f'   {registrado.archivo_dataset.name}')
+
+    def _resumen_particiones(self, escritas):
+        if escritas:
+            self.stdout.write(
+                f'📦 {len(escritas)} particiones escritas ({sum(escritas.values())} infracciones), '
+                f'{min(escritas):%Y-%m-%d} a {max(escritas):%Y-%m-%d}'
+            )
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_predicciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modeloentrenamiento',
+            name='auc_roc',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='modeloentrenamiento',
+            name='parametros',
+            field=models.JSONField(blank=True, help_text='Hiperparámetros elegidos y resultado de la validación cruzada', null=True),
+        ),
+        migrations.AddField(
+            model_name='modeloentrenamiento',
+            name='tiempo_entrenamiento_seg',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -22,6 +22,11 @@ class ModeloEntrenamiento(models.Model):
     precision = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     recall = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     f1_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    auc_roc = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    
+    # Búsqueda de hiperparámetros (manage.py entrenar_modelo)
+    parametros = models.JSONField(null=True, blank=True, help_text="Hiperparámetros elegidos y resultado de la validación cruzada")
+    tiempo_entrenamiento_seg = models.FloatField(null=True, blank=True)
     
     # Archivos del modelo
     archivo_modelo = models.FileField(upload_to='modelos/', null=True, blank=True)
@@ -2,121 +2,111 @@
 Módulo de predicción ML integrado con Django
 Predice riesgo de reincidencia y accidentes
 """
-import os
-import joblib
 import numpy as np
 import pandas as pd
-from pathlib import Path
 from datetime import datetime, timedelta
 from django.utils import timezone
 
+from .registro import FEATURE_NAMES, obtener_modelo, registro
+
 class PredictorRiesgo:
-    """Predictor de riesgo usando modelos de Machine Learning"""
+    """
+    Predictor de riesgo usando modelos de Machine Learning
+    Los pesos viven en el registro del proceso (registro.py): crear un
+    PredictorRiesgo es barato y siempre usa el modelo activo más reciente.
+    """
     
-    def __init__(self):
-        self.modelo = None
-        self.scaler = None
-        self.feature_names = None
-        self.modelo_cargado = False
-        
-        # Intentar cargar modelo entrenado
-        self.cargar_modelo()
+    def _modelo_actual(self):
+        return obtener_modelo()
+    
+    @property
+    def modelo_cargado(self):
+        return self._modelo_actual() is not None
+    
+    @property
+    def modelo(self):
+        actual = self._modelo_actual()
+        return actual.modelo if actual else None
+    
+    @property
+    def scaler(self):
+        actual = self._modelo_actual()
+        return actual.scaler if actual else None
+    
+    @property
+    def feature_names(self):
+        actual = self._modelo_actual()
+        return actual.feature_names if actual else None
     
     def cargar_modelo(self):
-        """Carga el modelo ML entrenado desde el notebook"""
-        try:
-            base_dir = Path(__file__).resolve().parent.parent
-            modelo_path = base_dir / 'notebooks' / 'modelo_reincidencia.pkl'
-            scaler_path = base_dir / 'notebooks' / 'scaler.pkl'
-            
-            if modelo_path.exists() and scaler_path.exists():
-                self.modelo = joblib.load(modelo_path)
-                self.scaler = joblib.load(scaler_path)
-                self.feature_names = [
-                    'total_infracciones',
-                    'infracciones_graves',
-                    'infracciones_leves',
-                    'velocidad_promedio',
-                    'tasa_infracciones_mes',
-                    'hora_promedio'
-                ]
-                self.modelo_cargado = True
-                print("✅ Modelo ML cargado correctamente")
-            else:
-                print("⚠️  Modelo ML no encontrado. Ejecuta el notebook primero.")
-                self.modelo_cargado = False
-                
-        except Exception as e:
-            print(f"⚠️  Error al cargar modelo ML: {e}")
-            self.modelo_cargado = False
+        """Fuerza al registro a verificar y recargar el modelo si cambió"""
+        registro.recargar()
+        return self.modelo_cargado
+    
+    FEATURES_SIN_HISTORIAL = {
+        'total_infracciones': 0,
+        'infracciones_graves': 0,
+        'infracciones_leves': 0,
+        'velocidad_promedio': 50.0,
+        'tasa_infracciones_mes': 0.0,
+        'hora_promedio': 12.0
+    }
+    
+    FEATURES_SIN_HISTORIAL_PERFIL = {
+        'total_infracciones': 0,
+        'infracciones_graves': 0,
+        'total_con_velocidad': 0,
+        'suma_velocidad': 0,
+        'suma_horas': 0,
+        'primera_infraccion': None,
+        'ultima_infraccion': None,
+    }
+    
+    CAMPOS_PERFIL = (
+        'total_infracciones', 'infracciones_graves', 'total_con_velocidad',
+        'suma_velocidad', 'suma_horas', 'primera_infraccion', 'ultima_infraccion'
+    )
+    
+    @classmethod
+    def features_desde_perfil(cls, perfil):
+        """Features del modelo a partir de los agregados de PerfilConductor (dict de valores)"""
+        total = perfil['total_infracciones'] if perfil else 0
+        if not total:
+            # Vehículo nuevo o sin historial
+            return dict(cls.FEATURES_SIN_HISTORIAL)
+        
+        graves = perfil['infracciones_graves']
+        
+        # Velocidad promedio (solo de infracciones con velocidad)
+        if perfil['total_con_velocidad']:
+            velocidad_prom = perfil['suma_velocidad'] / perfil['total_con_velocidad']
+        else:
+            velocidad_prom = 50.0
+        
+        # Tasa de infracciones por mes
+        dias_diferencia = (perfil['ultima_infraccion'] - perfil['primera_infraccion']).days
+        if dias_diferencia == 0:
+            tasa_mes = total
+        else:
+            tasa_mes = (total / dias_diferencia) * 30
+        
+        return {
+            'total_infracciones': total,
+            'infracciones_graves': graves,
+            'infracciones_leves': total - graves,
+            'velocidad_promedio': float(velocidad_prom),
+            'tasa_infracciones_mes': float(tasa_mes),
+            'hora_promedio': float(perfil['suma_horas'] / total)
+        }
     
     def calcular_features_vehiculo(self, placa):
-        """Calcula features de un vehículo para predicción"""
-        from infracciones.models import Vehiculo, Infraccion
+        """Calcula features de un vehículo leyendo una sola fila de PerfilConductor"""
+        from infracciones.models import PerfilConductor
         
-        try:
-            vehiculo = Vehiculo.objects.get(placa=placa)
-            infracciones = Infraccion.objects.filter(vehiculo=vehiculo)
-            
-            if infracciones.count() == 0:
-                # Vehículo sin historial
-                return {
-                    'total_infracciones': 0,
-                    'infracciones_graves': 0,
-                    'infracciones_leves': 0,
-                    'velocidad_promedio': 50.0,
-                    'tasa_infracciones_mes': 0.0,
-                    'hora_promedio': 12.0
-                }
-            
-            # Calcular estadísticas
-            total = infracciones.count()
-            
-            # Contar graves (GRAVE y MUY_GRAVE)
-            graves = infracciones.filter(
-                tipo_infraccion__gravedad__in=['GRAVE', 'MUY_GRAVE']
-            ).count()
-            leves = total - graves
-            
-            # Velocidad promedio (solo de infracciones con velocidad)
-            velocidades = infracciones.filter(
-                velocidad_detectada__isnull=False
-            ).values_list('velocidad_detectada', flat=True)
-            velocidad_prom = np.mean(list(velocidades)) if velocidades else 50.0
-            
-            # Tasa de infracciones por mes
-            fecha_primera = infracciones.order_by('fecha_hora').first().fecha_hora
-            fecha_ultima = infracciones.order_by('-fecha_hora').first().fecha_hora
-            dias_diferencia = (fecha_ultima - fecha_primera).days
-            
-            if dias_diferencia == 0:
-                tasa_mes = total
-            else:
-                tasa_mes = (total / dias_diferencia) * 30
-            
-            # Hora promedio
-            horas = [inf.fecha_hora.hour for inf in infracciones]
-            hora_prom = np.mean(horas) if horas else 12.0
-            
-            return {
-                'total_infracciones': total,
-                'infracciones_graves': graves,
-                'infracciones_leves': leves,
-                'velocidad_promedio': float(velocidad_prom),
-                'tasa_infracciones_mes': float(tasa_mes),
-                'hora_promedio': float(hora_prom)
-            }
-            
-        except Vehiculo.DoesNotExist:
-            # Vehículo nuevo
-            return {
-                'total_infracciones': 0,
-                'infracciones_graves': 0,
-                'infracciones_leves': 0,
-                'velocidad_promedio': 50.0,
-                'tasa_infracciones_mes': 0.0,
-                'hora_promedio': 12.0
-            }
+        perfil = PerfilConductor.objects.filter(
+            vehiculo__placa=placa
+        ).values(*self.CAMPOS_PERFIL).first()
+        return self.features_desde_perfil(perfil)
     
     def predecir_riesgo_vehiculo(self, placa):
         """Predice el riesgo de reincidencia de un vehículo"""
@@ -126,15 +116,16 @@ class PredictorRiesgo:
         features = self.calcular_features_vehiculo(placa)
         
         # Si no hay modelo, usar heurística simple
-        if not self.modelo_cargado:
+        actual = self._modelo_actual()
+        if actual is None:
             return self._prediccion_heuristica(features)
         
         # Preparar datos para el modelo
-        X = pd.DataFrame([features])[self.feature_names]
-        X_scaled = self.scaler.transform(X)
+        X = pd.DataFrame([features])[actual.feature_names]
+        X_scaled = actual.scaler.transform(X)
         
         # Predecir
-        probabilidad = self.modelo.predict_proba(X_scaled)[0][1] * 100
+        probabilidad = actual.modelo.predict_proba(X_scaled)[0][1] * 100
         es_reincidente = probabilidad > 50
         
         # Determinar nivel de riesgo
@@ -147,17 +138,20 @@ class PredictorRiesgo:
         else:
             nivel_riesgo = 'CRITICO'
         
-        # Actualizar perfil del conductor
+        # Actualizar perfil del conductor (los contadores se mantienen al registrar infracciones)
         try:
-            vehiculo = Vehiculo.objects.get(placa=placa)
-            perfil, created = PerfilConductor.objects.get_or_create(vehiculo=vehiculo)
-            
-            perfil.total_infracciones = features['total_infracciones']
-            perfil.infracciones_graves = features['infracciones_graves']
-            perfil.puntuacion_riesgo = probabilidad
-            perfil.nivel_riesgo = nivel_riesgo
-            perfil.probabilidad_reincidencia = probabilidad
-            perfil.save()
+            resultado = {
+                'puntuacion_riesgo': probabilidad,
+                'nivel_riesgo': nivel_riesgo,
+                'probabilidad_reincidencia': probabilidad,
+            }
+            actualizados = PerfilConductor.objects.filter(vehiculo__placa=placa).update(
+                ultima_actualizacion=timezone.now(), **resultado
+            )
+            if not actualizados:
+                vehiculo = Vehiculo.objects.filter(placa=placa).first()
+                if vehiculo is not None:
+                    PerfilConductor.objects.get_or_create(vehiculo=vehiculo, defaults=resultado)
             
         except Exception as e:
             print(f"⚠️  Error al actualizar perfil: {e}")
@@ -170,6 +164,119 @@ class PredictorRiesgo:
             'features': features
         }
     
+    # Umbrales de probabilidad (%) que separan BAJO | MEDIO | ALTO | CRITICO
+    UMBRALES_RIESGO = [25, 50, 75]
+    NIVELES_RIESGO = np.array(['BAJO', 'MEDIO', 'ALTO', 'CRITICO'])
+    
+    def features_lote(self, perfiles):
+        """
+        Matriz de features (una fila por perfil, columnas en el orden del modelo)
+        perfiles: DataFrame con las columnas de CAMPOS_PERFIL
+        """
+        total = perfiles['total_infracciones'].to_numpy(dtype=float)
+        graves = perfiles['infracciones_graves'].to_numpy(dtype=float)
+        con_velocidad = perfiles['total_con_velocidad'].to_numpy(dtype=float)
+        con_historial = total > 0
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            velocidad = np.where(con_velocidad > 0, perfiles['suma_velocidad'].to_numpy(dtype=float) / con_velocidad, 50.0)
+            hora = np.where(con_historial, perfiles['suma_horas'].to_numpy(dtype=float) / total, 12.0)
+            
+            dias = (
+                pd.to_datetime(perfiles['ultima_infraccion']) - pd.to_datetime(perfiles['primera_infraccion'])
+            ).dt.days.fillna(0).to_numpy(dtype=float)
+            tasa = np.where(dias == 0, total, total / dias * 30)
+        
+        columnas = {
+            'total_infracciones': total,
+            'infracciones_graves': graves,
+            'infracciones_leves': total - graves,
+            'velocidad_promedio': np.where(con_historial, velocidad, 50.0),
+            'tasa_infracciones_mes': np.where(con_historial, tasa, 0.0),
+            'hora_promedio': hora,
+        }
+        return np.column_stack([columnas[nombre] for nombre in FEATURE_NAMES])
+    
+    def puntuar_matriz(self, X):
+        """Probabilidad de reincidencia (%) por fila, con el modelo o la heurística"""
+        actual = self._modelo_actual()
+        if actual is None:
+            total, graves, tasa = X[:, 0], X[:, 1], X[:, 4]
+            return np.minimum(total * 10 + graves * 20 + tasa * 5, 100)
+        
+        X_scaled = actual.scaler.transform(pd.DataFrame(X, columns=actual.feature_names))
+        return actual.modelo.predict_proba(X_scaled)[:, 1] * 100
+    
+    def _lotes_perfiles(self, placas, tam_chunk):
+        from infracciones.consultas import filtrar_en_bloques, lotes_keyset
+        from infracciones.models import PerfilConductor
+        
+        columnas = ('id', 'vehiculo__placa') + self.CAMPOS_PERFIL
+        
+        if placas is not None:
+            for bloque in filtrar_en_bloques(PerfilConductor.objects, 'vehiculo__placa', placas):
+                filas = list(bloque.values_list(*columnas))
+                if filas:
+                    yield pd.DataFrame.from_records(filas, columns=columnas)
+            return
+        
+        # Recorrido por keyset sobre el id para no usar OFFSET
+        for filas in lotes_keyset(PerfilConductor.objects, list(columnas), ('id',), tam_chunk):
+            yield pd.DataFrame.from_records(filas, columns=columnas)
+    
+    def predecir_lote(self, placas=None, tam_chunk=5000, guardar=True):
+        """
+        Puntúa muchos vehículos a la vez: features vectorizadas desde PerfilConductor,
+        una llamada al modelo por chunk y bulk_update de los perfiles.
+        placas=None puntúa todos los perfiles. Retorna {placa: resultado}.
+        """
+        from infracciones.models import PerfilConductor
+        
+        resultados = {}
+        ahora = timezone.now()
+        
+        for perfiles in self._lotes_perfiles(placas, tam_chunk):
+            probabilidades = self.puntuar_matriz(self.features_lote(perfiles))
+            niveles = self.NIVELES_RIESGO[np.digitize(probabilidades, self.UMBRALES_RIESGO)]
+            
+            for placa, probabilidad, nivel in zip(perfiles['vehiculo__placa'], probabilidades, niveles):
+                resultados[placa] = {
+                    'placa': placa,
+                    'es_reincidente': bool(probabilidad > 50),
+                    'probabilidad_reincidencia': float(probabilidad),
+                    'nivel_riesgo': str(nivel),
+                }
+            
+            if guardar:
+                PerfilConductor.objects.bulk_update(
+                    [
+                        PerfilConductor(
+                            id=perfil_id,
+                            puntuacion_riesgo=round(float(probabilidad), 2),
+                            nivel_riesgo=str(nivel),
+                            probabilidad_reincidencia=round(float(probabilidad), 2),
+                            ultima_actualizacion=ahora
+                        )
+                        for perfil_id, probabilidad, nivel in zip(perfiles['id'], probabilidades, niveles)
+                    ],
+                    ['puntuacion_riesgo', 'nivel_riesgo', 'probabilidad_reincidencia', 'ultima_actualizacion'],
+                    batch_size=1000
+                )
+        
+        # Placas pedidas sin perfil: sin historial
+        if placas is not None:
+            X = self.features_lote(pd.DataFrame([dict(self.FEATURES_SIN_HISTORIAL_PERFIL)]))
+            probabilidad = float(self.puntuar_matriz(X)[0])
+            for placa in placas:
+                resultados.setdefault(placa, {
+                    'placa': placa,
+                    'es_reincidente': probabilidad > 50,
+                    'probabilidad_reincidencia': probabilidad,
+                    'nivel_riesgo': str(self.NIVELES_RIESGO[np.digitize(probabilidad, self.UMBRALES_RIESGO)]),
+                })
+        
+        return resultados
+    
     def _prediccion_heuristica(self, features):
         """Predicción simple sin modelo ML (fallback)"""
         total = features['total_infracciones']
@@ -199,11 +306,16 @@ class PredictorRiesgo:
     
     def predecir_zona_riesgo(self, ubicacion, latitud, longitud):
         """Predice riesgo de accidente en una zona específica"""
-        from infracciones.models import Infraccion, PrediccionAccidente
+        from django.db.models import Sum
+        from infracciones.models import Infraccion, InfraccionResumenHora, PrediccionAccidente
         
-        # Contar infracciones históricas en la zona (radio de 1km aprox)
-        infracciones_zona = Infraccion.objects.filter(
-            ubicacion__icontains=ubicacion
+        # Infracciones históricas de las cámaras de la zona (desde el resumen horario)
+        infracciones_zona = InfraccionResumenHora.objects.filter(
+            camara__ubicacion__icontains=ubicacion
+        ).aggregate(total=Sum('total'))['total'] or 0
+        # Las registradas sin cámara no tienen ubicación en el resumen: se cuentan por la suya
+        infracciones_zona += Infraccion.objects.filter(
+            camara__isnull=True, ubicacion__icontains=ubicacion
         ).count()
         
         # Calcular probabilidad basada en historial
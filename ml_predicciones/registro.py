@@ -0,0 +1,189 @@
+"""
+Registro de modelos ML del proceso
+Carga el modelo de reincidencia y su scaler una sola vez (perezosamente) y los
+comparte entre todos los PredictorRiesgo. Un hilo vigía recarga en segundo plano
+cuando cambia el ModeloEntrenamiento activo o el mtime de sus archivos, así las
+peticiones nunca leen pesos del disco.
+"""
+import os
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import joblib
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODELO_RESPALDO = BASE_DIR / 'notebooks' / 'modelo_reincidencia.pkl'
+SCALER_RESPALDO = BASE_DIR / 'notebooks' / 'scaler.pkl'
+VERIFICAR_CADA_SEG = float(os.getenv('ML_VERIFICAR_CADA_SEG', 30))
+
+FEATURE_NAMES = [
+    'total_infracciones',
+    'infracciones_graves',
+    'infracciones_leves',
+    'velocidad_promedio',
+    'tasa_infracciones_mes',
+    'hora_promedio'
+]
+
+
+class ModeloCargado:
+    """Instantánea inmutable de un modelo ya cargado en memoria"""
+
+    def __init__(self, modelo, scaler, origen, firma, tiempo_carga_ms, memoria_bytes,
+                 modelo_entrenamiento_id=None, version=None):
+        self.modelo = modelo
+        self.scaler = scaler
+        self.feature_names = FEATURE_NAMES
+        self.origen = origen
+        self.firma = firma
+        self.tiempo_carga_ms = tiempo_carga_ms
+        self.memoria_bytes = memoria_bytes
+        self.modelo_entrenamiento_id = modelo_entrenamiento_id
+        self.version = version
+        self.cargado_en = time.time()
+
+
+def _mtime(ruta):
+    try:
+        return os.stat(ruta).st_mtime
+    except OSError:
+        return None
+
+
+class RegistroModelos:
+    """Singleton thread-safe con recarga en caliente"""
+
+    def __init__(self, verificar_cada_seg=VERIFICAR_CADA_SEG):
+        self.verificar_cada_seg = verificar_cada_seg
+        self._actual = None
+        self._firma_vista = None
+        self._inicializado = False
+        self._lock = threading.Lock()
+        self._vigia = None
+        self.cargas = 0
+        self.errores = 0
+        self.verificaciones = 0
+
+    def _fuente(self):
+        """(origen, ruta_modelo, ruta_scaler, modelo_entrenamiento_id, version)"""
+        try:
+            from .models import ModeloEntrenamiento
+
+            activo = ModeloEntrenamiento.objects.filter(
+                activo=True, tipo_modelo='CLASIFICACION'
+            ).exclude(archivo_modelo='').exclude(archivo_pesos='').order_by('-fecha_entrenamiento').first()
+            if activo is not None and activo.archivo_modelo and activo.archivo_pesos:
+                return ('bd', activo.archivo_modelo.path, activo.archivo_pesos.path, activo.id, activo.version)
+        except Exception as e:
+            print(f"⚠️  No se pudo consultar el modelo activo: {e}")
+
+        return ('notebooks', str(MODELO_RESPALDO), str(SCALER_RESPALDO), None, None)
+
+    def _firma(self, fuente):
+        _, ruta_modelo, ruta_scaler, modelo_id, _ = fuente
+        return (modelo_id, ruta_modelo, _mtime(ruta_modelo), ruta_scaler, _mtime(ruta_scaler))
+
+    def _cargar(self, fuente, firma):
+        origen, ruta_modelo, ruta_scaler, modelo_id, version = fuente
+        if firma[2] is None or firma[4] is None:
+            print("⚠️  Modelo ML no encontrado. Ejecuta el notebook primero.")
+            return None
+
+        midiendo = not tracemalloc.is_tracing()
+        if midiendo:
+            tracemalloc.start()
+        antes = tracemalloc.get_traced_memory()[0]
+        inicio = time.perf_counter()
+        try:
+            modelo = joblib.load(ruta_modelo)
+            scaler = joblib.load(ruta_scaler)
+        finally:
+            memoria = tracemalloc.get_traced_memory()[0] - antes
+            if midiendo:
+                tracemalloc.stop()
+        tiempo_ms = (time.perf_counter() - inicio) * 1000
+
+        self.cargas += 1
+        print(f"✅ Modelo ML cargado ({origen}) en {tiempo_ms:.0f} ms, ~{memoria / 1e6:.1f} MB")
+        return ModeloCargado(modelo, scaler, origen, firma, tiempo_ms, memoria, modelo_id, version)
+
+    def obtener(self):
+        """Modelo actual (o None si no hay modelo); solo la primera llamada carga"""
+        if not self._inicializado:
+            with self._lock:
+                if not self._inicializado:
+                    self._recargar_si_cambio()
+                    self._inicializado = True
+                    self._iniciar_vigia()
+        return self._actual
+
+    def _recargar_si_cambio(self):
+        fuente = self._fuente()
+        firma = self._firma(fuente)
+        self.verificaciones += 1
+        if firma == self._firma_vista:
+            return False
+        self._firma_vista = firma
+
+        try:
+            nuevo = self._cargar(fuente, firma)
+        except Exception as e:
+            self.errores += 1
+            print(f"⚠️  Error al cargar modelo ML: {e}")
+            return False
+        if nuevo is None:
+            # Sin archivos: se conserva el modelo anterior si lo hay
+            return False
+
+        # Cambio atómico de referencia: los lectores ven el modelo viejo o el nuevo
+        self._actual = nuevo
+        return True
+
+    def recargar(self):
+        """Fuerza la verificación ahora (p. ej. tras activar un modelo nuevo)"""
+        with self._lock:
+            cambio = self._recargar_si_cambio()
+            if not self._inicializado:
+                self._inicializado = True
+                self._iniciar_vigia()
+            return cambio
+
+    def _iniciar_vigia(self):
+        if self._vigia is None and self.verificar_cada_seg > 0:
+            self._vigia = threading.Thread(target=self._vigilar, daemon=True, name='registro-modelos')
+            self._vigia.start()
+
+    def _vigilar(self):
+        from django.db import close_old_connections
+
+        while True:
+            time.sleep(self.verificar_cada_seg)
+            close_old_connections()
+            with self._lock:
+                self._recargar_si_cambio()
+
+    def metricas(self):
+        """Tiempo de carga, memoria aproximada y origen del modelo en uso"""
+        actual = self._actual
+        return {
+            'cargado': actual is not None,
+            'origen': actual.origen if actual else None,
+            'version': actual.version if actual else None,
+            'modelo_entrenamiento_id': actual.modelo_entrenamiento_id if actual else None,
+            'tiempo_carga_ms': round(actual.tiempo_carga_ms, 1) if actual else None,
+            'memoria_mb': round(actual.memoria_bytes / 1e6, 2) if actual else None,
+            'cargado_hace_seg': round(time.time() - actual.cargado_en, 1) if actual else None,
+            'cargas': self.cargas,
+            'errores': self.errores,
+            'verificaciones': self.verificaciones,
+        }
+
+
+registro = RegistroModelos()
+
+
+def obtener_modelo():
+    """Modelo de reincidencia compartido del proceso (None si no hay)"""
+    return registro.obtener()
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from django.test import TestCase
+
+from infracciones.models import Infraccion
+from infracciones.tests import FlagsMssqlMixin, crear_catalogo, registro
+from infracciones.servicios import crear_infracciones_lote
+from .predictor import PredictorRiesgo
+
+
+class ZonaRiesgoTests(FlagsMssqlMixin, TestCase):
+
+    def test_cuenta_las_infracciones_sin_camara(self):
+        camara, _ = crear_catalogo()
+        crear_infracciones_lote([
+            registro(f'ZON-{i:03d}', camara=camara, fecha_hora=datetime(2025, 1, 15, 8, i)) for i in range(6)
+        ] + [
+            # Registradas por la API sin camara_id: solo tienen su propia ubicación
+            registro(f'ZON-1{i:02d}', ubicacion='Av. Principal cdra. 3', fecha_hora=datetime(2025, 1, 15, 9, i))
+            for i in range(5)
+        ] + [registro('ZON-200', ubicacion='Jr. Lima')])
+        self.assertEqual(Infraccion.objects.filter(camara__isnull=True).count(), 6)
+
+        prediccion = PredictorRiesgo().predecir_zona_riesgo('principal', -12.0464, -77.0428)
+        self.assertEqual(prediccion.infracciones_historicas, 11)
+        self.assertEqual(float(prediccion.probabilidad), 50.0)
@@ -1,13 +1,16 @@
 from django.shortcuts import render
 from django.http import JsonResponse
+from .models import ModeloEntrenamiento
 from .predictor import PredictorRiesgo
+from .registro import registro
 from infracciones.models import Vehiculo, Infraccion
 from django.db.models import Count
 
+# Sin estado propio: el modelo lo comparte el registro del proceso
+predictor = PredictorRiesgo()
+
 def dashboard_ml(request):
     """Dashboard de predicciones ML"""
-    predictor = PredictorRiesgo()
-    
     # Obtener vehículos con más infracciones
     vehiculos_riesgo = Vehiculo.objects.annotate(
         num_infracciones=Count('infraccion')
@@ -22,7 +25,6 @@ def dashboard_ml(request):
 def predecir_vehiculo(request, placa):
     """Predice el riesgo de un vehículo"""
     try:
-        predictor = PredictorRiesgo()
         prediccion = predictor.predecir_riesgo_vehiculo(placa)
         
         return JsonResponse({
@@ -36,12 +38,26 @@ def predecir_vehiculo(request, placa):
         }, status=400)
 
 def estadisticas_ml(request):
-    """Estadísticas del modelo ML"""
+    """Estadísticas del modelo ML activo (registradas por manage.py entrenar_modelo)"""
+    modelo = ModeloEntrenamiento.objects.filter(
+        activo=True, tipo_modelo='CLASIFICACION'
+    ).order_by('-fecha_entrenamiento').first()
+    
+    def metrica(valor):
+        return float(valor) if valor is not None else None
+    
     context = {
-        'modelo_version': 'Random Forest v1.0',
-        'precision': 94.2,
-        'recall': 91.8,
-        'f1_score': 93.0
+        'modelo': modelo,
+        'modelo_version': f'{modelo.nombre} v{modelo.version}' if modelo else 'Sin modelo entrenado',
+        'accuracy': metrica(modelo.accuracy) if modelo else None,
+        'precision': metrica(modelo.precision) if modelo else None,
+        'recall': metrica(modelo.recall) if modelo else None,
+        'f1_score': metrica(modelo.f1_score) if modelo else None,
+        'auc_roc': metrica(modelo.auc_roc) if modelo else None,
+        'dataset_size': modelo.dataset_size if modelo else None,
+        'tiempo_entrenamiento_seg': modelo.tiempo_entrenamiento_seg if modelo else None,
+        'fecha_entrenamiento': modelo.fecha_entrenamiento if modelo else None,
+        'registro': registro.metricas(),
     }
     
     return render(request, 'ml_predicciones/estadisticas.html', context)
@@ -148,7 +148,7 @@ def main():
     print("\n📝 Próximos pasos:")
     print("   1. python manage.py migrate")
     print("   2. python manage.py createsuperuser")
-    print("   3. python scripts/entrenar_modelo_ml.py")
+    print("   3. python manage.py entrenar_modelo")
     print("   4. python vision_ai/detector_webcam.py")
     print()
 
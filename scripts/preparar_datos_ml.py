@@ -1,6 +1,7 @@
 """
 Script para preparar datos de entrenamiento ML
-Extrae features de las infracciones existentes
+Extrae features de las infracciones existentes desde el snapshot columnar
+(equivale a python manage.py snapshot_dataset)
 """
 import os
 import sys
@@ -16,62 +17,17 @@ sys.path.append(str(BASE_DIR))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seguridad.settings')
 django.setup()
 
-from infracciones.models import Infraccion, Vehiculo
+from ml_predicciones.dataset import generar_dataset
 
 def extraer_features():
-    """Extrae features de los vehículos para entrenamiento ML"""
+    """Actualiza el snapshot columnar y calcula las features de los vehículos"""
     print("Extrayendo features de vehículos...")
     
-    vehiculos = Vehiculo.objects.all()
-    datos = []
-    
-    for vehiculo in vehiculos:
-        infracciones = Infraccion.objects.filter(vehiculo=vehiculo)
-        
-        if infracciones.count() == 0:
-            continue
-        
-        # Calcular features
-        total = infracciones.count()
-        graves = infracciones.filter(tipo_infraccion__gravedad__in=['GRAVE', 'MUY_GRAVE']).count()
-        leves = total - graves
-        
-        # Velocidad promedio
-        velocidades = infracciones.filter(velocidad_detectada__isnull=False).values_list('velocidad_detectada', flat=True)
-        velocidad_prom = np.mean(list(velocidades)) if velocidades else 50.0
-        
-        # Tasa de infracciones por mes
-        fecha_primera = infracciones.order_by('fecha_hora').first().fecha_hora
-        fecha_ultima = infracciones.order_by('-fecha_hora').first().fecha_hora
-        dias_diferencia = (fecha_ultima - fecha_primera).days
-        tasa_mes = (total / max(dias_diferencia, 1)) * 30
-        
-        # Hora promedio
-        horas = [inf.fecha_hora.hour for inf in infracciones]
-        hora_prom = np.mean(horas) if horas else 12.0
-        
-        # Etiqueta: es reincidente si tiene más de 3 infracciones
-        es_reincidente = 1 if total > 3 else 0
-        
-        datos.append({
-            'placa': vehiculo.placa,
-            'total_infracciones': total,
-            'infracciones_graves': graves,
-            'infracciones_leves': leves,
-            'velocidad_promedio': velocidad_prom,
-            'tasa_infracciones_mes': tasa_mes,
-            'hora_promedio': hora_prom,
-            'es_reincidente': es_reincidente
-        })
-    
-    df = pd.DataFrame(datos)
-    
-    # Guardar dataset
-    output_path = BASE_DIR / 'notebooks' / 'dataset_infracciones.csv'
-    output_path.parent.mkdir(exist_ok=True)
-    df.to_csv(output_path, index=False)
+    df, registrado, escritas = generar_dataset()
     
-    print(f"✅ Dataset guardado: {output_path}")
+    print(f"📦 Particiones nuevas: {len(escritas)}")
+    if registrado is not None:
+        print(f"✅ Dataset registrado: {registrado.nombre} ({registrado.archivo_dataset.name})")
     print(f"   Total de registros: {len(df)}")
     print(f"   Reincidentes: {df['es_reincidente'].sum()}")
     print(f"   No reincidentes: {len(df) - df['es_reincidente'].sum()}")
@@ -146,7 +102,7 @@ def main():
         print("\n" + "=" * 60)
         print("✅ PREPARACIÓN COMPLETADA")
         print("=" * 60)
-        print("\nSiguiente paso: python scripts/entrenar_modelo_ml.py")
+        print("\nSiguiente paso: python manage.py entrenar_modelo")
         
     except Exception as e:
         print(f"\n❌ Error: {e}")
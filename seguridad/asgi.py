@@ -2,6 +2,13 @@
 ASGI config for seguridad project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django; the detection WebSocket (``/ws/deteccion/``) is
+served by a plain ASGI handler in ``dashboard/websocket.py``, which only
+accepts connections carrying an authenticated Django session.
+
+Production serves this module (not wsgi.py) so the WebSocket route exists:
+
+    gunicorn seguridad.asgi:application -k uvicorn.workers.UvicornWorker
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +20,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seguridad.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from dashboard.websocket import RUTA as RUTA_WS_DETECCION, deteccion_websocket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'].rstrip('/') == RUTA_WS_DETECCION.rstrip('/'):
+            await deteccion_websocket(scope, receive, send)
+        else:
+            await receive()
+            await send({'type': 'websocket.close'})
+        return
+    await django_application(scope, receive, send)
@@ -88,6 +88,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'seguridad.wsgi.application'
+ASGI_APPLICATION = 'seguridad.asgi.application'
 
 
 # Database
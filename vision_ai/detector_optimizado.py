@@ -3,16 +3,14 @@ Sistema de detección OPTIMIZADO para máximo rendimiento (FPS)
 Enfocado en 3 infracciones: Luz Roja, Exceso de Velocidad, Invasión de Carril
 Optimizaciones: Skip frames, resolución reducida, OCR threading, GPU acceleration
 """
+import importlib.util
 import os
 import sys
 import django
 import cv2
-import numpy as np
 from datetime import datetime
 from pathlib import Path
 import re
-import threading
-from queue import Queue
 from collections import deque
 
 # Configurar Django
@@ -21,16 +19,20 @@ sys.path.append(str(BASE_DIR))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seguridad.settings')
 django.setup()
 
-from ultralytics import YOLO
-from infracciones.models import Infraccion, Vehiculo, TipoInfraccion, EventoDeteccion
+from vision_ai.motor_inferencia import obtener_motor
+from vision_ai.pipeline import PipelineDeteccion
+from vision_ai.evidencias import obtener_almacen
+from vision_ai.persistencia import obtener_escritor
+from vision_ai.reglas import MotorReglas, reglas_por_defecto
+from vision_ai.semaforo import EstadoSemaforos, cajas_semaforo
+from vision_ai.tracks import TablaTracks
+from vision_ai.velocidad import Velocimetro, homografia_camara, puntos_contacto
+from vision_ai.ocr import obtener_servicio_ocr
+from vision_ai.placas import localizar_placa, OPCIONES_OCR_PLACA
 from camaras.models import Camara
-from ml_predicciones.predictor import PredictorRiesgo
 
-try:
-    import easyocr
-    OCR_DISPONIBLE = True
-except ImportError:
-    OCR_DISPONIBLE = False
+OCR_DISPONIBLE = importlib.util.find_spec('easyocr') is not None
+if not OCR_DISPONIBLE:
     print("⚠️  EasyOCR no disponible, detección de placas deshabilitada")
 
 
@@ -46,8 +48,8 @@ class DetectorOptimizado:
         self.CONFIANZA_MIN = 0.5  # Umbral de confianza
         self.OCR_CADA_N_FRAMES = 60  # Ejecutar OCR cada 60 frames (2 segundos a 30fps)
         
-        self.modelo_yolo = YOLO('yolov8n.pt')  # Modelo nano (más rápido)
-        self.modelo_yolo.fuse()  # Fusionar capas para mayor velocidad
+        # Modelo nano compartido por todos los detectores del proceso
+        self.motor = obtener_motor()
         
         # Configurar para GPU si está disponible
         if usar_gpu and cv2.cuda.getCudaEnabledDeviceCount() > 0:
@@ -57,22 +59,20 @@ class DetectorOptimizado:
             print("⚠️  GPU no disponible, usando CPU")
             self.usar_gpu = False
         
-        print("✅ Modelo YOLO nano cargado y optimizado")
+        print("✅ Motor YOLO nano compartido listo")
         
-        self.ocr_queue = Queue(maxsize=5)
-        self.ocr_results = {}
+        self.ocr = None
         self.ocr_activo = False
         
         if OCR_DISPONIBLE:
-            self.reader = easyocr.Reader(['en'], gpu=self.usar_gpu)
-            self.ocr_thread = threading.Thread(target=self._ocr_worker, daemon=True)
-            self.ocr_thread.start()
+            self.ocr = obtener_servicio_ocr(gpu=self.usar_gpu)
             self.ocr_activo = True
-            print("✅ OCR inicializado en thread separado")
+            print("✅ OCR inicializado en el pool de workers compartido")
         
-        # Inicializar predictor ML
-        self.predictor_ml = PredictorRiesgo()
-        print("✅ Predictor ML inicializado")
+        # Escritor en lote compartido (las escrituras no bloquean el bucle)
+        self.escritor = obtener_escritor()
+        self.evidencias = obtener_almacen()
+        self.semaforos = EstadoSemaforos()  # Estado suavizado de los semáforos del canal
         
         self.cap = cv2.VideoCapture(camara_id)
         if not self.cap.isOpened():
@@ -95,75 +95,30 @@ class DetectorOptimizado:
                 'activa': True
             }
         )
+        self.canal = self.motor.registrar_canal(self.camara_db.id)
+        self.tracks = TablaTracks()  # Posiciones, placa y cooldowns por track, con desalojo por TTL
+        self.velocimetro = Velocimetro(homografia_camara(self.camara_db), self.tracks)
+        self.velocidades = {}
+        # Reglas de la cámara (BD); sin reglas, carril central ± 50 px (el MARGEN_CARRIL anterior)
+        self.reglas = MotorReglas(self.camara_db, self.tracks, reglas_defecto=reglas_por_defecto(margen_carril_px=50))
         
         self.fps = 30
         self.frame_count = 0
         self.fps_real = deque(maxlen=30)  # Calcular FPS real
         self.ultimo_tiempo = cv2.getTickCount()
-        
-        # Tracking de vehículos
-        self.vehiculos_trackeados = {}
-        self.placas_detectadas = {}
-        
-        self.LIMITE_VELOCIDAD = 60  # km/h
-        self.DISTANCIA_METROS = 20
-        self.MARGEN_CARRIL = 50  # píxeles
-        
-        # Cooldown para evitar detecciones duplicadas
-        self.cooldown_infracciones = {}  # {vehiculo_id: {tipo: timestamp}}
-        self.COOLDOWN_SEGUNDOS = 5
-        
-        # Crear carpetas
-        self.carpeta_evidencias = BASE_DIR / 'media' / 'infracciones' / 'imagenes'
-        self.carpeta_placas = BASE_DIR / 'media' / 'infracciones' / 'placas'
-        self.carpeta_evidencias.mkdir(parents=True, exist_ok=True)
-        self.carpeta_placas.mkdir(parents=True, exist_ok=True)
+        self.pipeline = None
         
         print("✅ Sistema OPTIMIZADO listo\n")
         print(f"⚡ Configuración: Skip {self.SKIP_FRAMES} frames, "
               f"Resolución {self.RESOLUCION_PROCESAMIENTO}, "
               f"OCR cada {self.OCR_CADA_N_FRAMES} frames")
     
-    def _ocr_worker(self):
-        """Worker thread para procesar OCR en paralelo"""
-        while True:
-            try:
-                vehiculo_id, roi = self.ocr_queue.get()
-                if roi is None:
-                    break
-                
-                placa, confianza = self._detectar_placa_ocr(roi)
-                if placa:
-                    self.ocr_results[vehiculo_id] = (placa, confianza)
-                
-                self.ocr_queue.task_done()
-            except Exception as e:
-                print(f"⚠️  Error en OCR worker: {e}")
-    
-    def _detectar_placa_ocr(self, roi):
-        """Detecta placa usando OCR (ejecutado en thread separado)"""
-        try:
-            if roi.size == 0:
-                return None, 0
-            
-            # Preprocesar
-            gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            gray = cv2.bilateralFilter(gray, 11, 17, 17)
-            thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                          cv2.THRESH_BINARY, 11, 2)
-            
-            # OCR
-            resultados = self.reader.readtext(thresh, detail=1)
-            
-            for (bbox, texto, confianza) in resultados:
-                if confianza > 0.5:
-                    placa_limpia = self._limpiar_placa(texto)
-                    if placa_limpia:
-                        return placa_limpia, confianza
-            
-            return None, 0
-        except Exception as e:
-            return None, 0
+    def _preparar_roi_placa(self, placa):
+        """Preprocesa el recorte de la placa ya localizada (ejecutado en el worker OCR)"""
+        gray = cv2.cvtColor(placa, cv2.COLOR_BGR2GRAY)
+        gray = cv2.bilateralFilter(gray, 11, 17, 17)
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                                     cv2.THRESH_BINARY, 11, 2)
     
     def _limpiar_placa(self, texto):
         """Limpia y valida texto de placa"""
@@ -172,159 +127,86 @@ class DetectorOptimizado:
             return texto
         return None
     
-    def _puede_registrar_infraccion(self, vehiculo_id, tipo_infraccion):
-        """Verifica si puede registrar infracción (cooldown)"""
-        ahora = datetime.now()
-        
-        if vehiculo_id not in self.cooldown_infracciones:
-            self.cooldown_infracciones[vehiculo_id] = {}
-        
-        if tipo_infraccion in self.cooldown_infracciones[vehiculo_id]:
-            ultimo = self.cooldown_infracciones[vehiculo_id][tipo_infraccion]
-            if (ahora - ultimo).total_seconds() < self.COOLDOWN_SEGUNDOS:
-                return False
-        
-        self.cooldown_infracciones[vehiculo_id][tipo_infraccion] = ahora
-        return True
-    
     def detectar_luz_roja(self, frame, resultados):
-        """Detecta semáforo en rojo (OPTIMIZADO)"""
-        for box in resultados[0].boxes:
-            cls = self.modelo_yolo.names[int(box.cls)]
-            
-            if cls == 'traffic light':
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                semaforo = frame[y1:y2, x1:x2]
-                
-                if semaforo.size == 0:
-                    continue
-                
-                hsv = cv2.cvtColor(semaforo, cv2.COLOR_BGR2HSV)
-                
-                # Máscaras para rojo
-                mask1 = cv2.inRange(hsv, np.array([0, 100, 100]), np.array([10, 255, 255]))
-                mask2 = cv2.inRange(hsv, np.array([160, 100, 100]), np.array([180, 255, 255]))
-                mascara_roja = cv2.bitwise_or(mask1, mask2)
-                
-                if cv2.countNonZero(mascara_roja) > 50:
-                    return True, (x1, y1, x2, y2)
-        
-        return False, None
+        """Detecta semáforo en rojo (clasificación por lote con histéresis entre frames)"""
+        self.semaforos.actualizar(frame, cajas_semaforo(resultados, self.motor.names))
+        return self.semaforos.luz_roja()
     
-    def detectar_exceso_velocidad(self, vehiculo_id, posicion_actual):
-        """Detecta exceso de velocidad (OPTIMIZADO)"""
-        if vehiculo_id in self.vehiculos_trackeados:
-            datos_anteriores = self.vehiculos_trackeados[vehiculo_id]
-            frame_diff = self.frame_count - datos_anteriores['frame']
-            
-            # Calcular distancia euclidiana
-            pos_anterior = datos_anteriores['posicion']
-            distancia_pixeles = np.linalg.norm(
-                np.array(posicion_actual) - np.array(pos_anterior)
-            )
-            
-            # Convertir a velocidad (aproximación)
-            tiempo_segundos = frame_diff / self.fps
-            if tiempo_segundos > 0 and distancia_pixeles > 10:
-                # Factor de conversión píxeles a metros (ajustar según calibración)
-                factor_conversion = 0.05
-                distancia_metros = distancia_pixeles * factor_conversion
-                velocidad = (distancia_metros / tiempo_segundos) * 3.6
-                
-                if self.LIMITE_VELOCIDAD < velocidad < 200:
-                    return True, velocidad
-        
-        return False, 0
+    def actualizar_velocidades(self, resultados, escala=(1.0, 1.0)):
+        """Velocidad de todos los tracks del frame en una sola pasada (homografía + mínimos cuadrados)"""
+        ids, puntos = puntos_contacto(resultados, self.motor.names, escala)
+        self.velocidades = self.velocimetro.actualizar(ids, puntos, self.frame_count / self.fps, self.frame_count)
+        return ids, puntos
     
-    def detectar_invasion_carril(self, frame, x1, y1, x2, y2):
-        """Detecta invasión de carril (OPTIMIZADO)"""
-        h, w = frame.shape[:2]
-        centro_x = (x1 + x2) // 2
-        
-        # Línea central del frame
-        linea_central = w // 2
-        
-        # Si el vehículo está muy cerca de la línea central
-        if abs(centro_x - linea_central) < self.MARGEN_CARRIL:
-            return True
-        
-        return False
+    def evaluar_infracciones(self, ids, puntos, luz_roja, forma):
+        """Reglas de la cámara sobre todos los tracks del frame, ya filtradas por cooldown"""
+        return self.reglas.evaluar(
+            ids, puntos, self.velocidades, luz_roja, self.frame_count / self.fps, forma,
+            tiempo_luz_roja=self.semaforos.tiempo_en_rojo() if luz_roja else None
+        )
     
-    def registrar_infraccion(self, tipo_codigo, frame, vehiculo_placa="DESCONOCIDA", 
-                            velocidad=None, confianza=0.85):
-        """Registra infracción en BD (OPTIMIZADO - async)"""
+    def registrar_infraccion(self, tipo_codigo, frame, vehiculo_placa="DESCONOCIDA", velocidad=None,
+                            velocidad_maxima=None, confianza=0.85, tiempo_luz_roja=None):
+        """Encola la infracción en el escritor en lote (OPTIMIZADO - async)"""
         try:
-            vehiculo, _ = Vehiculo.objects.get_or_create(
-                placa=vehiculo_placa,
-                defaults={'tipo_vehiculo': 'AUTO'}
-            )
-            
-            tipo_infraccion = TipoInfraccion.objects.filter(codigo=tipo_codigo).first()
-            if not tipo_infraccion:
-                return None
-            
-            # Guardar imagen
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            nombre_archivo = f"{tipo_codigo}_{vehiculo_placa}_{timestamp}.jpg"
-            ruta_imagen = self.carpeta_evidencias / nombre_archivo
+            # Encolar infracción
+            encolada = self.escritor.encolar({
+                'placa': vehiculo_placa,
+                'tipo_codigo': tipo_codigo,
+                'camara': self.camara_db,
+                'ubicacion': self.camara_db.ubicacion,
+                'fecha_hora': datetime.now(),
+                'velocidad_detectada': int(velocidad) if velocidad else None,
+                'velocidad_maxima': velocidad_maxima,
+                'tiempo_luz_roja': tiempo_luz_roja,
+                'evidencia': self.evidencias.guardar(frame),
+                'confianza_deteccion': confianza * 100,
+                'modelo_ia_version': 'YOLOv8n-Optimizado',
+                'estado': 'DETECTADA'
+            })
             
-            threading.Thread(
-                target=cv2.imwrite, 
-                args=(str(ruta_imagen), frame),
-                daemon=True
-            ).start()
-            
-            # Crear infracción
-            infraccion = Infraccion.objects.create(
-                vehiculo=vehiculo,
-                tipo_infraccion=tipo_infraccion,
-                camara=self.camara_db,
-                ubicacion=self.camara_db.ubicacion,
-                velocidad_detectada=int(velocidad) if velocidad else None,
-                velocidad_maxima=self.LIMITE_VELOCIDAD if velocidad else None,
-                imagen_principal=f'infracciones/imagenes/{nombre_archivo}',
-                confianza_deteccion=confianza * 100,
-                modelo_ia_version='YOLOv8n-Optimizado',
-                estado='DETECTADA'
-            )
-            
-            print(f"✅ {tipo_infraccion.nombre} - {vehiculo_placa}")
-            return infraccion
+            if encolada:
+                print(f"✅ {tipo_codigo} - {vehiculo_placa}")
+            return encolada
             
         except Exception as e:
             print(f"❌ Error: {e}")
-            return None
+            return False
     
-    def procesar_frame(self, frame):
-        """Procesa frame (OPTIMIZADO)"""
-        self.frame_count += 1
-        
-        if self.frame_count % (self.SKIP_FRAMES + 1) != 0:
-            return frame
-        
+    def inferir(self, frame):
+        """Etapa de inferencia: YOLO sobre el frame reducido"""
         frame_small = cv2.resize(frame, self.RESOLUCION_PROCESAMIENTO)
-        
-        # Ejecutar YOLO
-        resultados = self.modelo_yolo.track(
-            frame_small, 
-            persist=True, 
-            verbose=False,
-            conf=self.CONFIANZA_MIN,
-            iou=0.5
+        return self.motor.inferir(
+            self.canal,
+            frame_small,
+            conf=self.CONFIANZA_MIN
         )
+    
+    def evaluar_reglas(self, frame, resultados):
+        """Etapa de reglas: tracking, OCR y evaluación de infracciones"""
+        evaluacion = {'vehiculos': [], 'infracciones': [], 'semaforo': None}
         
         if not resultados or len(resultados[0].boxes) == 0:
-            return frame
-        
-        # Detectar luz roja
-        luz_roja, coords_semaforo = self.detectar_luz_roja(frame_small, resultados)
+            return evaluacion
         
         scale_x = frame.shape[1] / self.RESOLUCION_PROCESAMIENTO[0]
         scale_y = frame.shape[0] / self.RESOLUCION_PROCESAMIENTO[1]
         
+        # Detectar luz roja (coordenadas del frame reducido)
+        frame_small = resultados[0].orig_img
+        luz_roja, coords_semaforo = self.detectar_luz_roja(frame_small, resultados)
+        if luz_roja and coords_semaforo:
+            x1, y1, x2, y2 = coords_semaforo
+            evaluacion['semaforo'] = (int(x1 * scale_x), int(y1 * scale_y),
+                                      int(x2 * scale_x), int(y2 * scale_y))
+        
+        # Velocidades y reglas de todos los tracks (coordenadas del frame original)
+        ids, puntos = self.actualizar_velocidades(resultados, escala=(scale_x, scale_y))
+        disparos = self.evaluar_infracciones(ids, puntos, luz_roja, frame.shape)
+        
         # Procesar vehículos
         for box in resultados[0].boxes:
-            cls = self.modelo_yolo.names[int(box.cls)]
+            cls = self.motor.names[int(box.cls)]
             conf = float(box.conf[0])
             
             if cls not in ['car', 'truck', 'bus', 'motorcycle']:
@@ -338,65 +220,78 @@ class DetectorOptimizado:
             vehiculo_id = int(box.id[0]) if box.id is not None else None
             
             if vehiculo_id:
-                centro = ((x1 + x2) // 2, (y1 + y2) // 2)
-                
-                if (self.ocr_activo and 
-                    self.frame_count % self.OCR_CADA_N_FRAMES == 0 and
-                    vehiculo_id not in self.placas_detectadas and
-                    not self.ocr_queue.full()):
+                if self.ocr_activo:
+                    clave_ocr = (self.canal, vehiculo_id)
+                    if self.frame_count % self.OCR_CADA_N_FRAMES == 0:
+                        self.ocr.solicitar(
+                            clave_ocr, frame[y1:y2, x1:x2],
+                            localizar=localizar_placa,
+                            preparar=self._preparar_roi_placa,
+                            validar=self._limpiar_placa,
+                            confianza_min=0.5,
+                            detail=1,
+                            **OPCIONES_OCR_PLACA
+                        )
                     
-                    roi = frame[y1:y2, x1:x2].copy()
-                    self.ocr_queue.put((vehiculo_id, roi))
-                
-                # Obtener placa
-                if vehiculo_id in self.ocr_results:
-                    placa, _ = self.ocr_results[vehiculo_id]
-                    self.placas_detectadas[vehiculo_id] = placa
-                
-                placa_vehiculo = self.placas_detectadas.get(vehiculo_id, f"VEH-{vehiculo_id:04d}")
+                    # Obtener placa (solo cuando el consenso convergió)
+                    placa, _, _ = self.ocr.resultado(clave_ocr)
+                    if placa:
+                        self.tracks.asignar_placa(vehiculo_id, placa)
                 
-                # Detectar exceso de velocidad
-                exceso, velocidad = self.detectar_exceso_velocidad(vehiculo_id, centro)
+                placa_vehiculo = self.tracks.placa(vehiculo_id, f"VEH-{vehiculo_id:04d}")
+                vehiculo = {
+                    'caja': (x1, y1, x2, y2),
+                    'placa': placa_vehiculo,
+                    'texto': f"{cls} {conf:.2f}",
+                    'color': (0, 255, 0),
+                    'alerta': False,
+                    'luz_roja': False
+                }
                 
-                if exceso and self._puede_registrar_infraccion(vehiculo_id, 'EXCESO_VEL'):
-                    self.registrar_infraccion('EXCESO_VEL', frame, placa_vehiculo, 
-                                            velocidad=velocidad, confianza=conf)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                    cv2.putText(frame, f"EXCESO: {velocidad:.0f} km/h", 
-                              (x1, y1-30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                    cv2.putText(frame, placa_vehiculo, 
-                              (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                else:
-                    # Actualizar tracking
-                    self.vehiculos_trackeados[vehiculo_id] = {
-                        'frame': self.frame_count,
-                        'posicion': centro,
-                        'placa': placa_vehiculo
-                    }
-                    
-                    # Detectar invasión de carril
-                    invasion = self.detectar_invasion_carril(frame, x1, y1, x2, y2)
-                    
-                    if invasion and self._puede_registrar_infraccion(vehiculo_id, 'INVASION_CARRIL'):
-                        self.registrar_infraccion('INVASION_CARRIL', frame, placa_vehiculo, 
-                                                confianza=conf)
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 165, 255), 3)
-                        cv2.putText(frame, "INVASION CARRIL", 
-                                  (x1, y1-30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 2)
-                        cv2.putText(frame, placa_vehiculo, 
-                                  (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
+                # Infracciones que dispararon las reglas para este track
+                for disparo in disparos.get(vehiculo_id, ()):
+                    evaluacion['infracciones'].append(dict(disparo, vehiculo_placa=placa_vehiculo, confianza=conf))
+                    if disparo['tipo_codigo'] == 'EXCESO_VEL':
+                        vehiculo.update(texto=f"EXCESO: {disparo['velocidad']:.0f} km/h", color=(0, 0, 255), alerta=True)
+                    elif disparo['tipo_codigo'] == 'INVASION_CARRIL':
+                        if not vehiculo['alerta']:
+                            vehiculo.update(texto="INVASION CARRIL", color=(0, 165, 255), alerta=True)
                     else:
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(frame, f"{cls} {conf:.2f}", 
-                                  (x1, y1-30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                        cv2.putText(frame, placa_vehiculo, 
-                                  (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                        vehiculo['luz_roja'] = True
                 
-                # Luz roja
-                if luz_roja and self._puede_registrar_infraccion(vehiculo_id, 'LUZ_ROJA'):
-                    self.registrar_infraccion('LUZ_ROJA', frame, placa_vehiculo, confianza=conf)
-                    cv2.putText(frame, "LUZ ROJA!", 
-                              (x1, y2+20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                evaluacion['vehiculos'].append(vehiculo)
+        
+        return evaluacion
+    
+    def persistir(self, frame, evaluacion):
+        """Etapa de persistencia: registra las infracciones evaluadas"""
+        for infraccion in evaluacion['infracciones']:
+            self.registrar_infraccion(frame=frame, **infraccion)
+    
+    def renderizar(self, frame, evaluacion):
+        """Etapa de render: dibuja detecciones e información del sistema"""
+        frame = frame.copy()
+        
+        for vehiculo in evaluacion['vehiculos']:
+            x1, y1, x2, y2 = vehiculo['caja']
+            color = vehiculo['color']
+            
+            if vehiculo['alerta']:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
+                cv2.putText(frame, vehiculo['texto'], 
+                          (x1, y1-30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                cv2.putText(frame, vehiculo['placa'], 
+                          (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            else:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                cv2.putText(frame, vehiculo['texto'], 
+                          (x1, y1-30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                cv2.putText(frame, vehiculo['placa'], 
+                          (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+            
+            if vehiculo['luz_roja']:
+                cv2.putText(frame, "LUZ ROJA!", 
+                          (x1, y2+20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         
         tiempo_actual = cv2.getTickCount()
         tiempo_transcurrido = (tiempo_actual - self.ultimo_tiempo) / cv2.getTickFrequency()
@@ -412,37 +307,46 @@ class DetectorOptimizado:
         
         cv2.putText(frame, f"FPS: {fps_promedio:.1f} | Frame: {self.frame_count}", 
                    (15, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        cv2.putText(frame, f"Vehiculos: {len(self.vehiculos_trackeados)}", 
+        cv2.putText(frame, f"Vehiculos: {self.tracks.activos()}", 
                    (15, 55), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        cv2.putText(frame, f"Placas: {len(self.placas_detectadas)}", 
+        cv2.putText(frame, f"Placas: {self.tracks.con_placa()}", 
                    (15, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
         cv2.putText(frame, f"Modelo: YOLOv8n-Optimizado", 
                    (15, 105), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
         
-        if luz_roja and coords_semaforo:
-            x1, y1, x2, y2 = coords_semaforo
-            x1, x2 = int(x1 * scale_x), int(x2 * scale_x)
-            y1, y2 = int(y1 * scale_y), int(y2 * scale_y)
+        if evaluacion['semaforo']:
+            x1, y1, x2, y2 = evaluacion['semaforo']
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
             cv2.putText(frame, "SEMAFORO ROJO", (x1, y1-10), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
         
         return frame
     
+    def procesar_frame(self, frame):
+        """Procesa frame de forma síncrona (todas las etapas en serie)"""
+        self.frame_count += 1
+        
+        if self.frame_count % (self.SKIP_FRAMES + 1) != 0:
+            return frame
+        
+        resultados = self.inferir(frame)
+        evaluacion = self.evaluar_reglas(frame, resultados)
+        self.persistir(frame, evaluacion)
+        return self.renderizar(frame, evaluacion)
+    
     def iniciar_deteccion(self):
-        """Inicia detección en tiempo real"""
+        """Inicia el pipeline de detección en tiempo real"""
         print("\n🎥 Iniciando detección OPTIMIZADA...")
         print("Presiona 'q' para salir\n")
         
+        self.pipeline = PipelineDeteccion(self)
+        self.pipeline.iniciar()
+        
         try:
-            while True:
-                ret, frame = self.cap.read()
-                
-                if not ret:
-                    print("❌ Error al capturar frame")
-                    break
-                
-                frame_procesado = self.procesar_frame(frame)
+            while self.pipeline.activo:
+                frame_procesado = self.pipeline.obtener_salida(timeout=1.0)
+                if frame_procesado is None:
+                    continue
                 
                 cv2.imshow('Sistema OPTIMIZADO - Tesis (Luz Roja | Velocidad | Carril)', 
                           frame_procesado)
@@ -459,9 +363,14 @@ class DetectorOptimizado:
         """Libera recursos"""
         print("\n🛑 Deteniendo sistema...")
         
+        if self.pipeline is not None:
+            self.pipeline.detener()
+        
         if self.ocr_activo:
-            self.ocr_queue.put((None, None))
+            self.ocr.olvidar_canal(self.canal)
         
+        self.escritor.vaciar()
+        self.motor.liberar_canal(self.canal)
         self.cap.release()
         cv2.destroyAllWindows()
         print("✅ Sistema detenido")
@@ -6,7 +6,6 @@ import os
 import sys
 import django
 import cv2
-import numpy as np
 from datetime import datetime
 from pathlib import Path
 
@@ -16,10 +15,15 @@ sys.path.append(str(BASE_DIR))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seguridad.settings')
 django.setup()
 
-from ultralytics import YOLO
-from infracciones.models import Infraccion, Vehiculo, TipoInfraccion, EventoDeteccion
+from vision_ai.motor_inferencia import obtener_motor
+from vision_ai.pipeline import PipelineDeteccion
+from vision_ai.evidencias import obtener_almacen
+from vision_ai.persistencia import obtener_escritor
+from vision_ai.reglas import MotorReglas, reglas_por_defecto
+from vision_ai.semaforo import EstadoSemaforos, cajas_semaforo
+from vision_ai.tracks import TablaTracks
+from vision_ai.velocidad import Velocimetro, homografia_camara, puntos_contacto
 from camaras.models import Camara
-from ml_predicciones.predictor import PredictorRiesgo
 
 class DetectorWebcam:
     """Detector de infracciones en tiempo real usando webcam"""
@@ -27,13 +31,15 @@ class DetectorWebcam:
     def __init__(self, camara_id=0):
         print("🚀 Inicializando sistema de detección...")
         
-        # Cargar modelo YOLO
-        self.modelo_yolo = YOLO('yolov8n.pt')
+        # Motor YOLO compartido
+        self.motor = obtener_motor()
         print("✅ Modelo YOLO cargado")
         
-        # Inicializar predictor ML
-        self.predictor_ml = PredictorRiesgo()
-        print("✅ Predictor ML inicializado")
+        # Escritor en lote compartido (BD + predicción ML en segundo plano)
+        self.escritor = obtener_escritor()
+        self.evidencias = obtener_almacen()
+        self.semaforos = EstadoSemaforos()  # Estado suavizado de los semáforos del canal
+        print("✅ Escritor de infracciones listo")
         
         # Configurar cámara
         self.cap = cv2.VideoCapture(camara_id)
@@ -48,149 +54,95 @@ class DetectorWebcam:
         )
         if created:
             print("✅ Cámara registrada en base de datos")
+        self.canal = self.motor.registrar_canal(self.camara_db.id)
+        self.tracks = TablaTracks()  # Posiciones por track, con desalojo por TTL
+        self.velocimetro = Velocimetro(homografia_camara(self.camara_db), self.tracks)
+        self.velocidades = {}
+        # Reglas de la cámara (BD); sin reglas, sin invasión de carril (este detector no la evaluaba)
+        self.reglas = MotorReglas(self.camara_db, self.tracks, reglas_defecto=reglas_por_defecto(margen_carril=None))
         
         # Configuración de detección
         self.fps = int(self.cap.get(cv2.CAP_PROP_FPS)) or 30
         self.frame_count = 0
-        self.detecciones_vehiculos = {}
-        
-        # Límites de velocidad
-        self.LIMITE_VELOCIDAD = 60  # km/h
-        self.DISTANCIA_METROS = 20
-        
-        # Crear carpetas para evidencias
-        self.carpeta_evidencias = BASE_DIR / 'media' / 'infracciones' / 'imagenes'
-        self.carpeta_evidencias.mkdir(parents=True, exist_ok=True)
+        self.pipeline = None
         
         print("✅ Sistema listo para detectar infracciones\n")
     
     def detectar_luz_roja(self, frame, resultados):
-        """Detecta si un vehículo cruza con luz roja"""
-        for box in resultados[0].boxes:
-            cls = self.modelo_yolo.names[int(box.cls)]
-            
-            if cls == 'traffic light':
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                semaforo = frame[y1:y2, x1:x2]
-                
-                if semaforo.size == 0:
-                    continue
-                
-                # Detectar color rojo en HSV
-                hsv = cv2.cvtColor(semaforo, cv2.COLOR_BGR2HSV)
-                
-                # Rango para rojo (dos rangos porque el rojo está en los extremos)
-                rojo_bajo1 = np.array([0, 100, 100])
-                rojo_alto1 = np.array([10, 255, 255])
-                rojo_bajo2 = np.array([160, 100, 100])
-                rojo_alto2 = np.array([180, 255, 255])
-                
-                mascara1 = cv2.inRange(hsv, rojo_bajo1, rojo_alto1)
-                mascara2 = cv2.inRange(hsv, rojo_bajo2, rojo_alto2)
-                mascara_roja = cv2.bitwise_or(mascara1, mascara2)
-                
-                pixeles_rojos = cv2.countNonZero(mascara_roja)
-                
-                if pixeles_rojos > 50:
-                    return True, (x1, y1, x2, y2)
-        
-        return False, None
+        """Detecta semáforo en rojo (clasificación por lote con histéresis entre frames)"""
+        self.semaforos.actualizar(frame, cajas_semaforo(resultados, self.motor.names))
+        return self.semaforos.luz_roja()
     
-    def detectar_exceso_velocidad(self, vehiculo_id, frame_actual):
-        """Detecta exceso de velocidad basado en tracking"""
-        if vehiculo_id in self.detecciones_vehiculos:
-            frame_anterior = self.detecciones_vehiculos[vehiculo_id]
-            frame_diff = frame_actual - frame_anterior
-            
-            tiempo_segundos = frame_diff / self.fps
-            
-            if tiempo_segundos > 0:
-                velocidad = (self.DISTANCIA_METROS / tiempo_segundos) * 3.6
-                
-                if velocidad > self.LIMITE_VELOCIDAD and velocidad < 200:  # Filtrar valores irreales
-                    return True, velocidad
-        
-        return False, 0
+    def actualizar_velocidades(self, resultados, escala=(1.0, 1.0)):
+        """Velocidad de todos los tracks del frame en una sola pasada (homografía + mínimos cuadrados)"""
+        ids, puntos = puntos_contacto(resultados, self.motor.names, escala)
+        self.velocidades = self.velocimetro.actualizar(ids, puntos, self.frame_count / self.fps, self.frame_count)
+        return ids, puntos
     
-    def registrar_infraccion(self, tipo_codigo, frame, vehiculo_placa="DESCONOCIDA", 
-                            velocidad=None, confianza=0.85):
-        """Registra una infracción en la base de datos"""
+    def evaluar_infracciones(self, ids, puntos, luz_roja, forma):
+        """Reglas de la cámara sobre todos los tracks del frame, ya filtradas por cooldown"""
+        return self.reglas.evaluar(
+            ids, puntos, self.velocidades, luz_roja, self.frame_count / self.fps, forma,
+            tiempo_luz_roja=self.semaforos.tiempo_en_rojo() if luz_roja else None
+        )
+    
+    def registrar_infraccion(self, tipo_codigo, frame, vehiculo_placa="DESCONOCIDA", velocidad=None,
+                            velocidad_maxima=None, confianza=0.85, tiempo_luz_roja=None):
+        """Guarda la evidencia y encola la infracción para escritura en lote"""
         try:
-            # Obtener o crear vehículo
-            vehiculo, _ = Vehiculo.objects.get_or_create(
-                placa=vehiculo_placa,
-                defaults={'tipo_vehiculo': 'AUTO'}
-            )
-            
-            # Obtener tipo de infracción
-            tipo_infraccion = TipoInfraccion.objects.filter(codigo=tipo_codigo).first()
-            if not tipo_infraccion:
-                print(f"⚠️  Tipo de infracción {tipo_codigo} no encontrado")
-                return None
-            
-            # Guardar imagen de evidencia
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            nombre_archivo = f"{tipo_codigo}_{vehiculo_placa}_{timestamp}.jpg"
-            ruta_imagen = self.carpeta_evidencias / nombre_archivo
-            cv2.imwrite(str(ruta_imagen), frame)
-            
-            # Crear infracción
-            infraccion = Infraccion.objects.create(
-                vehiculo=vehiculo,
-                tipo_infraccion=tipo_infraccion,
-                camara=self.camara_db,
-                ubicacion=self.camara_db.ubicacion,
-                velocidad_detectada=int(velocidad) if velocidad else None,
-                velocidad_maxima=self.LIMITE_VELOCIDAD if velocidad else None,
-                imagen_principal=f'infracciones/imagenes/{nombre_archivo}',
-                confianza_deteccion=confianza * 100,
-                modelo_ia_version='YOLOv8n',
-                estado='DETECTADA'
-            )
-            
-            # Registrar evento
-            EventoDeteccion.objects.create(
-                camara=self.camara_db,
-                tipo_evento='INFRACCION_DETECTADA',
-                datos_evento={
+            # Encolar infracción + evento; el riesgo ML se actualiza tras escribir
+            encolada = self.escritor.encolar({
+                'placa': vehiculo_placa,
+                'tipo_codigo': tipo_codigo,
+                'camara': self.camara_db,
+                'ubicacion': self.camara_db.ubicacion,
+                'fecha_hora': datetime.now(),
+                'velocidad_detectada': int(velocidad) if velocidad else None,
+                'velocidad_maxima': velocidad_maxima,
+                'tiempo_luz_roja': tiempo_luz_roja,
+                'evidencia': self.evidencias.guardar(frame),
+                'confianza_deteccion': confianza * 100,
+                'modelo_ia_version': 'YOLOv8n',
+                'estado': 'DETECTADA',
+                'evento': {
                     'tipo': tipo_codigo,
                     'placa': vehiculo_placa,
                     'velocidad': velocidad,
                     'confianza': confianza
                 }
-            )
+            }, actualizar_riesgo=True)
             
-            # Actualizar predicción de riesgo con ML
-            try:
-                prediccion = self.predictor_ml.predecir_riesgo_vehiculo(vehiculo_placa)
-                print(f"📊 Predicción ML: Riesgo {prediccion['nivel_riesgo']} "
-                      f"({prediccion['probabilidad_reincidencia']:.1f}% reincidencia)")
-            except Exception as e:
-                print(f"⚠️  Error en predicción ML: {e}")
-            
-            print(f"✅ Infracción registrada: {tipo_infraccion.nombre} - {vehiculo_placa}")
-            return infraccion
+            if encolada:
+                print(f"✅ Infracción encolada: {tipo_codigo} - {vehiculo_placa}")
+            return encolada
             
         except Exception as e:
             print(f"❌ Error al registrar infracción: {e}")
-            return None
+            return False
     
-    def procesar_frame(self, frame):
-        """Procesa un frame y detecta infracciones"""
-        self.frame_count += 1
-        
-        # Ejecutar detección YOLO con tracking
-        resultados = self.modelo_yolo.track(frame, persist=True, verbose=False)
+    def inferir(self, frame):
+        """Etapa de inferencia: YOLO con tracking del canal"""
+        return self.motor.inferir(self.canal, frame)
+    
+    def evaluar_reglas(self, frame, resultados):
+        """Etapa de reglas: evalúa infracciones por vehículo"""
+        evaluacion = {'vehiculos': [], 'infracciones': [], 'semaforo': None}
         
         if not resultados or len(resultados[0].boxes) == 0:
-            return frame
+            return evaluacion
         
         # Detectar luz roja
         luz_roja, coords_semaforo = self.detectar_luz_roja(frame, resultados)
+        if luz_roja:
+            evaluacion['semaforo'] = coords_semaforo
+        
+        # Velocidades y reglas de todos los tracks en una sola pasada
+        ids, puntos = self.actualizar_velocidades(resultados)
+        disparos = self.evaluar_infracciones(ids, puntos, luz_roja, frame.shape)
         
         # Procesar cada vehículo detectado
         for box in resultados[0].boxes:
-            cls = self.modelo_yolo.names[int(box.cls)]
+            cls = self.motor.names[int(box.cls)]
             conf = float(box.conf[0])
             
             # Solo procesar vehículos
@@ -203,81 +155,97 @@ class DetectorWebcam:
             vehiculo_id = int(box.id[0]) if box.id is not None else None
             
             if vehiculo_id:
-                # Detectar exceso de velocidad
-                exceso, velocidad = self.detectar_exceso_velocidad(vehiculo_id, self.frame_count)
+                placa = f"VEH-{vehiculo_id:04d}"
+                vehiculo = {
+                    'caja': (x1, y1, x2, y2),
+                    'texto': f"{cls} {conf:.2f}",
+                    'alerta': False,
+                    'luz_roja': False
+                }
                 
-                if exceso:
-                    placa = f"VEH-{vehiculo_id:04d}"
-                    self.registrar_infraccion(
-                        'EXCESO_VEL',
-                        frame,
-                        placa,
-                        velocidad=velocidad,
-                        confianza=conf
-                    )
-                    
-                    # Dibujar alerta en frame
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                    cv2.putText(frame, f"EXCESO: {velocidad:.0f} km/h", 
-                              (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 
-                              0.6, (0, 0, 255), 2)
-                    
-                    # Resetear tracking para este vehículo
-                    del self.detecciones_vehiculos[vehiculo_id]
-                else:
-                    # Actualizar tracking
-                    if vehiculo_id not in self.detecciones_vehiculos:
-                        self.detecciones_vehiculos[vehiculo_id] = self.frame_count
-                    
-                    # Dibujar detección normal
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.putText(frame, f"{cls} {conf:.2f}", 
-                              (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 
-                              0.5, (0, 255, 0), 2)
+                # Infracciones que dispararon las reglas para este track
+                for disparo in disparos.get(vehiculo_id, ()):
+                    evaluacion['infracciones'].append(dict(disparo, vehiculo_placa=placa, confianza=conf))
+                    if disparo['tipo_codigo'] == 'EXCESO_VEL':
+                        vehiculo.update(texto=f"EXCESO: {disparo['velocidad']:.0f} km/h", alerta=True)
+                        # Resetear historial de posiciones
+                        self.velocimetro.reiniciar(vehiculo_id)
+                    elif disparo['tipo_codigo'] == 'INVASION_CARRIL':
+                        if not vehiculo['alerta']:
+                            vehiculo.update(texto="INVASION CARRIL", alerta=True)
+                    else:
+                        vehiculo['luz_roja'] = True
                 
-                # Detectar luz roja
-                if luz_roja:
-                    placa = f"VEH-{vehiculo_id:04d}"
-                    self.registrar_infraccion(
-                        'LUZ_ROJA',
-                        frame,
-                        placa,
-                        confianza=conf
-                    )
-                    
-                    cv2.putText(frame, "LUZ ROJA!", 
-                              (x1, y2+20), cv2.FONT_HERSHEY_SIMPLEX, 
-                              0.6, (0, 0, 255), 2)
+                evaluacion['vehiculos'].append(vehiculo)
+        
+        return evaluacion
+    
+    def persistir(self, frame, evaluacion):
+        """Etapa de persistencia: registra las infracciones evaluadas"""
+        for infraccion in evaluacion['infracciones']:
+            self.registrar_infraccion(frame=frame, **infraccion)
+    
+    def renderizar(self, frame, evaluacion):
+        """Etapa de render: dibuja detecciones e información del sistema"""
+        frame = frame.copy()
+        
+        for vehiculo in evaluacion['vehiculos']:
+            x1, y1, x2, y2 = vehiculo['caja']
+            
+            if vehiculo['alerta']:
+                # Dibujar alerta en frame
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
+                cv2.putText(frame, vehiculo['texto'], 
+                          (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 
+                          0.6, (0, 0, 255), 2)
+            else:
+                # Dibujar detección normal
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                cv2.putText(frame, vehiculo['texto'], 
+                          (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 
+                          0.5, (0, 255, 0), 2)
+            
+            if vehiculo['luz_roja']:
+                cv2.putText(frame, "LUZ ROJA!", 
+                          (x1, y2+20), cv2.FONT_HERSHEY_SIMPLEX, 
+                          0.6, (0, 0, 255), 2)
         
         # Dibujar información del sistema
         cv2.putText(frame, f"Frame: {self.frame_count} | FPS: {self.fps}", 
                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.putText(frame, f"Vehiculos: {len(self.detecciones_vehiculos)}", 
+        cv2.putText(frame, f"Vehiculos: {self.tracks.activos()}", 
                    (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
         
-        if luz_roja and coords_semaforo:
-            x1, y1, x2, y2 = coords_semaforo
+        if evaluacion['semaforo']:
+            x1, y1, x2, y2 = evaluacion['semaforo']
             cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
             cv2.putText(frame, "SEMAFORO ROJO", (x1, y1-10), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
         
         return frame
     
+    def procesar_frame(self, frame):
+        """Procesa un frame de forma síncrona (todas las etapas en serie)"""
+        self.frame_count += 1
+        
+        resultados = self.inferir(frame)
+        evaluacion = self.evaluar_reglas(frame, resultados)
+        self.persistir(frame, evaluacion)
+        return self.renderizar(frame, evaluacion)
+    
     def iniciar_deteccion(self):
-        """Inicia el loop de detección en tiempo real"""
+        """Inicia el pipeline de detección en tiempo real"""
         print("\n🎥 Iniciando detección en tiempo real...")
         print("Presiona 'q' para salir\n")
         
+        self.pipeline = PipelineDeteccion(self)
+        self.pipeline.iniciar()
+        
         try:
-            while True:
-                ret, frame = self.cap.read()
-                
-                if not ret:
-                    print("❌ Error al capturar frame")
-                    break
-                
-                # Procesar frame
-                frame_procesado = self.procesar_frame(frame)
+            while self.pipeline.activo:
+                frame_procesado = self.pipeline.obtener_salida(timeout=1.0)
+                if frame_procesado is None:
+                    continue
                 
                 # Mostrar resultado
                 cv2.imshow('Sistema de Detección de Infracciones - Tesis', frame_procesado)
@@ -295,6 +263,10 @@ class DetectorWebcam:
     def detener(self):
         """Libera recursos"""
         print("\n🛑 Deteniendo sistema...")
+        if self.pipeline is not None:
+            self.pipeline.detener()
+        self.escritor.vaciar()
+        self.motor.liberar_canal(self.canal)
         self.cap.release()
         cv2.destroyAllWindows()
         print("✅ Sistema detenido correctamente")
@@ -0,0 +1,196 @@
+"""
+Almacenamiento de evidencias fuera del hilo de frames
+Un pool fijo de hilos codifica a JPEG (cv2.imencode libera el GIL) y escribe el
+frame completo, su miniatura y el recorte de placa. Los nombres son el hash del
+contenido, así dos infracciones en el mismo segundo nunca se pisan y una imagen
+repetida se escribe una sola vez. guardar() retorna un Future con las rutas
+relativas a MEDIA_ROOT; el escritor en lote lo resuelve antes del bulk_create
+"""
+import atexit
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+from queue import Queue, Empty, Full
+
+import cv2
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MEDIA_ROOT = BASE_DIR / 'media'
+
+WORKERS = int(os.getenv('EVIDENCIAS_WORKERS', 2))
+CAPACIDAD = int(os.getenv('EVIDENCIAS_CAPACIDAD', 64))
+CALIDAD = int(os.getenv('EVIDENCIAS_CALIDAD', 85))
+CALIDAD_PLACA = int(os.getenv('EVIDENCIAS_CALIDAD_PLACA', 90))
+CALIDAD_MINIATURA = int(os.getenv('EVIDENCIAS_CALIDAD_MINIATURA', 75))
+ANCHO_MAX = int(os.getenv('EVIDENCIAS_ANCHO_MAX', 0))  # 0 = resolución original
+ANCHO_MINIATURA = int(os.getenv('EVIDENCIAS_ANCHO_MINIATURA', 320))
+
+CARPETAS = {
+    'principal': 'infracciones/imagenes',
+    'miniatura': 'infracciones/miniaturas',
+    'placa': 'infracciones/placas',
+}
+
+
+def _reducir(imagen, ancho):
+    h, w = imagen.shape[:2]
+    if not ancho or w <= ancho:
+        return imagen
+    return cv2.resize(imagen, (ancho, int(h * ancho / w)), interpolation=cv2.INTER_AREA)
+
+
+class AlmacenEvidencias:
+    """Pool de codificación/escritura con cola acotada y métricas de latencia"""
+
+    def __init__(self, workers=WORKERS, capacidad=CAPACIDAD, calidad=CALIDAD, calidad_placa=CALIDAD_PLACA,
+                 ancho_max=ANCHO_MAX, ancho_miniatura=ANCHO_MINIATURA, raiz=MEDIA_ROOT, timeout_encolar=0.05):
+        self.calidad = calidad
+        self.calidad_placa = calidad_placa
+        self.ancho_max = ancho_max
+        self.ancho_miniatura = ancho_miniatura
+        self.raiz = Path(raiz)
+        self.timeout_encolar = timeout_encolar
+        for carpeta in CARPETAS.values():
+            (self.raiz / carpeta).mkdir(parents=True, exist_ok=True)
+
+        self.cola = Queue(maxsize=capacidad)
+
+        # Métricas
+        self._lock_metricas = threading.Lock()
+        self.encoladas = 0
+        self.guardadas = 0
+        self.repetidas = 0  # mismo contenido ya en disco
+        self.descartadas = 0
+        self.errores = 0
+        self.bytes_escritos = 0
+        self.latencias = {'espera': deque(maxlen=200), 'codificacion': deque(maxlen=200),
+                          'escritura': deque(maxlen=200)}
+
+        self.activo = True
+        self.hilos = [
+            threading.Thread(target=self._worker, daemon=True, name=f'evidencias-{i}')
+            for i in range(max(1, workers))
+        ]
+        for hilo in self.hilos:
+            hilo.start()
+
+    def guardar(self, frame, imagen_placa=None):
+        """
+        Encola el frame (y el recorte de placa) sin copiar ni codificar en el hilo
+        llamador; el frame no debe modificarse después
+        Retorna un Future con {'principal', 'miniatura', 'placa'}; resuelve a None si la cola está llena
+        """
+        futuro = Future()
+        try:
+            self.cola.put((time.perf_counter(), frame, imagen_placa, futuro), timeout=self.timeout_encolar)
+        except Full:
+            with self._lock_metricas:
+                self.descartadas += 1
+            print("⚠️  Cola de evidencias llena, infracción sin imagen")
+            futuro.set_result(None)
+            return futuro
+        with self._lock_metricas:
+            self.encoladas += 1
+        return futuro
+
+    def _worker(self):
+        while self.activo or not self.cola.empty():
+            try:
+                encolado, frame, imagen_placa, futuro = self.cola.get(timeout=0.5)
+            except Empty:
+                continue
+            espera = (time.perf_counter() - encolado) * 1000
+            try:
+                rutas = {
+                    'principal': self._escribir('principal', _reducir(frame, self.ancho_max), self.calidad),
+                    'miniatura': self._escribir('miniatura', _reducir(frame, self.ancho_miniatura),
+                                                CALIDAD_MINIATURA),
+                    'placa': None,
+                }
+                if imagen_placa is not None and imagen_placa.size:
+                    rutas['placa'] = self._escribir('placa', imagen_placa, self.calidad_placa)
+            except Exception as e:
+                with self._lock_metricas:
+                    self.errores += 1
+                print(f"❌ Error al guardar evidencia: {e}")
+                futuro.set_result(None)
+                continue
+            with self._lock_metricas:
+                self.latencias['espera'].append(espera)
+            futuro.set_result(rutas)
+
+    def _escribir(self, tipo, imagen, calidad):
+        inicio = time.perf_counter()
+        ok, datos = cv2.imencode('.jpg', imagen, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+        if not ok:
+            raise ValueError(f"No se pudo codificar la imagen ({tipo})")
+        datos = datos.tobytes()
+        nombre = hashlib.blake2b(datos, digest_size=16).hexdigest() + '.jpg'
+        relativa = f'{CARPETAS[tipo]}/{nombre}'
+        codificado = time.perf_counter()
+
+        ruta = self.raiz / relativa
+        repetida = ruta.exists()
+        if not repetida:
+            # Escritura atómica: nunca queda un JPEG a medias con el nombre final
+            temporal = ruta.with_suffix(f'.{threading.get_ident()}.tmp')
+            temporal.write_bytes(datos)
+            os.replace(temporal, ruta)
+        fin = time.perf_counter()
+
+        with self._lock_metricas:
+            self.latencias['codificacion'].append((codificado - inicio) * 1000)
+            self.latencias['escritura'].append((fin - codificado) * 1000)
+            if repetida:
+                self.repetidas += 1
+            else:
+                self.guardadas += 1
+                self.bytes_escritos += len(datos)
+        return relativa
+
+    def metricas(self):
+        """Latencias de espera, codificación y escritura (promedio/p95) y contadores"""
+        with self._lock_metricas:
+            latencias = {
+                etapa: {
+                    'promedio_ms': float(np.mean(valores)) if valores else 0.0,
+                    'p95_ms': float(np.percentile(valores, 95)) if valores else 0.0,
+                }
+                for etapa, valores in self.latencias.items()
+            }
+            return {
+                'latencias': latencias,
+                'encoladas': self.encoladas,
+                'guardadas': self.guardadas,
+                'repetidas': self.repetidas,
+                'descartadas': self.descartadas,
+                'errores': self.errores,
+                'mb_escritos': round(self.bytes_escritos / 1e6, 2),
+                'pendientes': self.cola.qsize(),
+                'capacidad': self.cola.maxsize,
+            }
+
+    def detener(self, timeout=10):
+        """Termina lo pendiente y detiene los hilos"""
+        self.activo = False
+        for hilo in self.hilos:
+            hilo.join(timeout)
+
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def obtener_almacen(**kwargs):
+    """Devuelve el almacén de evidencias compartido del proceso, creándolo la primera vez"""
+    global _almacen
+    with _almacen_lock:
+        if _almacen is None or not _almacen.activo:
+            _almacen = AlmacenEvidencias(**kwargs)
+            atexit.register(_almacen.detener)
+        return _almacen
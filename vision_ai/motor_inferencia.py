@@ -0,0 +1,260 @@
+"""
+Motor de inferencia YOLO compartido por todos los detectores
+Agrupa frames de N cámaras en micro-lotes y mantiene un tracker por canal
+Un único modelo en memoria por proceso, sin importar cuántos detectores existan
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from queue import Queue, Empty, Full
+
+import numpy as np
+
+# Límites configurables por variable de entorno
+MAX_LOTE = int(os.getenv('YOLO_MAX_LOTE', 8))
+MAX_ESPERA_MS = float(os.getenv('YOLO_MAX_ESPERA_MS', 15))
+RUTA_MODELO = os.getenv('YOLO_MODELO', 'yolov8n.pt')
+TRACKER = os.getenv('YOLO_TRACKER', 'bytetrack.yaml')
+
+
+class _Pedido:
+    """Frame pendiente de inferencia para un canal"""
+    __slots__ = ('canal', 'frame', 'conf', 'classes', 'futuro', 'encolado')
+
+    def __init__(self, canal, frame, conf, classes):
+        self.canal = canal
+        self.frame = frame
+        self.conf = conf
+        self.classes = classes
+        self.futuro = Future()
+        self.encolado = time.perf_counter()
+
+
+class MotorInferencia:
+    """Servicio de inferencia YOLO por micro-lotes con un tracker por canal"""
+
+    def __init__(self, ruta_modelo=RUTA_MODELO, max_lote=MAX_LOTE, max_espera_ms=MAX_ESPERA_MS,
+                 conf_min=0.25, iou=0.5, imgsz=640, tracker=TRACKER, dispositivo=None):
+        from ultralytics import YOLO
+        from ultralytics.utils import IterableSimpleNamespace, yaml_load
+        from ultralytics.utils.checks import check_yaml
+
+        print(f"📦 Cargando {ruta_modelo} en el motor de inferencia compartido...")
+        self.modelo = YOLO(ruta_modelo)
+        self.modelo.fuse()  # Fusionar capas para mayor velocidad
+        self.names = self.modelo.names
+
+        self.max_lote = max(1, max_lote)
+        self.max_espera = max_espera_ms / 1000.0
+        self.conf_min = conf_min
+        self.iou = iou
+        self.imgsz = imgsz
+        self.dispositivo = dispositivo
+
+        # Configuración del tracker (se instancia uno por canal)
+        self._cfg_tracker = IterableSimpleNamespace(**yaml_load(check_yaml(tracker)))
+        self._trackers = {}
+        self._siguiente_canal = 0
+        self._lock_canales = threading.Lock()
+
+        self.cola = Queue(maxsize=self.max_lote * 4)
+
+        # Métricas
+        self._lock_metricas = threading.Lock()
+        self.lotes_procesados = 0
+        self.frames_procesados = 0
+        self.tamanos_lote = deque(maxlen=200)
+        self.latencias_lote = deque(maxlen=200)
+        self.esperas_cola = deque(maxlen=200)
+
+        self.activo = True
+        self.hilo = threading.Thread(target=self._worker, daemon=True, name='motor-inferencia')
+        self.hilo.start()
+        print(f"✅ Motor de inferencia listo (lote máx {self.max_lote}, "
+              f"espera máx {max_espera_ms:.0f} ms, tracker {tracker})")
+
+    # ------------------------------------------------------------------
+    # Canales
+    # ------------------------------------------------------------------
+    def registrar_canal(self, camara_id=None):
+        """Registra un flujo de video y devuelve su identificador de canal"""
+        with self._lock_canales:
+            self._siguiente_canal += 1
+            canal = f"{camara_id}:{self._siguiente_canal}"
+            self._trackers[canal] = None
+        return canal
+
+    def liberar_canal(self, canal):
+        """Descarta el estado de tracking de un canal"""
+        with self._lock_canales:
+            self._trackers.pop(canal, None)
+
+    def reiniciar_tracker(self, canal):
+        """Reinicia los IDs de tracking de un canal"""
+        with self._lock_canales:
+            if canal in self._trackers:
+                self._trackers[canal] = None
+
+    def _tracker(self, canal):
+        from ultralytics.trackers.bot_sort import BOTSORT
+        from ultralytics.trackers.byte_tracker import BYTETracker
+
+        with self._lock_canales:
+            tracker = self._trackers.get(canal)
+            if tracker is None:
+                clase = BOTSORT if self._cfg_tracker.tracker_type == 'botsort' else BYTETracker
+                tracker = clase(args=self._cfg_tracker, frame_rate=30)
+                self._trackers[canal] = tracker
+            return tracker
+
+    # ------------------------------------------------------------------
+    # Inferencia
+    # ------------------------------------------------------------------
+    def enviar(self, canal, frame, conf=None, classes=None, timeout=None):
+        """Encola un frame y devuelve un Future con el resultado trackeado"""
+        if not self.activo:
+            raise RuntimeError("Motor de inferencia detenido")
+
+        pedido = _Pedido(canal, frame, conf, classes)
+        try:
+            self.cola.put(pedido, timeout=timeout)
+        except Full:
+            pedido.futuro.set_exception(TimeoutError("Cola de inferencia llena"))
+        return pedido.futuro
+
+    def inferir(self, canal, frame, conf=None, classes=None, timeout=None):
+        """
+        Inferencia bloqueante equivalente a modelo.track(frame, persist=True)
+        Retorna una lista con un único Results, igual que ultralytics
+        """
+        return self.enviar(canal, frame, conf=conf, classes=classes, timeout=timeout).result(timeout)
+
+    def _worker(self):
+        """Forma micro-lotes por tamaño o por tiempo de espera"""
+        while self.activo:
+            try:
+                primero = self.cola.get(timeout=0.5)
+            except Empty:
+                continue
+            if primero is None:
+                break
+
+            lote = [primero]
+            limite = time.perf_counter() + self.max_espera
+            while len(lote) < self.max_lote:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    pedido = self.cola.get(timeout=restante)
+                except Empty:
+                    break
+                if pedido is None:
+                    self.activo = False
+                    break
+                lote.append(pedido)
+
+            self._procesar_lote(lote)
+
+    def _procesar_lote(self, lote):
+        inicio = time.perf_counter()
+        try:
+            resultados = self.modelo.predict(
+                [pedido.frame for pedido in lote],
+                conf=self.conf_min,
+                iou=self.iou,
+                imgsz=self.imgsz,
+                device=self.dispositivo,
+                verbose=False
+            )
+        except Exception as e:
+            for pedido in lote:
+                pedido.futuro.set_exception(e)
+            return
+        fin = time.perf_counter()
+
+        # El tracker se actualiza en orden de llegada, incluso si un canal
+        # aparece más de una vez en el mismo lote
+        for pedido, resultado in zip(lote, resultados):
+            try:
+                pedido.futuro.set_result([self._actualizar_tracker(pedido, resultado)])
+            except Exception as e:
+                pedido.futuro.set_exception(e)
+
+        with self._lock_metricas:
+            self.lotes_procesados += 1
+            self.frames_procesados += len(lote)
+            self.tamanos_lote.append(len(lote))
+            self.latencias_lote.append((fin - inicio) * 1000)
+            self.esperas_cola.extend((inicio - pedido.encolado) * 1000 for pedido in lote)
+
+    def _actualizar_tracker(self, pedido, resultado):
+        """Filtra por confianza/clase del canal y asigna IDs de tracking"""
+        import torch
+
+        det = resultado.boxes.cpu().numpy()
+        mascara = det.conf >= (pedido.conf if pedido.conf is not None else self.conf_min)
+        if pedido.classes is not None:
+            mascara &= np.isin(det.cls, pedido.classes)
+        idx = np.flatnonzero(mascara)
+        resultado = resultado[idx]
+        det = det[idx]
+
+        if len(det) == 0:
+            return resultado
+
+        tracks = self._tracker(pedido.canal).update(det, pedido.frame)
+        if len(tracks) == 0:
+            return resultado
+
+        resultado = resultado[tracks[:, -1].astype(int)]
+        resultado.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------
+    def metricas(self):
+        """Métricas de rendimiento del motor"""
+        with self._lock_metricas:
+            return {
+                'lotes': self.lotes_procesados,
+                'frames': self.frames_procesados,
+                'tamano_lote_promedio': float(np.mean(self.tamanos_lote)) if self.tamanos_lote else 0.0,
+                'latencia_lote_ms': float(np.mean(self.latencias_lote)) if self.latencias_lote else 0.0,
+                'espera_cola_ms': float(np.mean(self.esperas_cola)) if self.esperas_cola else 0.0,
+                'pendientes': self.cola.qsize(),
+                'canales': len(self._trackers),
+            }
+
+    def detener(self):
+        """Detiene el worker; los pedidos pendientes se cancelan"""
+        self.activo = False
+        try:
+            self.cola.put_nowait(None)
+        except Full:
+            pass
+        self.hilo.join(timeout=2)
+
+        while True:
+            try:
+                pedido = self.cola.get_nowait()
+            except Empty:
+                break
+            if pedido is not None:
+                pedido.futuro.set_exception(RuntimeError("Motor de inferencia detenido"))
+
+
+_motor = None
+_motor_lock = threading.Lock()
+
+
+def obtener_motor(**kwargs):
+    """Devuelve el motor compartido del proceso, creándolo la primera vez"""
+    global _motor
+    with _motor_lock:
+        if _motor is None or not _motor.activo:
+            _motor = MotorInferencia(**kwargs)
+        return _motor
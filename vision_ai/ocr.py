@@ -0,0 +1,338 @@
+"""
+Lector EasyOCR compartido
+Los pesos de EasyOCR se cargan una sola vez por proceso y configuración, y todos
+los detectores leen a través del mismo lector (serializado con un lock).
+ServicioOCR saca las lecturas de placas del hilo de frames: un pool de workers
+compartido por todas las variantes de detector
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from queue import Queue, Full
+
+import cv2
+
+
+class LectorCompartido:
+    """Envuelve easyocr.Reader serializando readtext entre hilos"""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self._lock = threading.Lock()
+
+    def readtext(self, imagen, **kwargs):
+        with self._lock:
+            return self.reader.readtext(imagen, **kwargs)
+
+
+_lectores = {}
+_lectores_lock = threading.Lock()
+
+
+def obtener_lector_ocr(idiomas=('en',), gpu=True, model_storage_directory=None, instancia=0):
+    """
+    Devuelve el lector compartido para esa configuración, creándolo la primera vez
+    instancia > 0 crea lectores adicionales (cada uno con sus pesos) para leer en paralelo
+    """
+    clave = (tuple(idiomas), bool(gpu), model_storage_directory, instancia)
+    with _lectores_lock:
+        lector = _lectores.get(clave)
+        if lector is None:
+            import easyocr
+
+            kwargs = {'gpu': gpu, 'verbose': False}
+            if model_storage_directory:
+                kwargs['model_storage_directory'] = model_storage_directory
+                kwargs['download_enabled'] = True
+            lector = LectorCompartido(easyocr.Reader(list(idiomas), **kwargs))
+            _lectores[clave] = lector
+        return lector
+
+
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', 2))
+OCR_LECTORES = int(os.getenv('OCR_LECTORES', 1))
+OCR_CAPACIDAD = int(os.getenv('OCR_CAPACIDAD', 32))
+OCR_MAX_INTENTOS = int(os.getenv('OCR_MAX_INTENTOS', 8))
+OCR_INTERVALO_SEG = float(os.getenv('OCR_INTERVALO_SEG', 0.5))
+OCR_MAX_TRACKS = int(os.getenv('OCR_MAX_TRACKS', 2000))
+OCR_LECTURAS_MIN = int(os.getenv('OCR_LECTURAS_MIN', 3))
+OCR_ACUERDO_MIN = float(os.getenv('OCR_ACUERDO_MIN', 0.6))
+NITIDEZ_REFERENCIA = float(os.getenv('OCR_NITIDEZ_REFERENCIA', 300.0))
+
+
+def nitidez(imagen):
+    """Varianza del laplaciano normalizada a [0.1, 1] (recortes movidos pesan menos)"""
+    if imagen.ndim == 3:
+        imagen = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
+    if imagen.shape[1] > 160:
+        factor = 160.0 / imagen.shape[1]
+        imagen = cv2.resize(imagen, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    varianza = cv2.Laplacian(imagen, cv2.CV_64F).var()
+    return min(1.0, max(0.1, varianza / NITIDEZ_REFERENCIA))
+
+
+class EstadoTrack:
+    """
+    Consenso de OCR de un track (canal, vehiculo_id)
+    Cada lectura válida vota carácter por carácter (agrupado por longitud) con
+    peso confianza x nitidez; la placa se emite solo cuando converge
+    """
+
+    __slots__ = ('intentos', 'pendiente', 'ultimo_intento', 'posiciones', 'lecturas',
+                 'placa', 'confianza', 'roi', 'mejor_peso', 'terminado')
+
+    def __init__(self):
+        self.intentos = 0
+        self.pendiente = False
+        self.ultimo_intento = 0.0
+        self.posiciones = {}  # longitud -> [{caracter: peso}, ...]
+        self.lecturas = {}  # longitud -> lecturas válidas
+        self.placa = None
+        self.confianza = 0.0
+        self.roi = None  # recorte de placa de la lectura de mayor peso, para la evidencia
+        self.mejor_peso = 0.0
+        self.terminado = False
+
+    def votar(self, placa, peso):
+        votos = self.posiciones.setdefault(len(placa), [{} for _ in placa])
+        for voto, caracter in zip(votos, placa):
+            voto[caracter] = voto.get(caracter, 0.0) + peso
+        self.lecturas[len(placa)] = self.lecturas.get(len(placa), 0) + 1
+
+    def consenso(self):
+        """(placa, acuerdo, lecturas) de la longitud más votada; acuerdo = peor posición"""
+        if not self.posiciones:
+            return None, 0.0, 0
+        longitud = max(self.posiciones, key=lambda n: sum(self.posiciones[n][0].values()))
+        placa = []
+        acuerdo = 1.0
+        for voto in self.posiciones[longitud]:
+            caracter, peso = max(voto.items(), key=lambda item: item[1])
+            placa.append(caracter)
+            acuerdo = min(acuerdo, peso / sum(voto.values()))
+        return ''.join(placa), acuerdo, self.lecturas[longitud]
+
+
+class ServicioOCR:
+    """
+    Pool de hilos de OCR compartido por todos los detectores
+    Deduplica por track, limita reintentos, acumula el consenso por carácter
+    y deja de leer un track cuando converge; desaloja en orden LRU los
+    tracks ya resueltos
+    """
+
+    def __init__(self, lectores, workers=OCR_WORKERS, capacidad=OCR_CAPACIDAD,
+                 max_intentos=OCR_MAX_INTENTOS, intervalo_seg=OCR_INTERVALO_SEG,
+                 max_tracks=OCR_MAX_TRACKS, lecturas_min=OCR_LECTURAS_MIN,
+                 acuerdo_min=OCR_ACUERDO_MIN):
+        self.lectores = lectores
+        self.max_intentos = max(1, max_intentos)
+        self.intervalo_seg = intervalo_seg
+        self.max_tracks = max(1, max_tracks)
+        self.lecturas_min = max(1, lecturas_min)
+        self.acuerdo_min = acuerdo_min
+        self.cola = Queue(maxsize=capacidad)
+        self._tracks = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.solicitudes = 0
+        self.duplicadas = 0
+        self.descartadas = 0
+        self.lecturas = 0
+        self.sin_region = 0
+        self.aciertos = 0
+        self.convergidos = 0
+        self.errores = 0
+        self.desalojos = 0
+        self.latencias = deque(maxlen=200)
+
+        self.hilos = []
+        for i in range(max(1, workers)):
+            hilo = threading.Thread(
+                target=self._worker, args=(lectores[i % len(lectores)],),
+                daemon=True, name=f'ocr-{i}'
+            )
+            hilo.start()
+            self.hilos.append(hilo)
+
+    def solicitar(self, clave, roi, preparar=None, validar=None, confianza_min=0.4, localizar=None, **opciones):
+        """
+        Encola el recorte de un track si no tiene lectura en curso, no agotó
+        sus intentos ni se leyó hace menos de intervalo_seg. Retorna True si se encoló.
+        localizar(roi) -> recorte de la placa o None; preparar(recorte) -> imagen
+        para readtext; validar(texto) -> placa o None. La nitidez y la evidencia
+        usan el recorte de localizar (el roi completo si no se indica)
+        """
+        if roi is None or roi.size == 0:
+            return False
+
+        ahora = time.monotonic()
+        with self._lock:
+            estado = self._tracks.get(clave)
+            if estado is None:
+                estado = self._tracks[clave] = EstadoTrack()
+                self._desalojar()
+            else:
+                self._tracks.move_to_end(clave)
+
+            if estado.terminado or estado.pendiente:
+                self.duplicadas += 1
+                return False
+            if ahora - estado.ultimo_intento < self.intervalo_seg:
+                return False
+
+            try:
+                self.cola.put_nowait((clave, roi.copy(), localizar, preparar, validar, confianza_min, opciones, ahora))
+            except Full:
+                self.descartadas += 1
+                return False
+            estado.pendiente = True
+            estado.ultimo_intento = ahora
+            self.solicitudes += 1
+            return True
+
+    def resultado(self, clave):
+        """(placa, acuerdo, roi) del track si ya convergió, o (None, 0.0, None)"""
+        with self._lock:
+            estado = self._tracks.get(clave)
+            if estado is None or estado.placa is None:
+                return None, 0.0, None
+            return estado.placa, estado.confianza, estado.roi
+
+    def _desalojar(self):
+        """Quita primero los tracks terminados más antiguos; si no alcanza, los más antiguos"""
+        exceso = len(self._tracks) - self.max_tracks
+        if exceso <= 0:
+            return
+        for clave in [c for c, e in self._tracks.items() if e.terminado and not e.pendiente][:exceso]:
+            del self._tracks[clave]
+            exceso -= 1
+            self.desalojos += 1
+        while exceso > 0:
+            self._tracks.popitem(last=False)
+            exceso -= 1
+            self.desalojos += 1
+
+    def _worker(self, lector):
+        while True:
+            item = self.cola.get()
+            if item is None:
+                break
+            clave, roi, localizar, preparar, validar, confianza_min, opciones, encolado = item
+            error = False
+            recorte = None
+            try:
+                # localizar o preparar pueden devolver None si no hay una región de placa
+                recorte = localizar(roi) if localizar else roi
+                imagen = (preparar(recorte) if preparar else recorte) if recorte is not None else None
+                lecturas = lector.readtext(imagen, **opciones) if imagen is not None else []
+                if imagen is None:
+                    self.sin_region += 1
+                candidatos = [
+                    (validar(texto) if validar else texto, confianza)
+                    for _, texto, confianza in lecturas
+                    if confianza > confianza_min
+                ]
+            except Exception as e:
+                print(f"⚠️  Error en OCR worker: {e}")
+                candidatos = []
+                error = True
+            # Un voto por lectura: el candidato válido de mayor confianza
+            candidatos = [(p, c) for p, c in candidatos if p]
+            voto = None
+            if candidatos:
+                placa, confianza = max(candidatos, key=lambda item: item[1])
+                voto = (placa, confianza * nitidez(recorte))
+            self._votar(clave, recorte, voto, error)
+            self.latencias.append((time.monotonic() - encolado) * 1000)
+
+    def _votar(self, clave, roi, voto, error=False):
+        with self._lock:
+            self.lecturas += 1
+            self.errores += error
+            estado = self._tracks.get(clave)
+            if estado is None:
+                return  # desalojado mientras se leía
+            estado.pendiente = False
+            estado.intentos += 1
+
+            if voto is not None:
+                placa, peso = voto
+                estado.votar(placa, peso)
+                if peso > estado.mejor_peso:
+                    estado.mejor_peso, estado.roi = peso, roi
+                self.aciertos += 1
+
+                placa, acuerdo, lecturas = estado.consenso()
+                if lecturas >= self.lecturas_min and acuerdo >= self.acuerdo_min:
+                    # Convergió: se emite la placa y no se vuelve a leer este track
+                    estado.placa, estado.confianza = placa, acuerdo
+                    estado.terminado = True
+                    self.convergidos += 1
+
+            if estado.intentos >= self.max_intentos:
+                estado.terminado = True
+            if estado.terminado and estado.placa is None:
+                estado.roi = None  # Sin placa emitida no hay evidencia que guardar
+
+    def olvidar(self, claves):
+        """Descarta el estado (y el recorte) de tracks que dejaron la escena"""
+        with self._lock:
+            for clave in claves:
+                self._tracks.pop(clave, None)
+
+    def olvidar_canal(self, canal):
+        """Descarta los tracks de un canal (claves (canal, vehiculo_id))"""
+        with self._lock:
+            for clave in [c for c in self._tracks if c[0] == canal]:
+                del self._tracks[clave]
+
+    def metricas(self):
+        with self._lock:
+            terminados = sum(1 for e in self._tracks.values() if e.terminado)
+            return {
+                'workers': len(self.hilos),
+                'lectores': len(self.lectores),
+                'solicitudes': self.solicitudes,
+                'duplicadas': self.duplicadas,
+                'descartadas': self.descartadas,
+                'lecturas': self.lecturas,
+                'sin_region': self.sin_region,
+                'aciertos': self.aciertos,
+                'convergidos': self.convergidos,
+                'errores': self.errores,
+                'pendientes': self.cola.qsize(),
+                'tracks': len(self._tracks),
+                'tracks_terminados': terminados,
+                'desalojos': self.desalojos,
+                'latencia_ms': sum(self.latencias) / len(self.latencias) if self.latencias else 0.0,
+            }
+
+    def detener(self, timeout=5):
+        for _ in self.hilos:
+            self.cola.put(None)
+        for hilo in self.hilos:
+            hilo.join(timeout)
+
+
+_servicios = {}
+
+
+def obtener_servicio_ocr(idiomas=('en',), gpu=True, model_storage_directory=None):
+    """Servicio OCR compartido para esa configuración, creándolo la primera vez"""
+    clave = (tuple(idiomas), bool(gpu), model_storage_directory)
+    with _lectores_lock:
+        servicio = _servicios.get(clave)
+    if servicio is None:
+        lectores = [
+            obtener_lector_ocr(idiomas, gpu, model_storage_directory, instancia=i)
+            for i in range(max(1, OCR_LECTORES))
+        ]
+        with _lectores_lock:
+            servicio = _servicios.get(clave)
+            if servicio is None:
+                servicio = _servicios[clave] = ServicioOCR(lectores)
+                print(f"✅ Servicio OCR: {len(servicio.hilos)} workers, {len(lectores)} lector(es)")
+    return servicio
@@ -0,0 +1,242 @@
+"""
+Escritor asíncrono de infracciones en lote
+Un único hilo en segundo plano agrupa infracciones y eventos pendientes y los
+escribe con bulk_create cada N ms o M registros, fuera del bucle de frames.
+Cada registro lleva un id_evento propio, así un lote que falla se reintenta
+(y luego se escribe de a uno) sin duplicar lo que sí llegó a confirmarse
+"""
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from queue import Queue, Empty, Full
+
+INTERVALO_MS = float(os.getenv('ESCRITOR_INTERVALO_MS', 500))
+MAX_REGISTROS = int(os.getenv('ESCRITOR_MAX_REGISTROS', 50))
+CAPACIDAD = int(os.getenv('ESCRITOR_CAPACIDAD', 1000))
+REINTENTOS = int(os.getenv('ESCRITOR_REINTENTOS', 3))
+ESPERA_REINTENTO = float(os.getenv('ESCRITOR_ESPERA_REINTENTO', 0.5))  # segundos, se duplica en cada intento
+
+
+class EscritorInfracciones:
+    """Escritor en lote con cola acotada y métricas de contrapresión"""
+
+    def __init__(self, intervalo_ms=INTERVALO_MS, max_registros=MAX_REGISTROS,
+                 capacidad=CAPACIDAD, timeout_encolar=0.05, timeout_evidencia=10,
+                 reintentos=REINTENTOS, espera_reintento=ESPERA_REINTENTO):
+        self.intervalo = intervalo_ms / 1000.0
+        self.reintentos = max(0, reintentos)
+        self.espera_reintento = espera_reintento
+        self.max_registros = max(1, max_registros)
+        self.timeout_encolar = timeout_encolar
+        self.timeout_evidencia = timeout_evidencia
+        self.cola = Queue(maxsize=capacidad)
+        self.predictor = None
+
+        # Métricas
+        self._lock_metricas = threading.Lock()
+        self.encolados = 0
+        self.escritos = 0
+        self.descartados = 0
+        self.errores = 0
+        self.reintentos_lote = 0
+        self.lotes = 0
+        self.ocupacion_max = 0
+        self.latencias_lote = deque(maxlen=200)
+        self.esperas = deque(maxlen=200)
+
+        self._pendientes = 0
+        self._vaciado = threading.Condition()
+
+        self.activo = True
+        self.hilo = threading.Thread(target=self._worker, daemon=True, name='escritor-infracciones')
+        self.hilo.start()
+
+    def encolar(self, registro, actualizar_riesgo=False):
+        """
+        Encola un registro para crear_infracciones_lote; 'evidencia' puede ser el
+        Future de AlmacenEvidencias.guardar y se resuelve aquí, fuera del bucle de frames
+        Retorna False si la cola sigue llena tras el timeout (registro descartado)
+        """
+        registro.setdefault('id_evento', uuid.uuid4().hex)
+        with self._vaciado:
+            self._pendientes += 1
+        try:
+            self.cola.put((time.perf_counter(), registro, actualizar_riesgo),
+                          timeout=self.timeout_encolar)
+        except Full:
+            with self._lock_metricas:
+                self.descartados += 1
+            self._marcar_terminados(1)
+            print(f"⚠️  Cola de persistencia llena, infracción descartada: "
+                  f"{registro.get('tipo_codigo')} - {registro.get('placa')}")
+            return False
+
+        with self._lock_metricas:
+            self.encolados += 1
+            self.ocupacion_max = max(self.ocupacion_max, self.cola.qsize())
+        return True
+
+    def _worker(self):
+        from django.db import close_old_connections, connection
+
+        lote = []
+        limite = None
+        while self.activo or lote:
+            timeout = 0.5 if limite is None else max(0.0, limite - time.perf_counter())
+            try:
+                item = self.cola.get(timeout=timeout)
+            except Empty:
+                item = None
+
+            if item is not None:
+                if not lote:
+                    limite = time.perf_counter() + self.intervalo
+                lote.append(item)
+
+            if lote and (len(lote) >= self.max_registros or time.perf_counter() >= limite
+                         or not self.activo):
+                close_old_connections()
+                self._escribir(lote)
+                self._marcar_terminados(len(lote))
+                lote = []
+                limite = None
+
+        connection.close()
+
+    def _escribir(self, lote):
+        registros = [self._con_evidencia(registro) for _, registro, _ in lote]
+        inicio = time.perf_counter()
+        resultado = self._escribir_con_reintentos(registros)
+        fin = time.perf_counter()
+
+        with self._lock_metricas:
+            self.lotes += 1
+            self.escritos += sum(1 for estado, _ in resultado if estado == 'creada')
+            self.errores += sum(1 for estado, _ in resultado if estado == 'error')
+            self.latencias_lote.append((fin - inicio) * 1000)
+            self.esperas.extend((fin - encolado) * 1000 for encolado, _, _ in lote)
+
+        for registro, (estado, _) in zip(registros, resultado):
+            if estado == 'tipo_invalido':
+                print(f"⚠️  Tipo de infracción {registro['tipo_codigo']} no encontrado")
+
+        # Predicción ML tras confirmar la escritura, una vez por placa del lote
+        placas = {registro['placa'] for _, registro, actualizar in lote if actualizar}
+        for placa in placas:
+            self._actualizar_riesgo(placa)
+
+    def _escribir_con_reintentos(self, registros):
+        """
+        Lista paralela de (estado, Infraccion o None) como registrar_infracciones_idempotente
+        Reintenta el lote con espera exponencial; si sigue fallando escribe de a
+        uno y solo descarta (estado 'error') los registros que fallan solos
+        """
+        from django.db import close_old_connections
+        from infracciones import cache
+        from infracciones.servicios import registrar_infracciones_idempotente
+
+        for intento in range(self.reintentos + 1):
+            try:
+                return registrar_infracciones_idempotente(registros)
+            except Exception as e:
+                # El rollback pudo deshacer vehículos ya resueltos; no reutilizar sus ids
+                cache.vehiculos.limpiar()
+                close_old_connections()
+                print(f"⚠️  Error al escribir lote de {len(registros)} infracciones "
+                      f"(intento {intento + 1}/{self.reintentos + 1}): {e}")
+                if intento < self.reintentos:
+                    with self._lock_metricas:
+                        self.reintentos_lote += 1
+                    time.sleep(self.espera_reintento * 2 ** intento)
+
+        resultado = []
+        for registro in registros:
+            try:
+                resultado.extend(registrar_infracciones_idempotente([registro]))
+            except Exception as e:
+                cache.vehiculos.limpiar()
+                close_old_connections()
+                print(f"❌ Infracción descartada {registro.get('tipo_codigo')} - {registro.get('placa')} "
+                      f"(id_evento {registro.get('id_evento')}): {e}")
+                resultado.append(('error', None))
+        return resultado
+
+    def _con_evidencia(self, registro):
+        """Sustituye el Future de evidencia por las rutas de imagen ya escritas"""
+        evidencia = registro.pop('evidencia', None)
+        if evidencia is None:
+            return registro
+        try:
+            rutas = evidencia.result(timeout=self.timeout_evidencia)
+        except Exception as e:
+            print(f"⚠️  Evidencia no disponible: {e}")
+            rutas = None
+        if rutas:
+            registro.update(
+                imagen_principal=rutas['principal'],
+                imagen_miniatura=rutas['miniatura'],
+                imagen_placa=rutas['placa'],
+            )
+        return registro
+
+    def _actualizar_riesgo(self, placa):
+        try:
+            if self.predictor is None:
+                from ml_predicciones.predictor import PredictorRiesgo
+                self.predictor = PredictorRiesgo()
+            prediccion = self.predictor.predecir_riesgo_vehiculo(placa)
+            print(f"📊 ML: Riesgo {prediccion['nivel_riesgo']} "
+                  f"({prediccion['probabilidad_reincidencia']:.1f}%)")
+        except Exception as e:
+            print(f"⚠️  Error en predicción ML: {e}")
+
+    def _marcar_terminados(self, cantidad):
+        with self._vaciado:
+            self._pendientes -= cantidad
+            if self._pendientes <= 0:
+                self._vaciado.notify_all()
+
+    def vaciar(self, timeout=10):
+        """Espera a que todo lo encolado hasta ahora quede escrito"""
+        with self._vaciado:
+            return self._vaciado.wait_for(lambda: self._pendientes <= 0, timeout)
+
+    def metricas(self):
+        """Métricas de rendimiento y contrapresión del escritor"""
+        with self._lock_metricas:
+            return {
+                'encolados': self.encolados,
+                'escritos': self.escritos,
+                'descartados': self.descartados,
+                'errores': self.errores,
+                'reintentos': self.reintentos_lote,
+                'lotes': self.lotes,
+                'pendientes': self.cola.qsize(),
+                'capacidad': self.cola.maxsize,
+                'ocupacion_max': self.ocupacion_max,
+                'latencia_lote_ms': sum(self.latencias_lote) / len(self.latencias_lote) if self.latencias_lote else 0.0,
+                'espera_max_ms': max(self.esperas) if self.esperas else 0.0,
+            }
+
+    def detener(self, timeout=10):
+        """Escribe todo lo pendiente y detiene el hilo"""
+        self.vaciar(timeout)
+        self.activo = False
+        self.hilo.join(timeout)
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+
+def obtener_escritor(**kwargs):
+    """Devuelve el escritor compartido del proceso, creándolo la primera vez"""
+    global _escritor
+    with _escritor_lock:
+        if _escritor is None or not _escritor.activo:
+            _escritor = EscritorInfracciones(**kwargs)
+            atexit.register(_escritor.detener)
+        return _escritor
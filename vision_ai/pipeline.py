@@ -0,0 +1,228 @@
+"""
+Pipeline de detección por etapas desacopladas
+Captura -> Inferencia -> Reglas -> Render/Persistencia, unidas por colas acotadas
+que descartan el elemento más antiguo, para que una inferencia lenta nunca
+bloquee la lectura de la cámara ni acumule frames viejos
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class ColaDescarte:
+    """Cola acotada: al llenarse descarta el elemento más antiguo"""
+
+    def __init__(self, maxlen=2):
+        self._items = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.descartados = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.descartados += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Retorna el siguiente elemento o None si vence el timeout"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def despertar(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class PipelineActivo(RuntimeError):
+    """El detector ya está siendo procesado por su PipelineDeteccion"""
+
+
+class Paquete:
+    """Frame que viaja por las etapas junto con sus resultados intermedios"""
+    __slots__ = ('numero', 'frame', 't_captura', 'resultados', 'evaluacion', 'salida')
+
+    def __init__(self, numero, frame, t_captura):
+        self.numero = numero
+        self.frame = frame
+        self.t_captura = t_captura
+        self.resultados = None
+        self.evaluacion = None
+        self.salida = None
+
+
+class CapturaUltimoFrame:
+    """Hilo de captura que conserva solo el frame más reciente"""
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.activo = False
+        self.finalizado = False
+        self.frames_leidos = 0
+        self.frames_descartados = 0
+        self._ultimo = None
+        self._cond = threading.Condition()
+        self._hilo = threading.Thread(target=self._leer, daemon=True, name='pipeline-captura')
+
+    def iniciar(self):
+        self.activo = True
+        self._hilo.start()
+
+    def _leer(self):
+        while self.activo:
+            ret, frame = self.cap.read()
+            if not ret:
+                print("❌ Error al capturar frame")
+                break
+
+            with self._cond:
+                self.frames_leidos += 1
+                if self._ultimo is not None:
+                    self.frames_descartados += 1
+                self._ultimo = Paquete(self.frames_leidos, frame, time.perf_counter())
+                self._cond.notify_all()
+
+        with self._cond:
+            self.finalizado = True
+            self._cond.notify_all()
+
+    def siguiente(self, timeout=None):
+        """Toma el frame más reciente, esperando si aún no hay uno nuevo"""
+        with self._cond:
+            if self._ultimo is None and not self.finalizado:
+                self._cond.wait(timeout)
+            paquete, self._ultimo = self._ultimo, None
+            return paquete
+
+    def detener(self):
+        self.activo = False
+        self._hilo.join(timeout=2)
+
+
+class PipelineDeteccion:
+    """
+    Orquesta las etapas de un detector en hilos separados
+    El detector debe exponer inferir(), evaluar_reglas(), persistir() y renderizar()
+    Mientras corre, el detector no acepta procesar_frame (PipelineActivo): el
+    tracker del canal y los tracks son de un solo flujo de frames
+    La inferencia corre sin lock (solo este hilo usa el tracker del canal);
+    reglas y render toman detector.lock solo mientras modifican tracks e
+    infracciones, que también leen los metadatos del dashboard
+    """
+
+    ETAPAS = ('inferencia', 'reglas', 'render')
+
+    def __init__(self, detector, tam_cola=2):
+        self.detector = detector
+        self.lock = getattr(detector, 'lock', None) or threading.Lock()
+        self.captura = CapturaUltimoFrame(detector.cap)
+        self.cola_reglas = ColaDescarte(tam_cola)
+        self.cola_render = ColaDescarte(tam_cola)
+        self.cola_salida = ColaDescarte(1)
+
+        self.latencias = {etapa: deque(maxlen=200) for etapa in self.ETAPAS}
+        self.latencias['extremo_a_extremo'] = deque(maxlen=200)
+        self.latencias['alerta'] = deque(maxlen=200)
+        self._lock_metricas = threading.Lock()
+
+        self.activo = False
+        self._numero_anterior = 0
+        self._hilos = [
+            threading.Thread(target=self._bucle, args=(etapa,), daemon=True, name=f'pipeline-{etapa}')
+            for etapa in self.ETAPAS
+        ]
+
+    def iniciar(self):
+        self.activo = True
+        self.captura.iniciar()
+        for hilo in self._hilos:
+            hilo.start()
+
+    def _bucle(self, etapa):
+        entrada, ejecutar, salida = {
+            'inferencia': (lambda: self.captura.siguiente(0.5), self._inferir, self.cola_reglas),
+            'reglas': (lambda: self.cola_reglas.get(0.5), self._evaluar, self.cola_render),
+            'render': (lambda: self.cola_render.get(0.5), self._render, self.cola_salida),
+        }[etapa]
+
+        while self.activo:
+            paquete = entrada()
+            if paquete is None:
+                if etapa == 'inferencia' and self.captura.finalizado:
+                    self.activo = False
+                continue
+
+            inicio = time.perf_counter()
+            try:
+                ejecutar(paquete)
+            except Exception as e:
+                print(f"⚠️  Error en etapa {etapa}: {e}")
+                continue
+            fin = time.perf_counter()
+
+            with self._lock_metricas:
+                self.latencias[etapa].append((fin - inicio) * 1000)
+                if etapa == 'render':
+                    self.latencias['extremo_a_extremo'].append((fin - paquete.t_captura) * 1000)
+                    if paquete.evaluacion['infracciones']:
+                        self.latencias['alerta'].append((fin - paquete.t_captura) * 1000)
+            salida.put(paquete)
+
+        self.cola_salida.despertar()
+
+    def _inferir(self, paquete):
+        paquete.resultados = self.detector.inferir(paquete.frame)
+
+    def _evaluar(self, paquete):
+        with self.lock:
+            # El tiempo de los tracks avanza en frames capturados, no procesados, y nunca
+            # retrocede: frame_count es del detector y sobrevive a cada pipeline nuevo
+            self.detector.frame_count += paquete.numero - self._numero_anterior
+            self._numero_anterior = paquete.numero
+            paquete.evaluacion = self.detector.evaluar_reglas(paquete.frame, paquete.resultados)
+
+    def _render(self, paquete):
+        with self.lock:
+            self.detector.persistir(paquete.frame, paquete.evaluacion)
+            paquete.salida = self.detector.renderizar(paquete.frame, paquete.evaluacion)
+
+    def obtener_salida(self, timeout=None):
+        """Frame anotado más reciente (para mostrar en el hilo principal)"""
+        paquete = self.cola_salida.get(timeout)
+        return paquete.salida if paquete is not None else None
+
+    def metricas(self):
+        """Latencia promedio/p95 por etapa y frames descartados por cola"""
+        with self._lock_metricas:
+            latencias = {
+                etapa: {
+                    'promedio_ms': float(np.mean(valores)) if valores else 0.0,
+                    'p95_ms': float(np.percentile(valores, 95)) if valores else 0.0,
+                }
+                for etapa, valores in self.latencias.items()
+            }
+        return {
+            'latencias': latencias,
+            'frames_leidos': self.captura.frames_leidos,
+            'descartados': {
+                'captura': self.captura.frames_descartados,
+                'reglas': self.cola_reglas.descartados,
+                'render': self.cola_render.descartados,
+                'salida': self.cola_salida.descartados,
+            },
+        }
+
+    def detener(self):
+        self.activo = False
+        self.captura.detener()
+        for cola in (self.cola_reglas, self.cola_render, self.cola_salida):
+            cola.despertar()
+        for hilo in self._hilos:
+            hilo.join(timeout=2)
@@ -0,0 +1,94 @@
+"""
+Localización de placas antes del OCR
+Heurística de contornos sobre la caja del vehículo: gradiente horizontal, cierre
+morfológico y filtro por proporción/área. Solo el recorte candidato (unos
+pocos miles de píxeles) llega a readtext, en lugar de la caja completa
+"""
+import os
+
+import cv2
+import numpy as np
+
+# Placa peruana 30 x 15 cm; se toleran perspectiva y marcos
+PROPORCION_MIN = float(os.getenv('PLACA_PROPORCION_MIN', 1.5))
+PROPORCION_MAX = float(os.getenv('PLACA_PROPORCION_MAX', 6.0))
+AREA_MIN = 0.002  # fracción del área analizada
+AREA_MAX = 0.15
+ANCHO_ANALISIS = 480  # la búsqueda trabaja sobre una copia reducida
+ALTO_PLACA = int(os.getenv('PLACA_ALTO_OCR', 64))  # alto normalizado del recorte para OCR
+
+# readtext sobre un recorte pequeño no necesita el lienzo de 2560 px
+OPCIONES_OCR_PLACA = {
+    'canvas_size': int(os.getenv('PLACA_CANVAS_OCR', 640)),
+    'mag_ratio': 1.0,
+}
+
+
+def candidatos_placa(roi, max_candidatos=2):
+    """
+    Cajas (x1, y1, x2, y2) en coordenadas de roi con aspecto de placa,
+    de mayor a menor densidad de bordes
+    """
+    if roi is None or roi.size == 0:
+        return []
+
+    h, w = roi.shape[:2]
+    # Las placas están en la mitad inferior del vehículo
+    y0 = h // 3
+    zona = roi[y0:]
+    escala = min(1.0, ANCHO_ANALISIS / float(w))
+    if escala < 1.0:
+        zona = cv2.resize(zona, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+
+    gray = cv2.cvtColor(zona, cv2.COLOR_BGR2GRAY) if zona.ndim == 3 else zona
+    zh, zw = gray.shape[:2]
+    if zh < 8 or zw < 16:
+        return []
+
+    # Caracteres = muchos bordes verticales juntos
+    grad = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3))
+    _, binaria = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, zw // 25), 3))
+    binaria = cv2.morphologyEx(binaria, cv2.MORPH_CLOSE, kernel)
+    binaria = cv2.morphologyEx(binaria, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+
+    contornos, _ = cv2.findContours(binaria, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    area_zona = float(zh * zw)
+    candidatos = []
+    for contorno in contornos:
+        x, y, cw, ch = cv2.boundingRect(contorno)
+        if ch == 0 or cw > 0.8 * zw:
+            continue
+        proporcion = cw / float(ch)
+        area = cw * ch / area_zona
+        if not (PROPORCION_MIN <= proporcion <= PROPORCION_MAX and AREA_MIN <= area <= AREA_MAX):
+            continue
+        densidad = cv2.countNonZero(binaria[y:y + ch, x:x + cw]) / float(cw * ch)
+        candidatos.append((densidad, x, y, cw, ch))
+
+    candidatos.sort(reverse=True)
+    cajas = []
+    for _, x, y, cw, ch in candidatos[:max_candidatos]:
+        # Volver a coordenadas de roi con un pequeño margen
+        mx, my = cw * 0.08, ch * 0.15
+        x1 = int(max(0, (x - mx) / escala))
+        x2 = int(min(w, (x + cw + mx) / escala))
+        y1 = int(max(0, (y - my) / escala)) + y0
+        y2 = int(min(h - y0, (y + ch + my) / escala)) + y0
+        cajas.append((x1, y1, x2, y2))
+    return cajas
+
+
+def localizar_placa(roi):
+    """Recorte de la mejor región candidata, normalizado a ALTO_PLACA px de alto, o None"""
+    cajas = candidatos_placa(roi, max_candidatos=1)
+    if not cajas:
+        return None
+
+    x1, y1, x2, y2 = cajas[0]
+    placa = roi[y1:y2, x1:x2]
+    if placa.size == 0:
+        return None
+    factor = ALTO_PLACA / float(placa.shape[0])
+    interpolacion = cv2.INTER_AREA if factor < 1 else cv2.INTER_CUBIC
+    return cv2.resize(placa, None, fx=factor, fy=factor, interpolation=interpolacion)
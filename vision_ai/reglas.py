@@ -0,0 +1,226 @@
+"""
+Motor de reglas de infracción por cámara
+Las reglas (ReglaCamara) se leen de la BD y se compilan una vez por resolución:
+los polígonos se rasterizan en máscaras de celdas de REJILLA px y las líneas de
+detención quedan como segmentos. Cada frame evalúa todas las reglas sobre todos
+los tracks con indexación NumPy, sin bucles por vehículo
+"""
+import os
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+REJILLA = int(os.getenv('REGLAS_REJILLA_PX', 4))  # lado de la celda de las máscaras
+RECARGA_SEG = float(os.getenv('REGLAS_RECARGA_SEG', 30))
+VELOCIDAD_MAX_CREIBLE = 200  # km/h; por encima es un error de tracking
+
+CAMPOS = ('id', 'tipo', 'geometria', 'velocidad_maxima', 'hora_inicio', 'hora_fin', 'cooldown_seg')
+
+
+def reglas_por_defecto(margen_carril=1 / 8, margen_carril_px=None):
+    """
+    Reglas de las cámaras sin reglas en BD, equivalentes a los valores fijos que
+    tenía cada detector: 60 km/h, luz roja sin línea de detención e invasión de
+    carril en la franja w/2 ± margen_carril (fracción del ancho) o
+    w/2 ± margen_carril_px píxeles; sin margen no hay regla de carril
+    """
+    base = {c: None for c in CAMPOS}
+    reglas = [
+        dict(base, tipo='EXCESO_VEL', velocidad_maxima=60, cooldown_seg=5),
+        dict(base, tipo='LUZ_ROJA', cooldown_seg=5),
+    ]
+    if margen_carril_px:
+        reglas.append(dict(base, tipo='INVASION_CARRIL', cooldown_seg=5, margen_px=margen_carril_px))
+    elif margen_carril:
+        izquierda, derecha = 0.5 - margen_carril, 0.5 + margen_carril
+        reglas.append(dict(
+            base, tipo='INVASION_CARRIL', cooldown_seg=5,
+            geometria=[[izquierda, 0], [derecha, 0], [derecha, 1], [izquierda, 1]]
+        ))
+    return tuple(reglas)
+
+
+REGLAS_POR_DEFECTO = reglas_por_defecto()
+
+
+def en_horario(regla, hora):
+    """True si la hora cae en el horario de la regla (admite rangos que cruzan medianoche)"""
+    inicio, fin = regla['hora_inicio'], regla['hora_fin']
+    if inicio is None or fin is None:
+        return True
+    if inicio <= fin:
+        return inicio <= hora < fin
+    return hora >= inicio or hora < fin
+
+
+class ReglasCompiladas:
+    """Reglas de una cámara listas para evaluar sobre un frame de tamaño (alto, ancho)"""
+
+    def __init__(self, reglas, forma):
+        alto, ancho = forma
+        self.forma_celdas = (-(-alto // REJILLA), -(-ancho // REJILLA))
+        escala = np.array([ancho, alto], dtype=float)
+
+        self.velocidad = [r for r in reglas if r['tipo'] == 'EXCESO_VEL']
+        self.mascaras_velocidad = self._mascaras(self.velocidad, escala)
+        self.limites = np.array([r['velocidad_maxima'] for r in self.velocidad], dtype=float)
+
+        self.carril = [r for r in reglas if r['tipo'] == 'INVASION_CARRIL']
+        self.mascaras_carril = self._mascaras(self.carril, escala)
+
+        self.luz_roja = [r for r in reglas if r['tipo'] == 'LUZ_ROJA']
+        # Segmentos (L, 2, 2) en píxeles; NaN = sin línea (todo vehículo en rojo)
+        self.lineas = np.array([
+            np.asarray(r['geometria'], dtype=float) * escala if r['geometria'] else np.full((2, 2), np.nan)
+            for r in self.luz_roja
+        ]).reshape(-1, 2, 2)
+
+    def _mascaras(self, reglas, escala):
+        """
+        (R, alto/REJILLA, ancho/REJILLA) bool; sin geometría = todo el frame,
+        margen_px = franja central de ese ancho en píxeles a cada lado
+        """
+        mascaras = np.zeros((len(reglas),) + self.forma_celdas, dtype=np.uint8)
+        for i, regla in enumerate(reglas):
+            if regla.get('margen_px'):
+                centro, margen = escala[0] / 2, regla['margen_px']
+                poligono = np.array([
+                    [centro - margen, 0], [centro + margen, 0], [centro + margen, escala[1]], [centro - margen, escala[1]]
+                ]) / REJILLA
+            elif not regla['geometria']:
+                mascaras[i] = 1
+                continue
+            else:
+                poligono = np.asarray(regla['geometria'], dtype=float) * escala / REJILLA
+            cv2.fillPoly(mascaras[i], [np.round(poligono).astype(np.int32)], 1)
+        return mascaras.astype(bool)
+
+    def celdas(self, puntos):
+        """Índices (fila, columna) de celda de cada punto (N, 2) en píxeles"""
+        celdas = (puntos // REJILLA).astype(int)
+        columnas = np.clip(celdas[:, 0], 0, self.forma_celdas[1] - 1)
+        filas = np.clip(celdas[:, 1], 0, self.forma_celdas[0] - 1)
+        return filas, columnas
+
+
+def cruza_lineas(lineas, desde, hasta):
+    """(L, N) True si el tramo desde -> hasta de cada track corta cada línea"""
+    a, b = lineas[:, None, 0, :], lineas[:, None, 1, :]
+    p0, p1 = desde[None, :, :], hasta[None, :, :]
+
+    def cruz(u, v):
+        return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+    with np.errstate(invalid='ignore'):
+        lados_track = cruz(b - a, p0 - a) * cruz(b - a, p1 - a)
+        lados_linea = cruz(p1 - p0, a - p0) * cruz(p1 - p0, b - p0)
+        return (lados_track < 0) & (lados_linea < 0)
+
+
+class MotorReglas:
+    """
+    Evalúa las reglas de una cámara sobre los tracks de su TablaTracks
+    reglas_defecto se usan mientras la cámara no tenga reglas activas en BD
+    """
+
+    def __init__(self, camara, tracks, recarga_seg=RECARGA_SEG, reglas_defecto=REGLAS_POR_DEFECTO):
+        self.camara = camara
+        self.tracks = tracks
+        self.recarga_seg = recarga_seg
+        self.reglas_defecto = reglas_defecto
+        self.reglas = list(reglas_defecto)
+        self.por_defecto = True
+        self._firma = None
+        self._compiladas = {}  # ((alto, ancho), reglas en horario) -> ReglasCompiladas
+        self._proxima_verificacion = 0.0
+        self.recargar()
+
+    def recargar(self):
+        """Relee las reglas activas de la cámara; recompila solo si cambiaron"""
+        self._proxima_verificacion = time.monotonic() + self.recarga_seg
+        if self.camara is None or self.camara.pk is None:
+            return False
+        try:
+            from camaras.models import ReglaCamara
+
+            filas = list(
+                ReglaCamara.objects.filter(camara=self.camara, activa=True)
+                .values(*CAMPOS, 'fecha_actualizacion')
+            )
+        except Exception as e:
+            print(f"⚠️  No se pudieron leer las reglas de la cámara: {e}")
+            return False
+
+        firma = tuple((f['id'], f['fecha_actualizacion']) for f in filas)
+        if firma == self._firma:
+            return False
+        self._firma = firma
+        self.por_defecto = not filas
+        self.reglas = [{c: f[c] for c in CAMPOS} for f in filas] or list(self.reglas_defecto)
+        self._compiladas = {}
+        print(f"📐 Reglas de cámara cargadas: {len(self.reglas)}{' (por defecto)' if self.por_defecto else ''}")
+        return True
+
+    def _compilar(self, forma, hora):
+        activas = tuple(i for i, r in enumerate(self.reglas) if en_horario(r, hora))
+        clave = (forma, activas)
+        compiladas = self._compiladas.get(clave)
+        if compiladas is None:
+            compiladas = self._compiladas[clave] = ReglasCompiladas([self.reglas[i] for i in activas], forma)
+        return compiladas
+
+    def evaluar(self, ids, puntos_px, velocidades, luz_roja, t, forma, ahora=None, tiempo_luz_roja=None):
+        """
+        Infracciones del frame para todos los tracks a la vez, ya filtradas por
+        cooldown. ids y puntos_px (N, 2) deben haber pasado por tracks.observar
+        Retorna {vehiculo_id: [{'tipo_codigo': ..., ...}, ...]}
+        """
+        if time.monotonic() >= self._proxima_verificacion:
+            self.recargar()
+        if len(ids) == 0:
+            return {}
+
+        reglas = self._compilar(tuple(forma[:2]), (ahora or datetime.now()).time())
+        filas = self.tracks.filas(ids)
+        puntos = np.asarray(puntos_px, dtype=float)
+        celda_fila, celda_columna = reglas.celdas(puntos)
+        disparos = {}
+
+        def anotar(tipo, aciertos, cooldown_reglas, datos):
+            # aciertos (R, N): una regla de cada tipo basta; cooldown = el mayor de las reglas que dispararon
+            disparo = aciertos.any(axis=0)
+            cooldown = np.where(aciertos, cooldown_reglas[:, None], 0.0).max(axis=0)
+            disparo &= ~self.tracks.en_cooldown(filas, tipo, t, cooldown)
+            if not disparo.any():
+                return
+            self.tracks.marcar(filas[disparo], tipo, t)
+            for i in np.flatnonzero(disparo):
+                disparos.setdefault(ids[i], []).append(dict(datos(i), tipo_codigo=tipo))
+
+        def esperas(lista):
+            return np.array([r['cooldown_seg'] for r in lista], dtype=float)
+
+        if reglas.velocidad:
+            v = np.array([np.nan if velocidades.get(i) is None else velocidades[i] for i in ids])
+            dentro = reglas.mascaras_velocidad[:, celda_fila, celda_columna]
+            with np.errstate(invalid='ignore'):
+                aciertos = dentro & (v > reglas.limites[:, None]) & (v < VELOCIDAD_MAX_CREIBLE)
+            # El límite reportado es el más estricto de las reglas que dispararon
+            limite = np.where(aciertos, reglas.limites[:, None], np.inf).min(axis=0)
+            anotar('EXCESO_VEL', aciertos, esperas(reglas.velocidad),
+                   lambda i: {'velocidad': float(v[i]), 'velocidad_maxima': int(limite[i])})
+
+        if reglas.carril:
+            aciertos = reglas.mascaras_carril[:, celda_fila, celda_columna]
+            anotar('INVASION_CARRIL', aciertos, esperas(reglas.carril), lambda i: {})
+
+        if reglas.luz_roja and luz_roja:
+            sin_linea = np.isnan(reglas.lineas[:, 0, 0])
+            aciertos = cruza_lineas(reglas.lineas, self.tracks.pixel_previo[filas], puntos)
+            aciertos[sin_linea] = True
+            anotar('LUZ_ROJA', aciertos, esperas(reglas.luz_roja),
+                   lambda i: {'tiempo_luz_roja': tiempo_luz_roja})
+
+        return disparos
@@ -0,0 +1,161 @@
+"""
+Estado de semáforos compartido por todos los detectores
+Clasifica todos los recortes de semáforo del frame en una sola pasada NumPy,
+sigue cada semáforo entre frames con histéresis y registra el instante en que
+pasó a rojo, para calcular tiempo_luz_roja sin reprocesar frames
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+ROJO, AMARILLO, VERDE, DESCONOCIDO = 'ROJO', 'AMARILLO', 'VERDE', 'DESCONOCIDO'
+ESTADOS = np.array([ROJO, AMARILLO, VERDE, DESCONOCIDO])
+
+TAMANO_RECORTE = (16, 32)  # ancho, alto al que se normaliza cada semáforo
+FRACCION_MIN = float(os.getenv('SEMAFORO_FRACCION_MIN', 0.08))  # píxeles encendidos del color
+FRAMES_CONFIRMACION = int(os.getenv('SEMAFORO_FRAMES_CONFIRMACION', 3))
+TTL_SEG = float(os.getenv('SEMAFORO_TTL_SEG', 2.0))
+DISTANCIA_MAX = 0.5  # fracción de la diagonal de la caja para considerar el mismo semáforo
+
+# Rangos HSV (H en 0-180 de OpenCV); el rojo está en los dos extremos
+SATURACION_MIN, VALOR_MIN = 100, 100
+TONOS = {
+    ROJO: ((0, 10), (160, 180)),
+    AMARILLO: ((15, 35),),
+    VERDE: ((40, 95),),
+}
+
+
+def cajas_semaforo(resultados, names):
+    """Cajas (N, 4) de la clase 'traffic light' de un resultado de YOLO"""
+    if not resultados or len(resultados[0].boxes) == 0:
+        return np.empty((0, 4), dtype=int)
+    ids = [i for i, nombre in names.items() if nombre == 'traffic light']
+    boxes = resultados[0].boxes
+    clases = boxes.cls.cpu().numpy().astype(int)
+    cajas = boxes.xyxy.cpu().numpy()[np.isin(clases, ids)]
+    return cajas.astype(int)
+
+
+def clasificar(frame, cajas):
+    """
+    Estado de cada caja en una sola pasada: los recortes se normalizan a
+    TAMANO_RECORTE, se apilan y se convierten a HSV juntos
+    Retorna (estados, fracciones) con fracciones de forma (N, 3): rojo, amarillo, verde
+    """
+    n = len(cajas)
+    if n == 0:
+        return np.empty(0, dtype=ESTADOS.dtype), np.empty((0, 3))
+
+    ancho, alto = TAMANO_RECORTE
+    h, w = frame.shape[:2]
+    cajas = np.clip(cajas, 0, [w, h, w, h])
+    lote = np.zeros((n, alto, ancho, 3), dtype=np.uint8)
+    validas = np.zeros(n, dtype=bool)
+    for i, (x1, y1, x2, y2) in enumerate(cajas):
+        if x2 > x1 and y2 > y1:
+            lote[i] = cv2.resize(frame[y1:y2, x1:x2], TAMANO_RECORTE, interpolation=cv2.INTER_AREA)
+            validas[i] = True
+
+    hsv = cv2.cvtColor(lote.reshape(n * alto, ancho, 3), cv2.COLOR_BGR2HSV).reshape(n, alto, ancho, 3)
+    tono, sat, val = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    encendido = (sat >= SATURACION_MIN) & (val >= VALOR_MIN)
+
+    fracciones = np.empty((n, 3))
+    for j, estado in enumerate((ROJO, AMARILLO, VERDE)):
+        mascara = np.zeros_like(encendido)
+        for bajo, alto_tono in TONOS[estado]:
+            mascara |= (tono >= bajo) & (tono <= alto_tono)
+        fracciones[:, j] = (mascara & encendido).mean(axis=(1, 2))
+
+    indices = fracciones.argmax(axis=1)
+    indices[(fracciones.max(axis=1) < FRACCION_MIN) | ~validas] = 3
+    return ESTADOS[indices], fracciones
+
+
+class Semaforo:
+    """Un semáforo seguido entre frames"""
+
+    __slots__ = ('caja', 'estado', 'candidato', 'racha', 'inicio_candidato', 'inicio_rojo', 'visto')
+
+    def __init__(self, caja, ahora):
+        self.caja = caja
+        self.estado = DESCONOCIDO
+        self.candidato = DESCONOCIDO
+        self.racha = 0
+        self.inicio_candidato = ahora
+        self.inicio_rojo = None
+        self.visto = ahora
+
+    def observar(self, estado, ahora, frames_confirmacion):
+        """Histéresis: el estado solo cambia tras frames_confirmacion observaciones iguales"""
+        self.visto = ahora
+        if estado == DESCONOCIDO:
+            return
+        if estado != self.candidato:
+            self.candidato, self.racha, self.inicio_candidato = estado, 0, ahora
+        self.racha += 1
+        if self.racha >= frames_confirmacion and self.estado != self.candidato:
+            self.estado = self.candidato
+            # El rojo empezó con la primera observación de la racha, no al confirmarse
+            self.inicio_rojo = self.inicio_candidato if self.estado == ROJO else None
+
+
+class EstadoSemaforos:
+    """Semáforos de un canal de video con estado suavizado y comienzo del rojo"""
+
+    def __init__(self, frames_confirmacion=FRAMES_CONFIRMACION, ttl_seg=TTL_SEG):
+        self.frames_confirmacion = max(1, frames_confirmacion)
+        self.ttl_seg = ttl_seg
+        self.semaforos = []
+
+    def actualizar(self, frame, cajas, ahora=None):
+        """Clasifica las cajas del frame y las asocia a los semáforos conocidos"""
+        ahora = time.time() if ahora is None else ahora
+        cajas = np.asarray(cajas, dtype=int).reshape(-1, 4)
+        estados, _ = clasificar(frame, cajas)
+
+        # Asociación voraz por distancia entre centros
+        asignados = {}
+        if len(cajas) and self.semaforos:
+            centros = (cajas[:, :2] + cajas[:, 2:]) / 2.0
+            previas = np.array([s.caja for s in self.semaforos])
+            centros_previos = (previas[:, :2] + previas[:, 2:]) / 2.0
+            distancias = np.linalg.norm(centros[:, None, :] - centros_previos[None, :, :], axis=2)
+            diagonales = np.linalg.norm(previas[:, 2:] - previas[:, :2], axis=1)
+            distancias[distancias > DISTANCIA_MAX * diagonales[None, :]] = np.inf
+            for _ in range(min(distancias.shape)):
+                i, j = np.unravel_index(np.argmin(distancias), distancias.shape)
+                if not np.isfinite(distancias[i, j]):
+                    break
+                asignados[i] = j
+                distancias[i, :] = np.inf
+                distancias[:, j] = np.inf
+
+        for i, (caja, estado) in enumerate(zip(cajas, estados)):
+            if i in asignados:
+                semaforo = self.semaforos[asignados[i]]
+                semaforo.caja = tuple(caja)
+            else:
+                semaforo = Semaforo(tuple(caja), ahora)
+                self.semaforos.append(semaforo)
+            semaforo.observar(estado, ahora, self.frames_confirmacion)
+
+        self.semaforos = [s for s in self.semaforos if ahora - s.visto <= self.ttl_seg]
+        return self.semaforos
+
+    def luz_roja(self):
+        """(True, caja) del semáforo en rojo más antiguo, o (False, None)"""
+        rojos = [s for s in self.semaforos if s.estado == ROJO]
+        if not rojos:
+            return False, None
+        semaforo = min(rojos, key=lambda s: s.inicio_rojo)
+        return True, tuple(int(c) for c in semaforo.caja)
+
+    def tiempo_en_rojo(self, ahora=None):
+        """Segundos desde que empezó el rojo más antiguo visible, o None"""
+        ahora = time.time() if ahora is None else ahora
+        inicios = [s.inicio_rojo for s in self.semaforos if s.estado == ROJO]
+        return round(ahora - min(inicios), 2) if inicios else None
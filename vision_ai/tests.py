@@ -0,0 +1,231 @@
+import json
+import time
+import unittest
+from datetime import datetime, time as hora
+
+import numpy as np
+
+from vision_ai.ocr import ServicioOCR
+from vision_ai.reglas import MotorReglas, en_horario, reglas_por_defecto
+from vision_ai.tracks import TablaTracks
+from vision_ai.videos import EstadoVideo, iou_medio
+
+
+class LectorFalso:
+
+    def __init__(self, texto='ABC123', confianza=0.9):
+        self.texto = texto
+        self.confianza = confianza
+        self.imagenes = []
+
+    def readtext(self, imagen, **opciones):
+        self.imagenes.append(imagen)
+        return [(None, self.texto, self.confianza)]
+
+
+def esperar(condicion, timeout=2.0):
+    limite = time.monotonic() + timeout
+    while not condicion() and time.monotonic() < limite:
+        time.sleep(0.01)
+    return condicion()
+
+
+class ServicioOCRTests(unittest.TestCase):
+
+    def setUp(self):
+        self.lector = LectorFalso()
+        self.ocr = ServicioOCR([self.lector], workers=1, intervalo_seg=0, lecturas_min=1)
+        self.addCleanup(self.ocr.detener, 1)
+        # Vehículo de 200x300 con la "placa" en una franja de 20x60
+        self.roi = np.zeros((200, 300, 3), np.uint8)
+        self.placa = self.roi[150:170, 120:180]
+
+    def test_evidencia_es_el_recorte_de_placa(self):
+        self.ocr.solicitar(('canal', 1), self.roi, localizar=lambda roi: roi[150:170, 120:180].copy())
+        self.assertTrue(esperar(lambda: self.ocr.resultado(('canal', 1))[0] is not None))
+
+        placa, _, recorte = self.ocr.resultado(('canal', 1))
+        self.assertEqual(placa, 'ABC123')
+        self.assertEqual(recorte.shape, self.placa.shape)
+        self.assertEqual(self.lector.imagenes[0].shape, self.placa.shape)
+
+    def test_sin_region_de_placa_no_lee(self):
+        self.ocr.solicitar(('canal', 2), self.roi, localizar=lambda roi: None)
+        self.assertTrue(esperar(lambda: self.ocr.metricas()['lecturas'] == 1))
+        self.assertEqual(self.ocr.metricas()['sin_region'], 1)
+        self.assertEqual(self.lector.imagenes, [])
+        self.assertEqual(self.ocr.resultado(('canal', 2)), (None, 0.0, None))
+
+    def test_track_vencido_suelta_su_recorte(self):
+        tracks = TablaTracks(ttl_seg=1.0, al_liberar=lambda ids: self.ocr.olvidar(('canal', i) for i in ids))
+        tracks.observar([3], np.zeros((1, 2)), t=0.0)
+        self.ocr.solicitar(('canal', 3), self.roi, localizar=lambda roi: roi[150:170, 120:180].copy())
+        self.assertTrue(esperar(lambda: self.ocr.resultado(('canal', 3))[0] is not None))
+
+        tracks.observar([], np.zeros((0, 2)), t=5.0)
+        self.assertEqual(self.ocr.resultado(('canal', 3)), (None, 0.0, None))
+        self.assertEqual(self.ocr.metricas()['tracks'], 0)
+
+
+class TablaTracksTests(unittest.TestCase):
+
+    def test_reutiliza_filas_de_tracks_vencidos(self):
+        tabla = TablaTracks(capacidad=2, ttl_seg=1.0)
+        filas = tabla.observar([10, 11], np.array([[0.0, 0.0], [1.0, 1.0]]), t=0.0)
+        self.assertEqual(tabla.activos(), 2)
+
+        # 11 deja de verse más de ttl_seg: su fila la toma el track nuevo sin crecer la tabla
+        tabla.observar([10], np.array([[0.5, 0.0]]), t=0.8)
+        nuevas = tabla.observar([10, 12], np.array([[1.0, 0.0], [5.0, 5.0]]), t=1.5)
+        self.assertEqual(nuevas[0], filas[0])
+        self.assertEqual(nuevas[1], filas[1])
+        self.assertEqual(len(tabla.ids), 2)
+        self.assertEqual(tabla.tracks_total, 3)
+        self.assertEqual(tabla.activos(), 2)
+
+    def test_crece_al_llenarse(self):
+        tabla = TablaTracks(capacidad=1)
+        tabla.asignar_placa(1, 'NO-OBS')  # sin observar no tiene fila
+        tabla.observar([1], np.zeros((1, 2)), t=0.0)
+        tabla.asignar_placa(1, 'ABC-123')
+        tabla.observar([1, 2, 3], np.zeros((3, 2)), t=0.1)
+        self.assertEqual(len(tabla.ids), 4)
+        self.assertEqual(tabla.placa(1), 'ABC-123')
+        self.assertEqual(tabla.placa(2, 'VEH-0002'), 'VEH-0002')
+        self.assertEqual((tabla.con_placa(), tabla.placas_leidas), (1, 1))
+
+    def test_buffer_circular_de_posiciones(self):
+        tabla = TablaTracks(muestras=3)
+        for t in range(5):
+            tabla.observar([7], np.array([[float(t), 0.0]]), t=float(t))
+        fila = tabla.filas([7])[0]
+        self.assertEqual(sorted(tabla.tiempos[fila]), [2.0, 3.0, 4.0])
+        self.assertEqual(sorted(tabla.posiciones[fila, :, 0]), [2.0, 3.0, 4.0])
+
+        tabla.reiniciar_historial(7)
+        self.assertTrue(np.isnan(tabla.tiempos[fila]).all())
+        self.assertEqual(tabla.activos(), 1)
+
+    def test_cooldown_por_tipo_y_fila(self):
+        tabla = TablaTracks()
+        filas = tabla.observar([1, 2], np.zeros((2, 2)), t=10.0)
+        tabla.marcar(filas[:1], 'LUZ_ROJA', 10.0)
+        np.testing.assert_array_equal(tabla.en_cooldown(filas, 'LUZ_ROJA', 12.0, 5.0), [True, False])
+        np.testing.assert_array_equal(tabla.en_cooldown(filas, 'LUZ_ROJA', 16.0, 5.0), [False, False])
+        np.testing.assert_array_equal(tabla.en_cooldown(filas, 'EXCESO_VEL', 12.0, 5.0), [False, False])
+        np.testing.assert_array_equal(
+            tabla.en_cooldown(filas, 'LUZ_ROJA', 12.0, np.array([1.0, 5.0])), [False, False]
+        )
+
+
+class MotorReglasTests(unittest.TestCase):
+    FORMA = (720, 1280, 3)
+
+    def _motor(self, **opciones):
+        self.tracks = TablaTracks()
+        return MotorReglas(None, self.tracks, **opciones)
+
+    def _evaluar(self, motor, puntos, t, velocidades=None, luz_roja=False, ahora=datetime(2025, 1, 15, 12, 0)):
+        ids = list(range(1, len(puntos) + 1))
+        puntos = np.array(puntos, dtype=float)
+        self.tracks.observar(ids, puntos, t, pixeles=puntos)
+        return motor.evaluar(ids, puntos, velocidades or {}, luz_roja, t, self.FORMA, ahora=ahora)
+
+    def test_exceso_de_velocidad_con_cooldown(self):
+        motor = self._motor(reglas_defecto=reglas_por_defecto(margen_carril=None))
+        velocidades = {1: 80.0, 2: 55.0, 3: 250.0}  # 250 km/h es un error de tracking
+        puntos = [[100, 600], [200, 600], [300, 600]]
+        disparos = self._evaluar(motor, puntos, 0.0, velocidades)
+        self.assertEqual(disparos, {1: [{'velocidad': 80.0, 'velocidad_maxima': 60, 'tipo_codigo': 'EXCESO_VEL'}]})
+        # Cada segundo (dentro del TTL del track) hasta que vence el cooldown de 5 s
+        for t in (1.0, 2.0, 3.0, 4.0):
+            self.assertEqual(self._evaluar(motor, puntos, t, velocidades), {})
+        self.assertIn(1, self._evaluar(motor, puntos, 5.0, velocidades))
+
+    def test_franja_de_carril_por_defecto(self):
+        # w/2 ± w/8 = 640 ± 160
+        disparos = self._evaluar(self._motor(), [[640, 400], [760, 400], [900, 400]], 0.0)
+        self.assertEqual(sorted(disparos), [1, 2])
+        self.assertEqual(disparos[1], [{'tipo_codigo': 'INVASION_CARRIL'}])
+
+    def test_franja_de_carril_en_pixeles(self):
+        motor = self._motor(reglas_defecto=reglas_por_defecto(margen_carril_px=50))
+        disparos = self._evaluar(motor, [[640, 400], [680, 400], [760, 400]], 0.0)
+        self.assertEqual(sorted(disparos), [1, 2])
+
+    def test_sin_margen_no_hay_regla_de_carril(self):
+        motor = self._motor(reglas_defecto=reglas_por_defecto(margen_carril=None))
+        self.assertEqual(self._evaluar(motor, [[640, 400]], 0.0), {})
+
+    def test_luz_roja_al_cruzar_la_linea(self):
+        linea = {'id': None, 'tipo': 'LUZ_ROJA', 'geometria': [[0, 0.5], [1, 0.5]], 'velocidad_maxima': None,
+                 'hora_inicio': None, 'hora_fin': None, 'cooldown_seg': 5}
+        motor = self._motor(reglas_defecto=(linea,))
+        self._evaluar(motor, [[100, 300], [300, 500]], 0.0, luz_roja=True)
+        # Solo el track 1 pasa de y=300 a y=400 cruzando la línea y=360
+        disparos = self._evaluar(motor, [[100, 400], [300, 550]], 0.1, luz_roja=True)
+        self.assertEqual(sorted(disparos), [1])
+        # En verde no hay infracción aunque cruce
+        self._evaluar(motor, [[500, 300], [300, 550]], 10.0)
+        self.assertEqual(self._evaluar(motor, [[500, 400], [300, 550]], 10.1), {})
+
+    def test_horario_que_cruza_medianoche(self):
+        regla = {'hora_inicio': hora(22, 0), 'hora_fin': hora(6, 0)}
+        self.assertTrue(en_horario(regla, hora(23, 30)))
+        self.assertTrue(en_horario(regla, hora(5, 59)))
+        self.assertFalse(en_horario(regla, hora(12, 0)))
+        self.assertTrue(en_horario({'hora_inicio': None, 'hora_fin': None}, hora(12, 0)))
+
+
+class UnionSegmentosTests(unittest.TestCase):
+
+    def test_iou_medio(self):
+        caja = [0, 0, 10, 10]
+        self.assertEqual(iou_medio({1: caja, 2: caja}, {2: caja, 3: caja}), 1.0)
+        self.assertEqual(iou_medio({1: caja}, {2: caja}), 0.0)
+        # Frame 1: mitad solapada (50 / 150); frame 2: idénticas
+        self.assertAlmostEqual(iou_medio({1: caja, 2: caja}, {1: [5, 0, 15, 10], 2: caja}), (1 / 3 + 1) / 2)
+
+    def _infraccion(self, frame, local_id, tipo='EXCESO_VEL'):
+        return {'frame': frame, 'id': local_id, 'tipo_codigo': tipo,
+                'imagen': f'img-{frame}.jpg', 'miniatura': f'min-{frame}.jpg'}
+
+    def test_fusionar_une_tracks_en_el_borde(self):
+        estado = EstadoVideo('/videos/a.mp4', 'firma', segmentos=2)
+        cola = {5: {n: [100 + n, 50, 200 + n, 150] for n in range(290, 300)}}
+        conservadas, sin_uso = estado.fusionar(
+            {'indice': 0, 'cabeza': {}, 'cola': cola, 'infracciones': [self._infraccion(200, 5)]},
+            fps=30, cooldown_seg=5
+        )
+        self.assertEqual([(i['id'], i['placa'][-4:]) for i in conservadas], [(1, '0001')])
+        self.assertEqual(sin_uso, set())
+
+        # El checkpoint pasa por JSON (claves a texto) y se reanuda
+        estado = EstadoVideo('/videos/a.mp4', 'firma', 2, datos=json.loads(json.dumps(estado.a_dict())))
+        cabeza = {8: {n: [101 + n, 50, 201 + n, 150] for n in range(290, 300)},
+                  9: {n: [900, 50, 1000, 150] for n in range(290, 300)}}
+        conservadas, sin_uso = estado.fusionar(
+            {'indice': 1, 'cabeza': cabeza, 'cola': {},
+             'infracciones': [self._infraccion(310, 8), self._infraccion(310, 8, 'LUZ_ROJA'),
+                              self._infraccion(400, 9)]},
+            fps=30, cooldown_seg=5
+        )
+        # 8 continúa el track 1: su exceso 3.7 s después cae en el cooldown; 9 es un track nuevo
+        self.assertEqual([(i['id'], i['tipo_codigo']) for i in conservadas], [(1, 'LUZ_ROJA'), (2, 'EXCESO_VEL')])
+        self.assertEqual(sin_uso, set())
+        self.assertTrue(estado.terminado)
+        self.assertEqual(estado.cola, {})
+
+    def test_imagenes_de_infracciones_descartadas(self):
+        estado = EstadoVideo('/videos/b.mp4', 'firma', segmentos=1)
+        infracciones = [self._infraccion(30, 1), self._infraccion(60, 1)]
+        conservadas, sin_uso = estado.fusionar(
+            {'indice': 0, 'cabeza': {}, 'cola': {}, 'infracciones': infracciones}, fps=30, cooldown_seg=5
+        )
+        self.assertEqual([i['frame'] for i in conservadas], [30])
+        self.assertEqual(sin_uso, {'img-60.jpg', 'min-60.jpg'})
+        # Reprocesar el mismo video da los mismos id_evento; otra versión del archivo, otros
+        reproceso = EstadoVideo('/videos/b.mp4', 'firma', segmentos=1)
+        self.assertEqual(reproceso.id_evento(conservadas[0]), estado.id_evento(conservadas[0]))
+        self.assertNotEqual(EstadoVideo('/videos/b.mp4', 'otra', 1).id_evento(conservadas[0]),
+                            estado.id_evento(conservadas[0]))
@@ -0,0 +1,152 @@
+"""
+Tabla de tracks en estructura de arreglos
+Reemplaza los diccionarios por vehículo (vehiculos_trackeados, placas_detectadas,
+cooldowns) que crecían sin límite: cada track ocupa una fila reutilizable con su
+historial de posiciones, placa, último registro por tipo de infracción y último
+instante visto. Las filas de tracks que dejan la escena se liberan por TTL.
+"""
+import os
+
+import numpy as np
+
+MUESTRAS = int(os.getenv('TRACKS_MUESTRAS', 16))
+TTL_SEG = float(os.getenv('TRACKS_TTL_SEG', 2.0))
+TIPOS_INFRACCION = ('EXCESO_VEL', 'LUZ_ROJA', 'INVASION_CARRIL')
+
+
+class TablaTracks:
+    """Tracks de un canal de video; las reglas pueden operar sobre filas en lote"""
+
+    def __init__(self, capacidad=64, muestras=MUESTRAS, ttl_seg=TTL_SEG, tipos=TIPOS_INFRACCION, al_liberar=None):
+        self.muestras = max(2, muestras)
+        self.al_liberar = al_liberar  # al_liberar(vehiculo_ids) con los tracks que vencen
+        self.ttl_seg = ttl_seg
+        self.tipos = {tipo: i for i, tipo in enumerate(tipos)}
+        self.slots = {}  # vehiculo_id -> fila
+        self.tracks_total = 0  # tracks distintos desde el inicio
+        self.placas_leidas = 0  # tracks que llegaron a tener placa
+        self._reservar(max(1, capacidad))
+
+    def _reservar(self, capacidad):
+        self.ids = np.full(capacidad, -1, dtype=np.int64)
+        self.posiciones = np.zeros((capacidad, self.muestras, 2))
+        self.pixel = np.full((capacidad, 2), np.nan)  # último punto de contacto en el frame
+        self.pixel_previo = np.full((capacidad, 2), np.nan)
+        self.tiempos = np.full((capacidad, self.muestras), np.nan)
+        self.cabeza = np.zeros(capacidad, dtype=int)
+        self.visto = np.full(capacidad, -np.inf)
+        self.visto_frame = np.full(capacidad, -1, dtype=np.int64)
+        self.placas = np.full(capacidad, None, dtype=object)
+        self.cooldowns = np.full((capacidad, len(self.tipos)), -np.inf)
+        self.libres = list(range(capacidad - 1, -1, -1))
+
+    def _crecer(self):
+        anterior = len(self.ids)
+        columnas = ('ids', 'posiciones', 'pixel', 'pixel_previo', 'tiempos', 'cabeza', 'visto', 'visto_frame',
+                    'placas', 'cooldowns')
+        previas = {nombre: getattr(self, nombre) for nombre in columnas}
+        self._reservar(anterior * 2)
+        for nombre, valores in previas.items():
+            getattr(self, nombre)[:anterior] = valores
+        self.libres = list(range(anterior * 2 - 1, anterior - 1, -1))
+
+    def _liberar(self, filas):
+        self.ids[filas] = -1
+        self.tiempos[filas] = np.nan
+        self.pixel[filas] = np.nan
+        self.pixel_previo[filas] = np.nan
+        self.cabeza[filas] = 0
+        self.visto[filas] = -np.inf
+        self.visto_frame[filas] = -1
+        self.placas[filas] = None
+        self.cooldowns[filas] = -np.inf
+
+    def _slot(self, vehiculo_id, t):
+        fila = self.slots.get(vehiculo_id)
+        if fila is None:
+            if not self.libres:
+                self._crecer()
+            fila = self.slots[vehiculo_id] = self.libres.pop()
+            self.ids[fila] = vehiculo_id
+            self.visto[fila] = t
+            self.tracks_total += 1
+        return fila
+
+    def desalojar(self, t):
+        """Libera las filas de tracks no vistos en ttl_seg para reutilizarlas"""
+        vencidos = np.flatnonzero((self.ids >= 0) & (self.visto < t - self.ttl_seg))
+        if not len(vencidos):
+            return 0
+        vehiculo_ids = self.ids[vencidos].tolist()
+        for vehiculo_id in vehiculo_ids:
+            self.libres.append(self.slots.pop(vehiculo_id))
+        self._liberar(vencidos)
+        if self.al_liberar is not None:
+            self.al_liberar(vehiculo_ids)
+        return len(vencidos)
+
+    def observar(self, ids, posiciones, t, frame=-1, pixeles=None):
+        """
+        Marca los tracks como vistos en t (segundos) y agrega su posición al
+        buffer circular; pixeles (N, 2) actualiza el punto en el frame y guarda el
+        anterior. Retorna las filas, en el mismo orden que ids
+        """
+        self.desalojar(t)
+        if len(ids) == 0:
+            return np.empty(0, dtype=int)
+        filas = np.array([self._slot(vehiculo_id, t) for vehiculo_id in ids])
+
+        cabezas = self.cabeza[filas]
+        self.posiciones[filas, cabezas] = posiciones
+        self.tiempos[filas, cabezas] = t
+        self.cabeza[filas] = (cabezas + 1) % self.muestras
+        self.visto[filas] = t
+        self.visto_frame[filas] = frame
+        if pixeles is not None:
+            self.pixel_previo[filas] = self.pixel[filas]
+            self.pixel[filas] = pixeles
+        return filas
+
+    def filas(self, ids):
+        """Filas de tracks ya observados, en el mismo orden que ids"""
+        return np.array([self.slots[vehiculo_id] for vehiculo_id in ids], dtype=int)
+
+    def reiniciar_historial(self, vehiculo_id):
+        """Vacía las posiciones de un track sin soltar su fila"""
+        fila = self.slots.get(vehiculo_id)
+        if fila is not None:
+            self.tiempos[fila] = np.nan
+            self.cabeza[fila] = 0
+
+    def placa(self, vehiculo_id, defecto=None):
+        fila = self.slots.get(vehiculo_id)
+        placa = self.placas[fila] if fila is not None else None
+        return placa if placa is not None else defecto
+
+    def asignar_placa(self, vehiculo_id, placa):
+        """Guarda la placa del track; retorna True si cambió"""
+        fila = self.slots.get(vehiculo_id)
+        if fila is None or self.placas[fila] == placa:
+            return False
+        if self.placas[fila] is None:
+            self.placas_leidas += 1
+        self.placas[fila] = placa
+        return True
+
+    def en_cooldown(self, filas, tipo, t, cooldown_seg):
+        """
+        Máscara de las filas que registraron ese tipo hace menos de cooldown_seg
+        (escalar o un valor por fila)
+        """
+        return t - self.cooldowns[filas, self.tipos[tipo]] < cooldown_seg
+
+    def marcar(self, filas, tipo, t):
+        """Anota en t el registro de una infracción de ese tipo para las filas"""
+        self.cooldowns[filas, self.tipos[tipo]] = t
+
+    def activos(self):
+        return len(self.slots)
+
+    def con_placa(self):
+        """Tracks activos con placa leída"""
+        return sum(1 for placa in self.placas[self.ids >= 0] if placa is not None)
@@ -0,0 +1,109 @@
+"""
+Estimación de velocidad calibrada
+Cada track guarda en la TablaTracks un buffer circular de posiciones sobre el
+plano de la vía (píxeles -> metros con la homografía de CalibracionCamara) y la velocidad sale
+de un ajuste lineal por mínimos cuadrados sobre ese historial. Todos los tracks
+del frame se actualizan y ajustan en una sola operación NumPy.
+"""
+import os
+
+import numpy as np
+
+from vision_ai.tracks import TablaTracks
+
+MIN_MUESTRAS = int(os.getenv('VELOCIDAD_MIN_MUESTRAS', 4))
+MIN_DURACION_SEG = float(os.getenv('VELOCIDAD_MIN_DURACION_SEG', 0.5))
+
+# Sin calibración: escala uniforme equivalente al antiguo factor_conversion = 0.05 m/px
+HOMOGRAFIA_RESPALDO = np.diag([0.05, 0.05, 1.0])
+
+
+def homografia_camara(camara):
+    """Matriz 3x3 calibrada de la cámara, o None si no tiene calibración"""
+    if camara is None:
+        return None
+    from camaras.models import CalibracionCamara
+
+    calibracion = CalibracionCamara.objects.filter(camara=camara).values_list('homografia', flat=True).first()
+    return np.array(calibracion, dtype=float) if calibracion else None
+
+
+def a_suelo(homografia, puntos):
+    """Proyecta puntos (N, 2) en píxeles al plano de la vía (metros)"""
+    homogeneos = np.hstack([puntos, np.ones((len(puntos), 1))]) @ homografia.T
+    return homogeneos[:, :2] / homogeneos[:, 2:3]
+
+
+class Velocimetro:
+    """Ajuste vectorizado sobre el historial de posiciones de una TablaTracks"""
+
+    def __init__(self, homografia=None, tabla=None, min_muestras=MIN_MUESTRAS,
+                 min_duracion_seg=MIN_DURACION_SEG):
+        self.calibrado = homografia is not None
+        self.homografia = np.asarray(homografia if homografia is not None else HOMOGRAFIA_RESPALDO, dtype=float)
+        self.tabla = tabla if tabla is not None else TablaTracks()
+        self.min_muestras = max(2, min_muestras)
+        self.min_duracion_seg = min_duracion_seg
+
+    def actualizar(self, ids, puntos_px, t, frame=-1):
+        """
+        Agrega la posición (píxeles, punto de contacto con la vía) de cada track en
+        el instante t (segundos) y retorna {vehiculo_id: km/h o None si aún no hay historial}
+        """
+        if len(ids) == 0:
+            self.tabla.desalojar(t)
+            return {}
+        puntos_px = np.asarray(puntos_px, dtype=float)
+        filas = self.tabla.observar(ids, a_suelo(self.homografia, puntos_px), t, frame, puntos_px)
+
+        velocidades = self._ajustar(filas)
+        return {
+            vehiculo_id: (None if np.isnan(v) else float(v))
+            for vehiculo_id, v in zip(ids, velocidades)
+        }
+
+    def _ajustar(self, filas):
+        """Pendiente de x(t) e y(t) por mínimos cuadrados para todas las filas a la vez (km/h)"""
+        tiempos = self.tabla.tiempos[filas]
+        posiciones = self.tabla.posiciones[filas]
+        validos = ~np.isnan(tiempos)
+        n = validos.sum(axis=1)
+        n_seguro = np.maximum(n, 1)
+
+        t = np.where(validos, tiempos, 0.0)
+        t_medio = t.sum(axis=1) / n_seguro
+        dt = np.where(validos, t - t_medio[:, None], 0.0)
+        p_medio = (posiciones * validos[..., None]).sum(axis=1) / n_seguro[:, None]
+        dp = np.where(validos[..., None], posiciones - p_medio[:, None, :], 0.0)
+
+        varianza = (dt ** 2).sum(axis=1)
+        covarianza = (dt[..., None] * dp).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            velocidad = np.linalg.norm(covarianza / varianza[:, None], axis=1) * 3.6
+
+        duracion = np.where(validos, tiempos, -np.inf).max(axis=1) - np.where(validos, tiempos, np.inf).min(axis=1)
+        velocidad[(n < self.min_muestras) | (duracion < self.min_duracion_seg) | (varianza == 0)] = np.nan
+        return velocidad
+
+    def reiniciar(self, vehiculo_id):
+        """Vacía el historial de un track (p. ej. tras registrar su infracción)"""
+        self.tabla.reiniciar_historial(vehiculo_id)
+
+
+CLASES_VEHICULO = ('car', 'truck', 'bus', 'motorcycle')
+
+
+def puntos_contacto(resultados, names, escala=(1.0, 1.0)):
+    """
+    ids de track y punto de contacto con la vía (centro inferior de la caja) de
+    todos los vehículos del resultado, en píxeles del frame original
+    """
+    if not resultados or len(resultados[0].boxes) == 0 or resultados[0].boxes.id is None:
+        return [], np.empty((0, 2))
+    boxes = resultados[0].boxes
+    clases = boxes.cls.cpu().numpy().astype(int)
+    vehiculos = np.isin(clases, [i for i, nombre in names.items() if nombre in CLASES_VEHICULO])
+    ids = boxes.id.cpu().numpy().astype(int)[vehiculos]
+    cajas = boxes.xyxy.cpu().numpy()[vehiculos]
+    puntos = np.column_stack([(cajas[:, 0] + cajas[:, 2]) / 2 * escala[0], cajas[:, 3] * escala[1]])
+    return ids.tolist(), puntos
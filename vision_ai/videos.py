@@ -0,0 +1,291 @@
+"""
+Procesamiento offline de videos grabados
+Cada video se parte en segmentos que se reparten en un pool de procesos (un
+modelo YOLO por worker). Cada segmento arranca `solape` frames antes de su
+inicio para que el tracker se estabilice; esos frames coinciden con la cola del
+segmento anterior y sirven para unir los tracks en el borde por IoU. Las reglas
+son las mismas de los detectores en vivo (MotorReglas sobre TablaTracks)
+"""
+import hashlib
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from vision_ai.evidencias import obtener_almacen
+from vision_ai.reglas import MotorReglas
+from vision_ai.semaforo import EstadoSemaforos, cajas_semaforo
+from vision_ai.tracks import TablaTracks
+from vision_ai.velocidad import CLASES_VEHICULO, Velocimetro, homografia_camara, puntos_contacto
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+EXTENSIONES = ('.mp4', '.avi', '.mov', '.mkv')
+IOU_MIN = float(os.getenv('VIDEOS_IOU_MIN', 0.5))  # IoU medio para unir tracks en el borde
+
+
+def listar_videos(rutas):
+    """Archivos de video de las rutas dadas (archivos o carpetas), ordenados"""
+    videos = []
+    for ruta in map(Path, rutas):
+        if ruta.is_dir():
+            videos.extend(p for p in sorted(ruta.iterdir()) if p.suffix.lower() in EXTENSIONES)
+        elif ruta.suffix.lower() in EXTENSIONES and ruta.exists():
+            videos.append(ruta)
+    return [p.resolve() for p in videos]
+
+
+def firma_video(ruta):
+    """(tamaño, mtime) para detectar si un video cambió desde el checkpoint"""
+    stat = os.stat(ruta)
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def planificar(ruta, segmento_seg, solape_seg):
+    """(fps, total_frames, solape_frames, [(indice, inicio, fin), ...]) del video"""
+    cap = cv2.VideoCapture(str(ruta))
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+    largo = max(1, int(segmento_seg * fps))
+    segmentos = [(i, inicio, min(inicio + largo, total)) for i, inicio in enumerate(range(0, total, largo))]
+    return fps, total, int(solape_seg * fps), segmentos
+
+
+def iniciar_worker():
+    """Inicializador del pool: Django y el modelo YOLO una sola vez por proceso"""
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seguridad.settings')
+    django.setup()
+
+    from vision_ai.motor_inferencia import obtener_motor
+    obtener_motor()
+    # Offline no hay frames que perder: guardar() espera en vez de descartar la evidencia
+    obtener_almacen(timeout_encolar=None)
+
+
+def _vehiculos(resultados, names):
+    """{track_id: ((x1, y1, x2, y2), conf)} de los vehículos del resultado"""
+    if not resultados or len(resultados[0].boxes) == 0 or resultados[0].boxes.id is None:
+        return {}
+    boxes = resultados[0].boxes
+    clases = boxes.cls.cpu().numpy().astype(int)
+    mascara = np.isin(clases, [i for i, nombre in names.items() if nombre in CLASES_VEHICULO])
+    ids = boxes.id.cpu().numpy().astype(int)[mascara]
+    cajas = boxes.xyxy.cpu().numpy()[mascara].round().astype(int)
+    confs = boxes.conf.cpu().numpy()[mascara]
+    return {int(i): (caja.tolist(), float(c)) for i, caja, c in zip(ids, cajas, confs)}
+
+
+def procesar_segmento(tarea):
+    """
+    Procesa los frames [inicio - solape, fin) de un video en el worker actual
+    Retorna las infracciones del segmento (solo frames >= inicio) y las cajas de
+    los tracks en la cabeza (warm-up) y en la cola (los últimos `solape` frames)
+    """
+    from camaras.models import Camara
+    from django.db import close_old_connections
+    from vision_ai.motor_inferencia import obtener_motor
+
+    close_old_connections()
+    motor = obtener_motor()
+    camara = Camara.objects.filter(pk=tarea['camara_id']).first()
+    fps, inicio, fin, solape = tarea['fps'], tarea['inicio'], tarea['fin'], tarea['solape']
+    paso = tarea['skip'] + 1
+    fecha_base = tarea['fecha_base']
+
+    tracks = TablaTracks()
+    velocimetro = Velocimetro(homografia_camara(camara), tracks)
+    semaforos = EstadoSemaforos()
+    reglas = MotorReglas(camara, tracks, recarga_seg=float('inf'))
+    canal = motor.registrar_canal(tarea['camara_id'])
+
+    almacen = obtener_almacen(timeout_encolar=None)
+    desde = max(0, inicio - solape)
+    cabeza, cola = defaultdict(dict), defaultdict(dict)
+    infracciones, evidencias = [], {}
+    procesados = 0
+    reloj = time.perf_counter()
+
+    cap = cv2.VideoCapture(tarea['ruta'])
+    cap.set(cv2.CAP_PROP_POS_FRAMES, desde)
+    try:
+        for n in range(desde, fin):
+            if n % paso:
+                if not cap.grab():
+                    break
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+
+            resultados = motor.inferir(canal, frame, conf=tarea['conf'])
+            procesados += 1
+            t = n / fps
+
+            semaforos.actualizar(frame, cajas_semaforo(resultados, motor.names), ahora=t)
+            luz_roja, _ = semaforos.luz_roja()
+            ids, puntos = puntos_contacto(resultados, motor.names)
+            velocidades = velocimetro.actualizar(ids, puntos, t, n)
+            disparos = reglas.evaluar(
+                ids, puntos, velocidades, luz_roja, t, frame.shape,
+                ahora=fecha_base + timedelta(seconds=t),
+                tiempo_luz_roja=semaforos.tiempo_en_rojo(t) if luz_roja else None
+            )
+
+            vehiculos = _vehiculos(resultados, motor.names)
+            for vehiculo_id, (caja, _) in vehiculos.items():
+                if n < inicio:
+                    cabeza[vehiculo_id][n] = caja
+                if n >= fin - solape:
+                    cola[vehiculo_id][n] = caja
+
+            # Los frames de warm-up pertenecen al segmento anterior
+            if n < inicio or not disparos:
+                continue
+            evidencias[n] = almacen.guardar(frame)
+            for vehiculo_id, lista in disparos.items():
+                confianza = vehiculos.get(vehiculo_id, (None, 0.5))[1]
+                for disparo in lista:
+                    infracciones.append(dict(disparo, frame=n, id=vehiculo_id, confianza=confianza))
+    finally:
+        cap.release()
+        motor.liberar_canal(canal)
+
+    # Los Future no cruzan procesos: se resuelven aquí, con las imágenes ya en disco
+    rutas = {n: futuro.result() or {} for n, futuro in evidencias.items()}
+    for infraccion in infracciones:
+        infraccion['imagen'] = rutas[infraccion['frame']].get('principal')
+        infraccion['miniatura'] = rutas[infraccion['frame']].get('miniatura')
+
+    return {
+        'ruta': tarea['ruta'],
+        'indice': tarea['indice'],
+        'pid': os.getpid(),
+        'frames': procesados,
+        'segundos': time.perf_counter() - reloj,
+        'cabeza': dict(cabeza),
+        'cola': dict(cola),
+        'infracciones': infracciones,
+    }
+
+
+def iou_medio(cajas_a, cajas_b):
+    """IoU medio de dos tracks sobre los frames que comparten (0 si no comparten)"""
+    comunes = sorted(cajas_a.keys() & cajas_b.keys())
+    if not comunes:
+        return 0.0
+    a = np.array([cajas_a[n] for n in comunes], dtype=float)
+    b = np.array([cajas_b[n] for n in comunes], dtype=float)
+    ancho = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    alto = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    interseccion = ancho * alto
+    union = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - interseccion
+    return float(np.mean(interseccion / np.maximum(union, 1e-6)))
+
+
+class EstadoVideo:
+    """
+    Estado de unión entre segmentos consecutivos de un video; se guarda en el
+    checkpoint para poder reanudar en el siguiente segmento pendiente
+    """
+
+    def __init__(self, ruta, firma, segmentos, datos=None):
+        datos = datos or {}
+        self.ruta = str(ruta)
+        self.firma = firma
+        self.segmentos = segmentos
+        self.hechos = datos.get('hechos', 0)
+        self.siguiente_id = datos.get('siguiente_id', 1)
+        # Claves JSON a enteros: {id_global: {frame: caja}} y {id_global: {tipo: t}}
+        self.cola = {int(g): {int(n): c for n, c in cajas.items()} for g, cajas in datos.get('cola', {}).items()}
+        self.ultimos = {int(g): dict(tipos) for g, tipos in datos.get('ultimos', {}).items()}
+        self.prefijo_placa = 'VID-' + hashlib.sha1(self.ruta.encode()).hexdigest()[:6].upper()
+        self.prefijo_evento = 'VID-' + hashlib.sha1(f'{self.ruta}|{firma}'.encode()).hexdigest()[:12]
+
+    @property
+    def terminado(self):
+        return self.hechos >= self.segmentos
+
+    def a_dict(self):
+        return {
+            'firma': self.firma,
+            'segmentos': self.segmentos,
+            'hechos': self.hechos,
+            'siguiente_id': self.siguiente_id,
+            'cola': self.cola,
+            'ultimos': self.ultimos,
+        }
+
+    def id_evento(self, infraccion):
+        """
+        Id determinista (video + frame + track global + tipo): reprocesar un
+        segmento tras un corte genera los mismos ids y la restricción única
+        de Infraccion.id_evento evita duplicarlas
+        """
+        return f"{self.prefijo_evento}-{infraccion['frame']}-{infraccion['id']}-{infraccion['tipo_codigo']}"
+
+    def _emparejar(self, cabeza):
+        """{id_local: id_global} de los tracks de la cabeza que continúan uno de la cola previa"""
+        pares = sorted(
+            ((iou_medio(cajas_previas, cajas), global_id, local_id)
+             for global_id, cajas_previas in self.cola.items()
+             for local_id, cajas in cabeza.items()),
+            reverse=True
+        )
+        mapa, usados = {}, set()
+        for iou, global_id, local_id in pares:
+            if iou < IOU_MIN:
+                break
+            if global_id in usados or local_id in mapa:
+                continue
+            mapa[local_id] = global_id
+            usados.add(global_id)
+        return mapa
+
+    def fusionar(self, resultado, fps, cooldown_seg):
+        """
+        Traduce los ids locales del segmento a ids globales del video y descarta
+        las infracciones repetidas de un track que cruzó el borde dentro del cooldown
+        Retorna (infracciones conservadas, imágenes y miniaturas que quedaron sin uso)
+        """
+        mapa = self._emparejar(resultado['cabeza'])
+
+        def global_de(local_id):
+            if local_id not in mapa:
+                mapa[local_id] = self.siguiente_id
+                self.siguiente_id += 1
+            return mapa[local_id]
+
+        conservadas, descartadas = [], []
+        for infraccion in sorted(resultado['infracciones'], key=lambda i: i['frame']):
+            global_id = global_de(infraccion['id'])
+            t = infraccion['frame'] / fps
+            ultimos = self.ultimos.setdefault(global_id, {})
+            previo = ultimos.get(infraccion['tipo_codigo'])
+            if previo is not None and t - previo < cooldown_seg:
+                descartadas.append(infraccion)
+                continue
+            ultimos[infraccion['tipo_codigo']] = t
+            conservadas.append(dict(infraccion, id=global_id, placa=f"{self.prefijo_placa}-{global_id:04d}"))
+
+        # Solo los tracks de la cola pueden continuar en el siguiente segmento
+        self.cola = {global_de(local_id): cajas for local_id, cajas in resultado['cola'].items()}
+        self.ultimos = {g: tipos for g, tipos in self.ultimos.items() if g in self.cola}
+        self.hechos = resultado['indice'] + 1
+
+        def imagenes(lista):
+            return {i[clave] for i in lista for clave in ('imagen', 'miniatura') if i.get(clave)}
+
+        return conservadas, imagenes(descartadas) - imagenes(conservadas)
+
+
+def fecha_inicio_video(ruta, total_frames, fps):
+    """Inicio aproximado de la grabación: mtime del archivo menos su duración"""
+    return datetime.fromtimestamp(os.path.getmtime(ruta)) - timedelta(seconds=total_frames / fps)